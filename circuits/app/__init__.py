@@ -5,8 +5,9 @@ common to applications.
 """
 from .daemon import Daemon
 from .dropprivileges import DropPrivileges
+from .supervisor import Supervisor
 
-__all__ = ("Daemon", "DropPrivileges",)
+__all__ = ("Daemon", "DropPrivileges", "Supervisor",)
 
 # flake8: noqa
 # pylama: skip=1
@@ -0,0 +1,253 @@
+"""Supervisor Component
+
+Component to run a system in a number of pre-forked worker processes, for
+example to spread the connections of a server over all available CPUs.
+Dead workers are respawned and on shutdown all workers are terminated
+gracefully.
+"""
+from errno import ECHILD, ESRCH
+from multiprocessing import cpu_count
+from os import WNOHANG, _exit, fork, kill, waitpid
+from signal import SIGINT, SIGKILL, SIGTERM
+from socket import AF_UNIX, SOCK_STREAM, socketpair
+from sys import stderr
+from time import sleep, time
+from traceback import format_exc
+
+from circuits.core import BaseComponent, Event, Timer, handler
+
+
+class reap(Event):
+    """reap Event"""
+
+
+class spawned(Event):
+    """spawned Event
+
+    This Event is sent when a new worker process has been started.
+
+    :param pid: The process id of the worker.
+    :type  pid: int
+    """
+
+
+class reaped(Event):
+    """reaped Event
+
+    This Event is sent when a worker process has exited.
+
+    :param pid:    The process id of the worker.
+    :type  pid:    int
+
+    :param status: The exit status as returned by ``os.waitpid()``.
+    :type  status: int
+    """
+
+
+class Supervisor(BaseComponent):
+    """Supervisor Component
+
+    Once the system is started the Supervisor forks ``workers`` worker
+    processes. Every worker calls ``factory()`` to build its own system
+    (a :class:`~circuits.core.manager.Manager` or Component) and runs it.
+    The supervising process does nothing else but to respawn workers that
+    die and to shut them down again.
+
+    Workers can either share a listening socket created by the supervising
+    process before the workers are forked::
+
+        sock = socket(AF_INET, SOCK_STREAM)
+        sock.bind(("0.0.0.0", 8000))
+        sock.listen(BACKLOG)
+
+        def factory():
+            return Manager() + Server(sock) + Root()
+
+    or each bind their own socket with ``SO_REUSEPORT`` so that the kernel
+    balances new connections between them::
+
+        def factory():
+            return Manager() + Server(("0.0.0.0", 8000), reuse_port=True) + Root()
+
+        (Manager() + Supervisor(factory, workers=4)).run()
+
+    Alternatively the supervising process can accept all connections
+    itself and hand them off to the workers, always to the worker with
+    the least active connections. For this pass the listening ``server``
+    and ``factory`` is called with the worker's end of a UNIX socket pair
+    to build a :class:`~circuits.net.sockets.HandoffServer` from::
+
+        def factory(sock):
+            return Manager() + HandoffServer(sock) + Root()
+
+        server = TCPServer(("0.0.0.0", 8000))
+        (Manager() + server + Supervisor(factory, server=server)).run()
+
+    On ``SIGINT`` or ``SIGTERM`` (or when the supervising system is
+    stopped) every worker is sent ``SIGTERM`` and given ``timeout``
+    seconds to exit before it is killed. Once all workers have exited
+    after a signal the supervising system is stopped as well.
+
+    :param factory:  callable returning the system to run in a worker
+    :type  factory:  callable
+
+    :param workers:  number of worker processes (Default: no. of CPUs)
+    :type  workers:  int
+
+    :param timeout:  seconds to wait for workers to exit on shutdown
+    :type  timeout:  float
+
+    :param interval: seconds between checks for dead workers
+    :type  interval: float
+
+    :param server:   Server to hand off accepted connections from
+    :type  server:   :class:`~circuits.net.sockets.Server`
+    """
+
+    channel = "supervisor"
+
+    def __init__(self, factory, workers=None, timeout=5.0, interval=1.0,
+                 server=None, channel=channel):
+        super(Supervisor, self).__init__(channel=channel)
+
+        self.factory = factory
+        self.workers = workers or cpu_count()
+        self.timeout = timeout
+        self.server = server
+
+        self._pids = set()
+        self._handoffs = {}
+        self._deadline = None
+        self._exit = False
+
+        Timer(interval, reap(), self.channel, persist=True).register(self)
+
+    @property
+    def pids(self):
+        """Process ids of the running workers"""
+
+        return sorted(self._pids)
+
+    @property
+    def stopping(self):
+        return self._deadline is not None
+
+    def spawn(self):
+        """Fork and start a new worker process"""
+
+        if self.server is not None:
+            sock, worker_sock = socketpair(AF_UNIX, SOCK_STREAM)
+            args = (worker_sock,)
+        else:
+            args = ()
+
+        pid = fork()
+        if pid == 0:
+            code = 0
+            try:
+                if args:
+                    sock.close()
+                    for handoff in self._handoffs.values():
+                        handoff.close()
+                self.factory(*args).run()
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            except BaseException:
+                stderr.write(format_exc())
+                code = 1
+            finally:
+                _exit(code)
+
+        self._pids.add(pid)
+
+        if args:
+            worker_sock.close()
+            self._handoffs[pid] = sock
+            self.server.add_handoff(sock)
+
+        self.fire(spawned(pid))
+
+        return pid
+
+    def terminate(self):
+        """Ask all workers to exit by sending them ``SIGTERM``"""
+
+        if self._deadline is None:
+            self._deadline = time() + self.timeout
+
+        self._kill(SIGTERM)
+
+    def _kill(self, signo):
+        for pid in list(self._pids):
+            try:
+                kill(pid, signo)
+            except OSError as e:
+                if e.errno != ESRCH:
+                    raise
+
+    def _reap(self):
+        for pid in list(self._pids):
+            try:
+                rpid, status = waitpid(pid, WNOHANG)
+            except OSError as e:
+                if e.errno != ECHILD:
+                    raise
+                rpid, status = pid, 0
+
+            if rpid:
+                self._pids.discard(pid)
+                if pid in self._handoffs:
+                    self.server.remove_handoff(self._handoffs.pop(pid))
+                self.fire(reaped(pid, status))
+
+    @handler("registered")
+    def _on_registered(self, component, manager):
+        if component is self and manager.root.running:
+            self._spawn_workers()
+
+    @handler("started", channel="*")
+    def _on_started(self, component):
+        self._spawn_workers()
+
+    def _spawn_workers(self):
+        while not self.stopping and len(self._pids) < self.workers:
+            self.spawn()
+
+    @handler("reap")
+    def _on_reap(self):
+        self._reap()
+
+        if not self.stopping:
+            self._spawn_workers()
+        elif not self._pids:
+            if self._exit:
+                self.root.stop()
+        elif time() >= self._deadline:
+            self._kill(SIGKILL)
+
+    @handler("signal", channel="*")
+    def _on_signal(self, signo, stack):
+        if signo in (SIGINT, SIGTERM):
+            self._exit = True
+            self.terminate()
+
+    @handler("stopped", channel="*")
+    def _on_stopped(self, component):
+        if not self._pids:
+            return
+
+        self.terminate()
+
+        while self._pids and time() < self._deadline:
+            self._reap()
+            sleep(0.1)
+
+        self._kill(SIGKILL)
+
+        for pid in list(self._pids):
+            try:
+                waitpid(pid, 0)
+            except OSError as e:
+                if e.errno != ECHILD:
+                    raise
+            self._pids.discard(pid)
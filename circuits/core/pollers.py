@@ -16,6 +16,11 @@ from socket import (
 )
 from threading import Thread
 
+try:
+    from fcntl import F_GETFL, F_SETFL, fcntl
+except ImportError:
+    fcntl = None
+
 from circuits.core.handlers import handler
 
 from .components import BaseComponent
@@ -42,8 +47,24 @@ class _disconnect(Event):
     """_disconnect Event"""
 
 
+def set_nonblocking(fd):
+    """Put the file descriptor ``fd`` into non-blocking mode"""
+
+    fcntl(fd, F_SETFL, fcntl(fd, F_GETFL) | os.O_NONBLOCK)
+
+
 class BasePoller(BaseComponent):
 
+    """Base Poller
+
+    Other threads wake up a poller waiting for I/O with :meth:`resume`
+    through a control channel: an ``eventfd`` where available (Linux,
+    Python 3.10+), a non-blocking pipe on other Linux systems and a
+    socket pair elsewhere. Wakeups requested while one is still pending
+    are coalesced and the control channel is drained completely once the
+    poller wakes up.
+    """
+
     channel = None
 
     def __init__(self, channel=channel):
@@ -53,11 +74,18 @@ class BasePoller(BaseComponent):
         self._write = []
         self._targets = {}
 
+        self._wakeup_pending = False
         self._ctrl_recv, self._ctrl_send = self._create_control_con()
 
     def _create_control_con(self):
+        if hasattr(os, "eventfd"):
+            fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            return fd, fd
         if platform.system() == "Linux":
-            return os.pipe()
+            fds = os.pipe()
+            for fd in fds:
+                set_nonblocking(fd)
+            return fds
         server = socket(AF_INET, SOCK_STREAM)
         server.bind(("localhost", 0))
         server.listen(1)
@@ -87,19 +115,41 @@ class BasePoller(BaseComponent):
         self._generate_events(event)
 
     def resume(self):
-        if isinstance(self._ctrl_send, socket):
-            self._ctrl_send.send(b"\0")
-        else:
-            os.write(self._ctrl_send, b"\0")
+        if self._wakeup_pending:
+            return
+
+        self._wakeup_pending = True
+
+        try:
+            if isinstance(self._ctrl_send, socket):
+                self._ctrl_send.send(b"\0")
+            elif self._ctrl_send == self._ctrl_recv:
+                os.eventfd_write(self._ctrl_send, 1)
+            else:
+                os.write(self._ctrl_send, b"\0")
+        except (IOError, OSError):
+            # The control channel is full: a wakeup is pending anyway
+            pass
 
     def _read_ctrl(self):
+        # Drain the control channel first and clear the flag afterwards:
+        # a resume() in between is skipped but the poller is awake anyway.
+        # Clearing the flag first would let a racing resume() write a
+        # wakeup that is drained while the flag stays set, and every
+        # later resume() would be skipped.
         try:
             if isinstance(self._ctrl_recv, socket):
-                return self._ctrl_recv.recv(1)
+                while len(self._ctrl_recv.recv(4096)) == 4096:
+                    pass
+            elif self._ctrl_recv == self._ctrl_send:
+                os.eventfd_read(self._ctrl_recv)
             else:
-                return os.read(self._ctrl_recv, 1)
-        except:
-            return b"\0"
+                while len(os.read(self._ctrl_recv, 4096)) == 4096:
+                    pass
+        except (IOError, OSError):
+            pass
+
+        self._wakeup_pending = False
 
     def addReader(self, source, fd):
         channel = getattr(source, "channel", "*")
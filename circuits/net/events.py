@@ -19,7 +19,7 @@ class connect(Event):
     :param args:  Client: (host, port) Server: (sock, host, port)
     :type  args: tuple
 
-    :param kwargs: Client: (ssl)
+    :param kwargs: Client: (secure, certfile, keyfile, ca_certs, ssl_context)
     :type  kwargs: dict
     """
 
@@ -186,6 +186,27 @@ class write(Event):
         super(write, self).__init__(*args)
 
 
+class sendfile(Event):
+
+    """sendfile Event
+
+    This Event is used to send (part of) a file to a client, client
+    connection or server. The file is queued in order with any data
+    written before and after it and sent with ``os.sendfile()`` in chunks
+    whenever the socket is writable, falling back to reading the file in
+    chunks for TLS sockets. The file is closed once it has been sent or the
+    connection was closed.
+
+    .. note::
+        - This event is never sent, it is used to send data.
+        - This event is used for both Client and Server Components.
+
+    :param args:  Client: (fileobj, offset, count)
+                  Server: (sock, fileobj, offset, count)
+    :type  tuple: tuple
+    """
+
+
 class close(Event):
 
     """close Event
@@ -261,3 +282,99 @@ class starttls(Event):
 
     def __init__(self, sock):
         super(starttls, self).__init__(sock)
+
+
+class pause_writing(Event):
+
+    """pause_writing Event
+
+    This Event is sent when more data is waiting to be written to a
+    connection than its write high-water mark allows. Producers should
+    stop writing to the connection until ``drain`` is sent.
+
+    .. note::
+        This event is used for both Client and Server Components.
+
+    :param args:  Client: () Server: (sock)
+    :type  tuple: tuple
+    """
+
+
+class drain(Event):
+
+    """drain Event
+
+    This Event is sent when the data waiting to be written to a paused
+    connection (see ``pause_writing``) has fallen to its write low-water
+    mark. Producers may resume writing.
+
+    .. note::
+        This event is used for both Client and Server Components.
+
+    :param args:  Client: () Server: (sock)
+    :type  tuple: tuple
+    """
+
+
+class pause_accepting(Event):
+
+    """pause_accepting Event
+
+    This Event is sent when a server stops accepting new connections,
+    because it has reached its maximum number of connections or the
+    process has run out of file descriptors.
+
+    .. note::
+        This event is for Server Components.
+
+    :param connections: The number of open connections.
+    :type  connections: int
+    """
+
+
+class resume_accepting(Event):
+
+    """resume_accepting Event
+
+    This Event is sent when a server that has paused accepting new
+    connections (see ``pause_accepting``) accepts connections again.
+
+    .. note::
+        This event is for Server Components.
+
+    :param connections: The number of open connections.
+    :type  connections: int
+    """
+
+
+class read_batch(Event):
+
+    """read_batch Event
+
+    This Event is sent by UDP servers and clients created with
+    ``batch_reads=True`` instead of one ``read`` Event per datagram. It
+    carries all datagrams received during one wakeup of the socket.
+
+    .. note::
+        This event is for UDP Server and Client Components.
+
+    :param datagrams: The received datagrams.
+    :type  datagrams: list of (address, data) tuples
+    """
+
+
+class stats(Event):
+
+    """stats Event
+
+    This Event is sent every ``stats_interval`` seconds by clients and
+    servers created with that option. It carries a snapshot of their I/O
+    counters (see ``get_stats()``) with an additional ``rates`` dict of
+    the per second rates of all counters since the previous snapshot.
+
+    .. note::
+        This event is for both Client and Server Components.
+
+    :param stats: The snapshot of counters.
+    :type  stats: dict
+    """
@@ -0,0 +1,375 @@
+"""Connection Pool
+
+This module implements a pool of outbound keep-alive connections that are
+leased out to callers and returned to the pool once they are done with
+them, saving the connect (and TLS handshake) round trips of creating a
+new :class:`~circuits.net.sockets.TCPClient` for every request.
+"""
+from collections import deque
+from errno import EAGAIN, EWOULDBLOCK
+from itertools import count
+from socket import MSG_PEEK, error as SocketError, timeout as SocketTimeout
+from time import time
+
+from circuits.core import BaseComponent, Event, Timer, handler
+
+from .events import connect
+from .sockets import TCPClient
+
+MAX_PER_HOST = 8  # Max. Connections per (host, port, secure)
+IDLE_TIMEOUT = 60  # Max. Seconds a connection is kept idle
+CHECK_INTERVAL = 5  # Seconds between health checks of idle connections
+
+
+class acquire(Event):
+
+    """acquire Event
+
+    Lease a connection to ``host``, ``port`` from a
+    :class:`ConnectionPool`. The value of the Event is the leased
+    :class:`PooledClient` once a connection is available::
+
+        lease = yield self.call(acquire("example.com", 80), "pool")
+        client = lease.value
+
+    Connections are handed out in the order they were asked for. If no
+    connection could be established (or none became available within
+    ``timeout`` seconds) the Event fails with the socket error.
+
+    :param host:   The host to connect to.
+    :type  host:   str
+
+    :param port:   The port to connect to.
+    :type  port:   int
+
+    :param secure: Whether to connect with TLS.
+    :type  secure: bool
+
+    :param kwargs: ``timeout`` and any further keyword arguments for the
+                   ``connect`` Event of new connections.
+    :type  kwargs: dict
+    """
+
+    success = True
+    failure = True
+
+
+class release(Event):
+
+    """release Event
+
+    Return a leased connection to its :class:`ConnectionPool`.
+
+    :param client: The leased connection.
+    :type  client: :class:`PooledClient`
+
+    :param reuse:  Whether the connection may be leased again, otherwise
+                   it is closed.
+    :type  reuse:  bool
+    """
+
+
+class check_idle(Event):
+
+    """check_idle Event"""
+
+
+class _leased(Event):
+
+    """_leased Event"""
+
+
+class _lease_timeout(Event):
+
+    """_lease_timeout Event"""
+
+
+class PooledClient(TCPClient):
+
+    """TCP Client leased out by a :class:`ConnectionPool`
+
+    Use it like any other :class:`~circuits.net.sockets.TCPClient` on its
+    own ``channel`` and fire a ``release`` Event at the pool when done.
+    """
+
+    pool = None
+    key = None
+    idle_since = None
+
+    @handler("connected")
+    def _on_pool_connected(self, host, port):
+        self.pool._on_client_connected(self)
+
+    @handler("unreachable")
+    def _on_pool_unreachable(self, host, port, reason=None):
+        self.pool._on_client_failed(self, reason)
+
+    @handler("disconnected")
+    def _on_pool_disconnected(self):
+        self.pool._on_client_closed(self)
+
+    @handler("read")
+    def _on_pool_read(self, data):
+        # Data (eg: a server's timeout notice) on an idle connection
+        # leaves it in an unknown state, don't lease it out again.
+        if self.idle_since is not None:
+            self.close()
+
+
+class _Host(object):
+
+    """Connections of a :class:`ConnectionPool` for one key"""
+
+    __slots__ = ("idle", "leased", "connecting", "waiters", "kwargs")
+
+    def __init__(self):
+        self.kwargs = {}
+        self.idle = deque()
+        self.leased = set()
+        self.connecting = set()
+        self.waiters = deque()
+
+    def __len__(self):
+        return len(self.idle) + len(self.leased) + len(self.connecting)
+
+
+class _Waiter(object):
+
+    """Caller waiting for a connection"""
+
+    __slots__ = ("event", "client", "error", "timer")
+
+    def __init__(self):
+        self.event = _leased(self)
+        self.client = None
+        self.error = None
+        self.timer = None
+
+    @property
+    def done(self):
+        return self.client is not None or self.error is not None
+
+
+class ConnectionPool(BaseComponent):
+
+    """Outbound Connection Pool
+
+    Keeps up to ``max_per_host`` connections per ``(host, port, secure)``
+    and leases them out on ``acquire`` Events; see :class:`acquire` and
+    :class:`release`. Idle connections are reused most recently released
+    first, closed once they have been idle for ``idle_timeout`` seconds
+    and health-checked every ``check_interval`` seconds and before they
+    are leased out again. Callers waiting for a connection of a host at
+    its limit are served in order as connections are released.
+
+    :param max_per_host:   maximum number of connections per host.
+    :type  max_per_host:   ``int``
+
+    :param idle_timeout:   seconds to keep an idle connection open.
+    :type  idle_timeout:   ``float``
+
+    :param check_interval: seconds between health checks.
+    :type  check_interval: ``float``
+
+    :param connect_timeout: seconds a new connection may take.
+    :type  connect_timeout: ``float``
+    """
+
+    channel = "pool"
+
+    def __init__(self, max_per_host=MAX_PER_HOST, idle_timeout=IDLE_TIMEOUT,
+                 check_interval=CHECK_INTERVAL, connect_timeout=5,
+                 channel=channel):
+        super(ConnectionPool, self).__init__(channel=channel)
+
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+
+        self._hosts = {}
+        self._ids = count(1)
+
+        Timer(
+            check_interval, check_idle(), self.channel, persist=True
+        ).register(self)
+
+    @property
+    def hosts(self):
+        """Number of ``(idle, leased, connecting, waiting)`` per key"""
+
+        return dict(
+            (key, (
+                len(host.idle), len(host.leased), len(host.connecting),
+                len(host.waiters)
+            ))
+            for key, host in self._hosts.items()
+        )
+
+    @handler("acquire")
+    def acquire(self, host, port, secure=False, timeout=None, **kwargs):
+        key = (host, port, secure)
+        record = self._hosts.setdefault(key, _Host())
+        record.kwargs = kwargs
+
+        while record.idle and not record.waiters:
+            client = record.idle.pop()
+            if self._is_healthy(client):
+                client.idle_since = None
+                record.leased.add(client)
+                return client
+            client.close()
+
+        waiter = _Waiter()
+        record.waiters.append(waiter)
+
+        if timeout is not None:
+            waiter.timer = Timer(
+                timeout, _lease_timeout(key, waiter), self.channel
+            ).register(self)
+
+        if len(record) < self.max_per_host:
+            self._open(key)
+
+        return self._wait(waiter)
+
+    def _wait(self, waiter):
+        if not waiter.done:
+            yield self.wait(waiter.event, self.channel)
+
+        if waiter.error is not None:
+            raise waiter.error
+
+        yield waiter.client
+
+    @handler("release")
+    def release(self, client, reuse=True):
+        record = self._hosts.get(client.key)
+        if record is None or client not in record.leased:
+            return
+
+        record.leased.discard(client)
+
+        if reuse and client.connected and not client.buffered:
+            self._hand_over(record, client)
+        else:
+            client.close()
+
+    @handler("check_idle")
+    def _on_check_idle(self):
+        now = time()
+        for record in self._hosts.values():
+            for client in list(record.idle):
+                if now - client.idle_since > self.idle_timeout or \
+                        not self._is_healthy(client):
+                    client.close()
+
+    @handler("_lease_timeout")
+    def _on_lease_timeout(self, key, waiter):
+        record = self._hosts.get(key)
+        if record is None or waiter.done:
+            return
+
+        record.waiters.remove(waiter)
+        self._fail(waiter, SocketTimeout("timed out waiting for a connection"))
+
+    @handler("close")
+    def close(self):
+        for record in self._hosts.values():
+            for client in list(record.idle) + list(record.leased):
+                client.close()
+
+    def _open(self, key):
+        host, port, secure = key
+
+        client = PooledClient(
+            channel="{0:s}.{1:d}".format(self.channel, next(self._ids)),
+            connect_timeout=self.connect_timeout,
+        )
+        client.pool = self
+        client.key = key
+        client.register(self)
+
+        record = self._hosts[key]
+        record.connecting.add(client)
+        self.fire(connect(host, port, secure, **record.kwargs), client.channel)
+
+    def _is_healthy(self, client):
+        """Check whether an idle connection was not closed by the peer"""
+
+        if not client.connected:
+            return False
+
+        sock = client._sock
+        if hasattr(sock, "getpeercert"):
+            # Closed TLS connections are noticed by the poller
+            return True
+
+        try:
+            sock.recv(1, MSG_PEEK)
+        except SocketError as e:
+            return e.args[0] in (EAGAIN, EWOULDBLOCK)
+
+        # Either closed by the peer or unexpected data
+        return False
+
+    def _hand_over(self, record, client):
+        while record.waiters:
+            waiter = record.waiters.popleft()
+            if waiter.done:
+                continue
+            record.leased.add(client)
+            if waiter.timer is not None:
+                waiter.timer.unregister()
+            waiter.client = client
+            self.fire(waiter.event, self.channel)
+            return
+
+        client.idle_since = time()
+        record.idle.append(client)
+
+    def _fail(self, waiter, error):
+        if waiter.timer is not None:
+            waiter.timer.unregister()
+        waiter.error = error
+        self.fire(waiter.event, self.channel)
+
+    def _on_client_connected(self, client):
+        record = self._hosts[client.key]
+        record.connecting.discard(client)
+        self._hand_over(record, client)
+
+    def _on_client_failed(self, client, reason):
+        record = self._hosts[client.key]
+        if client not in record.connecting:
+            return
+
+        record.connecting.discard(client)
+        client.unregister()
+
+        if reason is None:
+            reason = SocketTimeout("timed out connecting")
+
+        # Fail the waiter the connection was opened for and all other ones
+        # if there is no other connection that could serve them.
+        while record.waiters:
+            waiter = record.waiters.popleft()
+            if waiter.done:
+                continue
+            self._fail(waiter, reason)
+            if record.connecting or record.leased:
+                break
+
+    def _on_client_closed(self, client):
+        record = self._hosts[client.key]
+
+        record.leased.discard(client)
+        if client in record.idle:
+            record.idle.remove(client)
+
+        client.unregister()
+
+        # Replace the connection for callers still waiting for one
+        pending = sum(1 for waiter in record.waiters if not waiter.done)
+        if pending > len(record.connecting) and \
+                len(record) < self.max_per_host:
+            self._open(client.key)
@@ -3,35 +3,55 @@
 This module contains various Socket Components for use with Networking.
 """
 import os
-import select
-from collections import defaultdict, deque
+from array import array
+from collections import OrderedDict, deque
 from errno import (
-    EAGAIN, EALREADY, EBADF, ECONNABORTED, EINPROGRESS, EINTR, EINVAL, EISCONN,
-    EMFILE, ENFILE, ENOBUFS, ENOMEM, ENOTCONN, EPERM, EPIPE, EWOULDBLOCK,
+    EAGAIN, EALREADY, EBADF, ECONNABORTED, ECONNREFUSED, ECONNRESET,
+    EINPROGRESS, EINTR, EINVAL, EISCONN, EMFILE, ENFILE, ENOBUFS, ENOMEM,
+    ENOTCONN, EPERM, EPIPE, EWOULDBLOCK,
 )
+from heapq import heappop, heappush
+from itertools import count
 from socket import (
     AF_INET, AF_INET6, AF_UNIX, IPPROTO_IP, IPPROTO_TCP, SO_BROADCAST,
-    SO_REUSEADDR, SOCK_DGRAM, SOCK_STREAM, SOL_SOCKET, TCP_NODELAY,
-    error as SocketError, gaierror, getaddrinfo, getfqdn, gethostbyname,
-    gethostname, socket,
+    SO_ERROR, SO_RCVBUF, SO_REUSEADDR, SOCK_DGRAM, SOCK_STREAM, SOL_SOCKET,
+    TCP_NODELAY, error as SocketError, gaierror, getaddrinfo, getfqdn,
+    gethostbyname, gethostname, socket, timeout as SocketTimeout,
 )
 from time import time
 
+try:
+    from socket import TCP_DEFER_ACCEPT
+except ImportError:
+    TCP_DEFER_ACCEPT = None
+
+try:
+    from socket import SO_REUSEPORT
+except ImportError:
+    SO_REUSEPORT = None
+
+try:
+    from socket import CMSG_LEN, SCM_RIGHTS
+except ImportError:
+    CMSG_LEN = SCM_RIGHTS = None
+
 from _socket import socket as SocketType
 
-from circuits.core import BaseComponent, handler
+from circuits.core import BaseComponent, Event, Timer, handler
 from circuits.core.pollers import BasePoller, Poller
 from circuits.core.utils import findcmp
 from circuits.six import binary_type
 
 from .events import (
-    close, closed, connect, connected, disconnect, disconnected, error, read,
-    ready, unreachable, write,
+    close, closed, connect, connected, disconnect, disconnected, drain, error,
+    pause_accepting, pause_writing, read, read_batch, ready, resume_accepting,
+    stats, unreachable, write,
 )
+from .utils import get_resolver, interleave_families, is_ip_address
 
 try:
-    from ssl import wrap_socket as ssl_socket
-    from ssl import CERT_NONE, PROTOCOL_SSLv23
+    from ssl import SSLContext
+    from ssl import CERT_NONE, HAS_SNI, PROTOCOL_SSLv23
     from ssl import SSLError, SSL_ERROR_WANT_WRITE, SSL_ERROR_WANT_READ
 
     HAS_SSL = 1
@@ -45,40 +65,320 @@ except ImportError:
 
 BUFSIZE = 4096  # 4KB Buffer
 BACKLOG = 5000  # 5K Concurrent Connections
+ACCEPT_BUDGET = 64  # Max. Connections accepted per wakeup
+HANDSHAKE_TIMEOUT = 10  # Max. Seconds a SSL Handshake may take
+ATTEMPT_DELAY = 0.25  # Seconds between Happy Eyeballs connection attempts
+HIGH_WATER = 65536  # Pause writing with more than 64KB buffered
+DATAGRAM_BUDGET = 64  # Max. Datagrams received/sent per wakeup
+SENDFILE_CHUNK = 262144  # Max. Bytes sent per sendfile() call
+
+# Per connection (and client) I/O counters
+IO_COUNTERS = (
+    "bytes_read", "bytes_written", "reads", "writes", "partial_writes",
+    "eagain", "errors",
+)
+
+_ssl_contexts = {}
+
+
+def get_ssl_context(server_side=False, certfile=None, keyfile=None,
+                    ca_certs=None, cert_reqs=CERT_NONE,
+                    ssl_version=PROTOCOL_SSLv23):
+    """Return the (shared) SSLContext for the given configuration
+
+    Contexts are created once per configuration and then reused for every
+    connection. Besides saving the cost of loading certificates and keys
+    per connection this lets servers resume sessions (from the context's
+    session cache or session tickets) of returning clients.
+
+    Certificates and keys are only read when the context is created.
+    """
+
+    key = (server_side, certfile, keyfile, ca_certs, cert_reqs, ssl_version)
+
+    context = _ssl_contexts.get(key)
+    if context is None:
+        context = SSLContext(ssl_version)
+        context.verify_mode = cert_reqs
+        if certfile:
+            context.load_cert_chain(certfile, keyfile)
+        if ca_certs:
+            context.load_verify_locations(ca_certs)
+        context = _ssl_contexts.setdefault(key, context)
+
+    return context
+
+
+def handshake(sock, poller, source):
+    """Advance the non-blocking SSL handshake of ``sock``
+
+    Returns ``True`` once the handshake is complete and ``sock`` has been
+    removed from the ``poller``. Otherwise ``sock`` is registered with the
+    ``poller`` for the readiness the handshake is waiting for (with
+    ``source`` as the target of the poller's events) and ``False`` is
+    returned. Handshake errors are raised.
+    """
+
+    try:
+        sock.do_handshake()
+    except SSLError as err:
+        if err.args[0] == SSL_ERROR_WANT_READ:
+            if poller.isWriting(sock):
+                poller.removeWriter(sock)
+            if not poller.isReading(sock):
+                poller.addReader(source, sock)
+        elif err.args[0] == SSL_ERROR_WANT_WRITE:
+            if poller.isReading(sock):
+                poller.removeReader(sock)
+            if not poller.isWriting(sock):
+                poller.addWriter(source, sock)
+        else:
+            raise
+        return False
+
+    poller.discard(sock)
+    return True
+
+
+def send_fds(sock, buffers, fds, flags=0, address=None):
+    """Send the file descriptors ``fds`` over the UNIX socket ``sock``
+
+    Backport of :func:`socket.send_fds` (Python 3.9+).
+    """
+
+    if SCM_RIGHTS is None:
+        raise RuntimeError("Passing file descriptors is not supported")
 
+    ancdata = [(SOL_SOCKET, SCM_RIGHTS, array("i", fds))]
+    if address is None:
+        return sock.sendmsg(buffers, ancdata, flags)
+    return sock.sendmsg(buffers, ancdata, flags, address)
 
-def do_handshake(sock, on_done=None, on_error=None, extra_args=None):
-    """SSL Async Handshake
 
-    :param on_done: Function called when handshake is complete
-    :type on_done: :function:
+def recv_fds(sock, bufsize, maxfds, flags=0):
+    """Receive up to ``maxfds`` file descriptors from the UNIX socket ``sock``
 
-    :param on_error: Function called when handshake errored
-    :type on_error: :function:
+    Backport of :func:`socket.recv_fds` (Python 3.9+).
+
+    Returns ``(data, fds, msg_flags, address)``.
     """
 
-    extra_args = extra_args or ()
+    if SCM_RIGHTS is None:
+        raise RuntimeError("Passing file descriptors is not supported")
+
+    fds = array("i")
+    msg, ancdata, msg_flags, address = sock.recvmsg(
+        bufsize, CMSG_LEN(maxfds * fds.itemsize), flags
+    )
+    for level, type, data in ancdata:
+        if level == SOL_SOCKET and type == SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+
+    return msg, list(fds), msg_flags, address
+
+
+class Connection(object):
+
+    """Connection record
+
+    Holds the per-connection state of a :class:`Server` connection: the
+    socket itself, its pending write buffer (and the number of bytes
+    ``buffered`` in it), I/O counters (see :data:`IO_COUNTERS`), TLS
+    state, timestamps and close and flow control flags. Instances are
+    created by the server and may be inspected via
+    :attr:`Server.connections` and :meth:`Server.get_connection`.
+    """
 
-    while True:
+    __slots__ = (
+        "sock", "buffer", "buffered", "paused", "closeflag", "tls", "created",
+        "last_read", "last_write",
+    ) + IO_COUNTERS
+
+    def __init__(self, sock, tls=False):
+        self.sock = sock
+        self.buffer = deque()
+        self.buffered = 0
+        self.paused = False
+        self.closeflag = False
+        self.tls = tls
+
+        self.created = self.last_read = self.last_write = time()
+
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.reads = 0
+        self.writes = 0
+        self.partial_writes = 0
+        self.eagain = 0
+        self.errors = 0
+
+    def __repr__(self):
         try:
-            sock.do_handshake()
-            break
-        except SSLError as err:
-            if err.args[0] == SSL_ERROR_WANT_READ:
-                select.select([sock], [], [])
-            elif err.args[0] == SSL_ERROR_WANT_WRITE:
-                select.select([], [sock], [])
-            else:
-                callable(on_error) and on_error(sock, err)
-                return
+            fileno = self.sock.fileno()
+        except SocketError:
+            fileno = -1
+
+        return "<Connection fd={0:d} tls={1} buffered={2:d}>".format(
+            fileno, self.tls, self.buffered
+        )
+
+    def stats(self):
+        """Return a snapshot of the connection's state and I/O counters"""
 
-        yield
+        try:
+            peer = self.sock.getpeername()
+        except SocketError:
+            peer = None
+
+        snapshot = dict((key, getattr(self, key)) for key in IO_COUNTERS)
+        snapshot.update(
+            peer=peer, tls=self.tls, buffered=self.buffered,
+            paused=self.paused, created=self.created,
+            last_read=self.last_read, last_write=self.last_write,
+        )
+        return snapshot
+
+
+def io_rates(keys, snapshot, previous, elapsed):
+    """Return the per second rates of the counters ``keys``
+
+    ``previous`` is the snapshot taken ``elapsed`` seconds before
+    ``snapshot``.
+    """
+
+    elapsed = float(max(elapsed, 1e-6))
+    return dict(
+        (key, (snapshot[key] - previous.get(key, 0)) / elapsed)
+        for key in keys
+    )
+
+
+class _report_stats(Event):
+
+    """_report_stats Event"""
+
+
+class FileTransfer(object):
+
+    """Pending transfer of a file queued by a ``sendfile`` Event
+
+    Sends ``count`` bytes (``None``: up to the end of the file) of
+    ``fileobj`` starting at ``offset`` to ``sock``, at most
+    :data:`SENDFILE_CHUNK` bytes per call of :meth:`send`. Uses
+    ``os.sendfile()`` where available, otherwise (TLS sockets, file-like
+    objects without a file descriptor) the file is read chunk by chunk.
+    """
 
-    callable(on_done) and on_done(sock, *extra_args)
+    __slots__ = ("fileobj", "offset", "remaining", "zerocopy")
+
+    def __init__(self, sock, fileobj, offset=0, count=None):
+        self.fileobj = fileobj
+        self.offset = offset
+
+        try:
+            fd = fileobj.fileno()
+        except (AttributeError, IOError, OSError, ValueError):
+            fd = None
+
+        self.zerocopy = (
+            fd is not None and hasattr(os, "sendfile") and
+            not hasattr(sock, "getpeercert")
+        )
+
+        if count is None and fd is not None:
+            count = max(os.fstat(fd).st_size - offset, 0)
+
+        # A negative count means: up to the end of the file
+        self.remaining = -1 if count is None else count
+
+    def __repr__(self):
+        return "<FileTransfer offset={0:d} remaining={1:d}>".format(
+            self.offset, self.remaining
+        )
+
+    @property
+    def done(self):
+        return self.remaining == 0
+
+    def send(self, sock):
+        """Send the next chunk and return the number of bytes sent"""
+
+        size = SENDFILE_CHUNK
+        if self.remaining > 0:
+            size = min(size, self.remaining)
+
+        if self.zerocopy:
+            nbytes = os.sendfile(
+                sock.fileno(), self.fileobj.fileno(), self.offset, size
+            )
+            if not nbytes:
+                self.remaining = 0  # End of file
+                return 0
+        else:
+            self.fileobj.seek(self.offset)
+            data = self.fileobj.read(size)
+            if not data:
+                self.remaining = 0  # End of file
+                return 0
+            nbytes = sock.send(data)
+
+        self.offset += nbytes
+        if self.remaining > 0:
+            self.remaining -= nbytes
+
+        return nbytes
+
+    def close(self):
+        try:
+            self.fileobj.close()
+        except (IOError, OSError):
+            pass
+
+
+def close_transfers(buffer):
+    """Close the files of all pending transfers in a write ``buffer``"""
+
+    for item in buffer:
+        if isinstance(item, FileTransfer):
+            item.close()
+
+
+def parse_write_limits(kwargs):
+    """Return the write ``(high_water, low_water, overflow)`` settings
+
+    ``write_high_water`` (default: :data:`HIGH_WATER`, ``None`` disables
+    flow control), ``write_low_water`` (default: a quarter of the high
+    mark) and ``write_overflow``, what to do once the high-water mark is
+    exceeded: ``"pause"`` (only fire ``pause_writing``), ``"drop"`` (also
+    drop further writes until the buffer has drained) or ``"close"`` (close
+    the connection).
+    """
+
+    high_water = kwargs.get("write_high_water", HIGH_WATER)
+    low_water = kwargs.get("write_low_water", (high_water or 0) // 4)
+    overflow = kwargs.get("write_overflow", "pause")
+
+    if overflow not in ("pause", "drop", "close"):
+        raise RuntimeError("write_overflow must be one of: pause, drop, close")
+
+    return high_water, low_water, overflow
 
 
 class Client(BaseComponent):
 
+    """Base Client Component
+
+    Data written to the client is buffered until the socket is writable.
+    Once more than ``write_high_water`` bytes are buffered a
+    ``pause_writing`` Event is fired and ``drain`` once the buffer has
+    fallen to ``write_low_water`` bytes again (see
+    :func:`parse_write_limits` for these and ``write_overflow``).
+
+    I/O counters are available with :meth:`get_stats` and, if
+    ``stats_interval`` is given, are fired as a ``stats`` Event that many
+    seconds apart.
+    """
+
     channel = "client"
 
     socket_family = AF_INET
@@ -101,9 +401,25 @@ class Client(BaseComponent):
         self._ssock = None
         self._poller = None
         self._buffer = deque()
+        self._buffered = 0
+        self._paused = False
         self._closeflag = False
         self._connected = False
 
+        self._high_water, self._low_water, self._overflow = parse_write_limits(kwargs)
+
+        self._counters = dict.fromkeys(
+            IO_COUNTERS + ("connects", "connect_errors"), 0
+        )
+        self._last_read = self._last_write = None
+
+        self._last_stats = (time(), {})
+        if kwargs.get("stats_interval"):
+            Timer(
+                kwargs["stats_interval"], _report_stats(), self.channel,
+                persist=True
+            ).register(self)
+
         self.host = None
         self.port = 0
         self.secure = False
@@ -118,6 +434,37 @@ class Client(BaseComponent):
     def connected(self):
         return getattr(self, "_connected", None)
 
+    @property
+    def buffered(self):
+        """Number of bytes waiting to be written"""
+
+        return self._buffered
+
+    def get_stats(self):
+        """Return a snapshot of the client's state and I/O counters
+
+        The counters (see :data:`IO_COUNTERS`) plus the number of
+        ``connects`` and ``connect_errors`` are kept over reconnects.
+        """
+
+        snapshot = dict(self._counters)
+        snapshot.update(
+            connected=self._connected, buffered=self._buffered,
+            paused=self._paused, last_read=self._last_read,
+            last_write=self._last_write,
+        )
+        return snapshot
+
+    @handler("_report_stats")
+    def _on_report_stats(self):
+        snapshot = self.get_stats()
+        now = time()
+        then, previous = self._last_stats
+        self._last_stats = (now, snapshot)
+
+        rates = io_rates(self._counters, snapshot, previous, now - then)
+        self.fire(stats(dict(snapshot, rates=rates)))
+
     @handler("registered", "started", channel="*")
     def _on_registered_or_started(self, component, manager=None):
         if self._poller is None:
@@ -155,7 +502,10 @@ class Client(BaseComponent):
 
         self._poller.discard(self._sock)
 
+        close_transfers(self._buffer)
         self._buffer.clear()
+        self._buffered = 0
+        self._paused = False
         self._closeflag = False
         self._connected = False
 
@@ -190,13 +540,18 @@ class Client(BaseComponent):
                     raise
 
             if data:
+                self._counters["reads"] += 1
+                self._counters["bytes_read"] += len(data)
+                self._last_read = time()
                 self.fire(read(data)).notify = True
             else:
                 self.close()
         except SocketError as e:
             if e.args[0] == EWOULDBLOCK:
+                self._counters["eagain"] += 1
                 return
             else:
+                self._counters["errors"] += 1
                 self.fire(error(e))
                 self._close()
 
@@ -208,8 +563,19 @@ class Client(BaseComponent):
                 nbytes = self._sock.send(data)
 
             if nbytes < len(data):
+                self._counters["partial_writes"] += 1
                 self._buffer.appendleft(data[nbytes:])
+
+            self._counters["writes"] += 1
+            self._counters["bytes_written"] += nbytes
+            self._last_write = time()
+
+            self._buffered -= nbytes
+            if self._paused and self._buffered <= self._low_water:
+                self._paused = False
+                self.fire(drain())
         except SocketError as e:
+            self._counters["errors"] += 1
             if e.args[0] in (EPIPE, ENOTCONN):
                 self._close()
             else:
@@ -217,9 +583,68 @@ class Client(BaseComponent):
 
     @handler("write")
     def write(self, data):
-        if not self._poller.isWriting(self._sock):
+        if self._paused and self._overflow == "drop":
+            return
+
+        # Data written while still connecting is sent once connected
+        if self._connected and not self._poller.isWriting(self._sock):
             self._poller.addWriter(self, self._sock)
         self._buffer.append(data)
+        self._buffered += len(data)
+
+        if not self._paused and self._high_water and self._buffered > self._high_water:
+            if self._overflow == "close":
+                self._close()
+            else:
+                self._paused = True
+                self.fire(pause_writing())
+
+    def _sendfile(self, transfer):
+        sock = self._ssock if self.secure and self._ssock else self._sock
+
+        try:
+            nbytes = transfer.send(sock)
+        except SSLError as e:
+            if e.args[0] in (SSL_ERROR_WANT_READ, SSL_ERROR_WANT_WRITE):
+                self._counters["eagain"] += 1
+                self._buffer.appendleft(transfer)
+                return
+            self._counters["errors"] += 1
+            transfer.close()
+            self.fire(error(e))
+            self._close()
+            return
+        except SocketError as e:
+            if e.args[0] in (EINTR, EWOULDBLOCK, ENOBUFS):
+                self._counters["eagain"] += 1
+                self._buffer.appendleft(transfer)
+                return
+            self._counters["errors"] += 1
+            transfer.close()
+            if e.args[0] in (EPIPE, ENOTCONN):
+                self._close()
+            else:
+                self.fire(error(e))
+            return
+
+        self._counters["writes"] += 1
+        self._counters["bytes_written"] += nbytes
+        self._last_write = time()
+
+        if transfer.done:
+            transfer.close()
+        else:
+            self._buffer.appendleft(transfer)
+
+    @handler("sendfile")
+    def sendfile(self, fileobj, offset=0, count=None):
+        if not self._connected:
+            fileobj.close()
+            return
+
+        if not self._poller.isWriting(self._sock):
+            self._poller.addWriter(self, self._sock)
+        self._buffer.append(FileTransfer(self._sock, fileobj, offset, count))
 
     @handler("_disconnect", priority=1)
     def __on_disconnect(self, sock):
@@ -233,7 +658,10 @@ class Client(BaseComponent):
     def __on_write(self, sock):
         if self._buffer:
             data = self._buffer.popleft()
-            self._write(data)
+            if isinstance(data, FileTransfer):
+                self._sendfile(data)
+            else:
+                self._write(data)
 
         if not self._buffer:
             if self._closeflag:
@@ -241,19 +669,55 @@ class Client(BaseComponent):
             elif self._poller.isWriting(self._sock):
                 self._poller.removeWriter(self._sock)
 
-    def _create_socket(self):
-        sock = socket(self.socket_family, self.socket_type, self.socket_protocol)
+    def _create_socket(self, family=None):
+        family = family or self.socket_family
+        sock = socket(family, self.socket_type, self.socket_protocol)
 
         for option in self.socket_options:
             sock.setsockopt(*option)
         sock.setblocking(False)
-        if self._bind is not None:
+        if self._bind is not None and family == self.socket_family:
             sock.bind(self._bind)
         return sock
 
 
+class _resolved(Event):
+
+    """_resolved Event"""
+
+
+class _next_attempt(Event):
+
+    """_next_attempt Event"""
+
+
+class _connect_timeout(Event):
+
+    """_connect_timeout Event"""
+
+
 class TCPClient(Client):
 
+    """TCP Client
+
+    Connections are established without blocking the event loop. Host
+    names are resolved by a :class:`~circuits.net.utils.Resolver` (in a
+    thread and cached, the default Resolver is shared by all clients),
+    the socket connects in non-blocking mode and the poller signals once
+    the connection attempt has completed. Secure connections are only
+    reported as ``connected`` once the TLS handshake, also driven by the
+    poller, has completed. An ``unreachable`` Event is fired if no
+    connection could be established within ``connect_timeout`` seconds.
+
+    With ``happy_eyeballs`` the host name is resolved for all address
+    families and connection attempts are raced as described by RFC 8305:
+    addresses are tried alternating between IPv6 and IPv4, a new attempt
+    is started every ``attempt_delay`` seconds (or as soon as an attempt
+    fails) while earlier ones are still pending, and the first connection
+    established wins while all others are closed. This also works for
+    host names with several addresses of the same family.
+    """
+
     socket_family = AF_INET
     socket_type = SOCK_STREAM
     socket_protocol = IPPROTO_TCP
@@ -261,14 +725,33 @@ class TCPClient(Client):
         (IPPROTO_TCP, TCP_NODELAY, 1),
     ]
 
-    def init(self, connect_timeout=5, *args, **kwargs):
+    def init(self, connect_timeout=5, resolver=None, happy_eyeballs=False,
+             attempt_delay=ATTEMPT_DELAY, *args, **kwargs):
         self.connect_timeout = connect_timeout
+        self.resolver = resolver or get_resolver()
+        self.happy_eyeballs = happy_eyeballs
+        self.attempt_delay = attempt_delay
 
-    @handler("connect")  # noqa
-    def connect(self, host, port, secure=False, **kwargs):
-        # XXX: C901: This has a high McCacbe complexity score of 10.
-        # TODO: Refactor this!
+        self._attempt = None
+        self._handshaking = False
+        self._connect_timer = None
+
+        # Happy Eyeballs: addresses still to try, pending attempts
+        # (socket -> address) and the timer starting the next attempt
+        self._candidates = deque()
+        self._racing = {}
+        self._race_timer = None
+        self._race_error = None
 
+        # SSL sessions to resume per (host, port)
+        self._ssl_sessions = {}
+
+    @property
+    def connecting(self):
+        return getattr(self, "_attempt", None) is not None
+
+    @handler("connect")
+    def connect(self, host, port, secure=False, **kwargs):
         self.host = host
         self.port = port
         self.secure = secure
@@ -277,52 +760,253 @@ class TCPClient(Client):
             self.certfile = kwargs.get("certfile", None)
             self.keyfile = kwargs.get("keyfile", None)
             self.ca_certs = kwargs.get("ca_certs", None)
+            self.ssl_context = kwargs.get("ssl_context", None) or get_ssl_context(
+                certfile=self.certfile, keyfile=self.keyfile,
+                ca_certs=self.ca_certs,
+            )
 
-        try:
-            r = self._sock.connect((host, port))
-        except SocketError as e:
-            if e.args[0] in (EBADF, EINVAL,):
-                self._sock = self._create_socket()
-                r = self._sock.connect_ex((host, port))
-            else:
+        if self.connecting:
+            self._abort_connect()
+
+        attempt = self._attempt = object()
+
+        if self.connect_timeout:
+            self._connect_timer = Timer(
+                self.connect_timeout, _connect_timeout(attempt), self.channel
+            ).register(self)
+
+        family = self.socket_family
+        if self.happy_eyeballs:
+            family = 0
+        elif is_ip_address(host, family):
+            return self._connect((host, port))
+
+        def on_resolved(addresses, err):
+            self.fire(_resolved(attempt, addresses, err))
+
+        self.resolver.resolve(
+            on_resolved, host, port, family, self.socket_type
+        )
+
+    @handler("_resolved")
+    def _on_resolved(self, attempt, addresses, err):
+        if attempt is not self._attempt:
+            return
+
+        if err is not None:
+            return self._connect_failed(err)
+
+        if self.happy_eyeballs:
+            self._candidates.extend(interleave_families(addresses))
+            return self._start_attempt()
+
+        return self._connect(addresses[0][4])
+
+    @handler("_next_attempt")
+    def _on_next_attempt(self, attempt):
+        if attempt is self._attempt:
+            self._race_timer = None
+            self._start_attempt()
+
+    def _start_attempt(self):
+        if self._race_timer is not None:
+            self._race_timer.unregister()
+            self._race_timer = None
+
+        while self._candidates:
+            family, _, _, _, address = self._candidates.popleft()
+            sock = self._create_socket(family)
+
+            try:
+                r = sock.connect_ex(address)
+            except SocketError as e:
                 r = e.args[0]
 
-            if r not in (EISCONN, EWOULDBLOCK, EINPROGRESS, EALREADY):
-                self.fire(unreachable(host, port, e))
-                self.fire(error(e))
-                self._close()
-                raise StopIteration()
+            if r in (0, EISCONN,):
+                return self._attempt_won(sock)
+            elif r in (EWOULDBLOCK, EINPROGRESS, EALREADY,):
+                self._racing[sock] = address
+                self._poller.addWriter(self, sock)
+                if self._candidates:
+                    self._race_timer = Timer(
+                        self.attempt_delay, _next_attempt(self._attempt),
+                        self.channel
+                    ).register(self)
+                return
+
+            self._race_error = SocketError(r, os.strerror(r))
+            sock.close()
+
+        if not self._racing:
+            self._connect_failed(
+                self._race_error or SocketError(EINVAL, os.strerror(EINVAL))
+            )
+
+    def _attempt_ready(self, event, sock):
+        self._racing.pop(sock)
+        self._poller.discard(sock)
+
+        err = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+        if err or event.name == "_disconnect":
+            err = err or ECONNREFUSED
+            self._race_error = SocketError(err, os.strerror(err))
+            sock.close()
+            # Start the next attempt right away
+            return self._start_attempt()
+
+        return self._attempt_won(sock)
 
-        stop_time = time() + self.connect_timeout
-        while time() < stop_time:
+    def _attempt_won(self, sock):
+        self._cancel_attempts()
+
+        try:
+            self._sock.close()
+        except SocketError:
+            pass
+
+        self._sock = sock
+        return self._on_connected()
+
+    def _cancel_attempts(self):
+        if self._race_timer is not None:
+            self._race_timer.unregister()
+            self._race_timer = None
+
+        self._candidates.clear()
+        self._race_error = None
+
+        for sock in list(self._racing):
+            self._poller.discard(sock)
             try:
-                self._sock.getpeername()
-                self._connected = True
-                break
-            except Exception as e:
-                yield
+                sock.close()
+            except SocketError:
+                pass
+        self._racing.clear()
 
-        if not self._connected:
-            self.fire(unreachable(host, port))
-            raise StopIteration()
+    @handler("_connect_timeout")
+    def _on_connect_timeout(self, attempt):
+        if attempt is not self._attempt:
+            return
 
-        def on_done(sock):
-            self._poller.addReader(self, sock)
-            self.fire(connected(host, port))
+        self._counters["connect_errors"] += 1
+        self._abort_connect()
+        self.fire(unreachable(self.host, self.port))
 
-        if self.secure:
-            def on_error(sock, err):
-                self.fire(error(sock, err))
-                self._close()
+    @handler("_read", "_write", "_disconnect", priority=2)
+    def _on_connect_ready(self, event, sock):
+        if sock in self._racing:
+            event.stop()
+            return self._attempt_ready(event, sock)
 
-            self._sock = ssl_socket(
-                self._sock, self.keyfile, self.certfile, ca_certs=self.ca_certs,
-                do_handshake_on_connect=False
-            )
-            for _ in do_handshake(self._sock, on_done, on_error):
-                yield
+        if not self.connecting or sock is not self._sock:
+            return
+
+        event.stop()
+
+        if self._handshaking:
+            if event.name == "_disconnect":
+                return self._connect_failed(SocketError(ECONNRESET, os.strerror(ECONNRESET)))
+            return self._continue_handshake()
+
+        err = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+        if err or event.name == "_disconnect":
+            err = err or ECONNREFUSED
+            return self._connect_failed(SocketError(err, os.strerror(err)))
+
+        self._poller.removeWriter(sock)
+
+        return self._on_connected()
+
+    def _connect(self, address):
+        try:
+            r = self._sock.connect_ex(address)
+        except ValueError:
+            # SSL socket of a previous connection
+            r = EBADF
+        except SocketError as e:
+            r = e.args[0]
+
+        if r in (EBADF, EINVAL,):
+            self._sock = self._create_socket()
+            r = self._sock.connect_ex(address)
+
+        if r in (0, EISCONN,):
+            return self._on_connected()
+        elif r in (EWOULDBLOCK, EINPROGRESS, EALREADY,):
+            self._poller.addWriter(self, self._sock)
         else:
-            on_done(self._sock)
+            return self._connect_failed(SocketError(r, os.strerror(r)))
+
+    def _cancel_connect(self):
+        self._cancel_attempts()
+        self._attempt = None
+        self._handshaking = False
+        if self._connect_timer is not None:
+            self._connect_timer.unregister()
+            self._connect_timer = None
+
+    def _abort_connect(self):
+        self._cancel_connect()
+        self._poller.discard(self._sock)
+        try:
+            self._sock.close()
+        except SocketError:
+            pass
+
+    def _connect_failed(self, e):
+        self._counters["connect_errors"] += 1
+        self._abort_connect()
+        self.fire(unreachable(self.host, self.port, e))
+        self.fire(error(e))
+
+    def _on_connected(self):
+        if not self.secure:
+            return self._connect_done()
+
+        kwargs = {}
+        if HAS_SNI and not is_ip_address(self.host, self.socket_family):
+            kwargs["server_hostname"] = self.host
+        session = self._ssl_sessions.get((self.host, self.port))
+        if session is not None:
+            kwargs["session"] = session
+
+        self._sock = self.ssl_context.wrap_socket(
+            self._sock, do_handshake_on_connect=False, **kwargs
+        )
+        self._handshaking = True
+        self._continue_handshake()
+
+    def _continue_handshake(self):
+        try:
+            done = handshake(self._sock, self._poller, self)
+        except SocketError as e:
+            self._abort_connect()
+            self.fire(error(e))
+        else:
+            if done:
+                self._connect_done()
+
+    def _connect_done(self):
+        self._cancel_connect()
+        self._connected = True
+        self._counters["connects"] += 1
+
+        self._poller.addReader(self, self._sock)
+        if self._buffer and not self._poller.isWriting(self._sock):
+            self._poller.addWriter(self, self._sock)
+
+        self.fire(connected(self.host, self.port))
+
+    def _close(self):
+        if self.connecting:
+            self._abort_connect()
+        elif self._connected and self.secure:
+            # Session tickets may only arrive after the handshake
+            session = getattr(self._sock, "session", None)
+            if session is not None:
+                self._ssl_sessions[(self.host, self.port)] = session
+
+        super(TCPClient, self)._close()
 
 
 class TCP6Client(TCPClient):
@@ -339,11 +1023,40 @@ class UNIXClient(Client):
     socket_type = SOCK_STREAM
     socket_options = []
 
+    _handshaking = False
+
     @handler("ready")
     def ready(self, component):
         if self._poller is not None and self._connected:
             self._poller.addReader(self, self._sock)
 
+    @handler("_read", "_write", "_disconnect", priority=2)
+    def _on_handshake_ready(self, event, sock):
+        if not self._handshaking or sock is not self._sock:
+            return
+
+        event.stop()
+
+        if event.name == "_disconnect":
+            self._handshaking = False
+            self._close()
+            self.fire(error(SocketError(ECONNRESET, os.strerror(ECONNRESET))))
+        else:
+            self._continue_handshake()
+
+    def _continue_handshake(self):
+        try:
+            done = handshake(self._sock, self._poller, self)
+        except SocketError as e:
+            self._handshaking = False
+            self._close()
+            self.fire(error(e))
+        else:
+            if done:
+                self._handshaking = False
+                self._poller.addReader(self, self._sock)
+                self.fire(connected(gethostname(), self.path))
+
     @handler("connect")  # noqa
     def connect(self, path, secure=False, **kwargs):
         # XXX: C901: This has a high McCacbe complexity score of 10.
@@ -366,32 +1079,106 @@ class UNIXClient(Client):
             if r in (EISCONN, EWOULDBLOCK, EINPROGRESS, EALREADY):
                 self._connected = True
             else:
+                self._counters["connect_errors"] += 1
                 self.fire(error(r))
                 return
 
         self._connected = True
-
-        self._poller.addReader(self, self._sock)
+        self._counters["connects"] += 1
 
         if self.secure:
-            def on_done(sock):
-                self.fire(connected(gethostname(), path))
-
-            def on_error(sock, err):
-                self.fire(error(err))
-
-            self._ssock = ssl_socket(
-                self._sock, self.keyfile, self.certfile, ca_certs=self.ca_certs,
-                do_handshake_on_connect=False
+            # The handshake is driven by the poller, see: handshake()
+            context = kwargs.get("ssl_context", None) or get_ssl_context(
+                certfile=self.certfile, keyfile=self.keyfile,
+                ca_certs=self.ca_certs,
             )
-            for _ in do_handshake(self._ssock, on_done, on_error):
-                yield
+            self._sock = context.wrap_socket(
+                self._sock, do_handshake_on_connect=False
+            )
+            self._handshaking = True
+            self._continue_handshake()
         else:
+            self._poller.addReader(self, self._sock)
             self.fire(connected(gethostname(), path))
 
 
+class _expire_connections(Event):
+
+    """_expire_connections Event"""
+
+
 class Server(BaseComponent):
 
+    """Base Server Component
+
+    Besides the positional arguments the following keyword arguments
+    are understood:
+
+    :param accept_budget: maximum number of connections accepted per
+                          wakeup of the listening socket.
+    :type accept_budget:  ``int``
+
+    :param defer_accept:  only accept connections once the client has sent
+                          some data, waiting at most this many seconds
+                          (``TCP_DEFER_ACCEPT``, TCP servers on Linux only).
+    :type defer_accept:   ``int``
+
+    :param handshake_timeout: seconds after which connections that have
+                              not completed their SSL handshake are closed.
+    :type handshake_timeout:  ``float``
+
+    :param idle_timeout:  close connections that have neither sent nor
+                          received anything for this many seconds.
+    :type idle_timeout:   ``float``
+
+    :param max_lifetime:  close connections after this many seconds.
+    :type max_lifetime:   ``float``
+
+    :param max_connections: stop accepting new connections (the listening
+                            socket is removed from the poller and
+                            ``pause_accepting`` is fired) while this many
+                            connections are open.
+    :type max_connections:  ``int``
+
+    :param reuse_port:    bind with ``SO_REUSEPORT`` so that several
+                          processes can listen on the same address and
+                          have the kernel balance connections between them.
+    :type reuse_port:     ``bool``
+
+    :param ssl_context:   SSLContext to use for secure connections instead
+                          of the (shared) one created from ``certfile``,
+                          ``keyfile``, ``ca_certs``, ``cert_reqs`` and
+                          ``ssl_version``.
+    :type ssl_context:    ``ssl.SSLContext``
+
+    :param write_high_water: fire ``pause_writing(sock)`` once more than
+                             this many bytes are buffered for a connection
+                             (``None`` disables write flow control).
+    :type write_high_water:  ``int``
+
+    :param write_low_water:  fire ``drain(sock)`` once the buffer of a
+                             paused connection has fallen to this many
+                             bytes.
+    :type write_low_water:   ``int``
+
+    :param write_overflow:   ``"pause"``, ``"drop"`` or ``"close"``, see
+                             :func:`parse_write_limits`.
+    :type write_overflow:    ``str``
+
+    :param stats_interval:   fire a ``stats`` Event with a snapshot of the
+                             server's counters every this many seconds
+                             (see :meth:`get_stats`).
+    :type stats_interval:    ``float``
+
+    Accepted connections can also be handed off to other processes
+    (see :meth:`add_handoff` and :class:`HandoffServer`) instead of being
+    handled by this server.
+
+    If ``bind`` is an already bound (and listening) socket, it is used
+    as is. This allows pre-forked worker processes to share a listening
+    socket created by their parent.
+    """
+
     channel = "server"
     socket_protocol = IPPROTO_IP
 
@@ -400,22 +1187,56 @@ class Server(BaseComponent):
         super(Server, self).__init__(channel=channel)
 
         self.socket_options = self.socket_options[:] + kwargs.get('socket_options', [])
+        if kwargs.get("reuse_port", False):
+            if SO_REUSEPORT is None:
+                raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+            self.socket_options.append((SOL_SOCKET, SO_REUSEPORT, 1))
         self._bind = self.parse_bind_parameter(bind)
 
         self._backlog = backlog
         self._bufsize = bufsize
 
+        self._accept_budget = kwargs.get("accept_budget", ACCEPT_BUDGET)
+        self._defer_accept = kwargs.get("defer_accept", 0)
+
+        self._high_water, self._low_water, self._overflow = parse_write_limits(kwargs)
+
         if isinstance(bind, socket):
             self._sock = bind
+            self._sock.setblocking(False)
         else:
             self._sock = self._create_socket()
 
-        self._closeq = []
-        self._clients = []
         self._poller = None
-        self._buffers = defaultdict(deque)
-
-        self.__starttls = set()
+        self._handoffs = {}
+        self._connections = {}
+
+        # SSL sockets still handshaking, oldest first
+        self._handshakes = OrderedDict()
+        self._handshake_timeout = kwargs.get("handshake_timeout", HANDSHAKE_TIMEOUT)
+
+        self._idle_timeout = kwargs.get("idle_timeout", None)
+        self._max_lifetime = kwargs.get("max_lifetime", None)
+        self._max_connections = kwargs.get("max_connections", None)
+
+        # Connection deadlines: a heap of (deadline, seq, sock) entries
+        # that are re-checked (and pushed back on activity) once due.
+        self._deadlines = []
+        self._deadline_seq = count()
+        self._expiry_timer = None
+
+        self._accepting = True
+        self._metrics = dict.fromkeys((
+            "accepted", "accept_errors", "accept_pauses",
+            "handshake_timeouts", "idle_timeouts", "lifetime_expirations",
+        ) + IO_COUNTERS, 0)
+
+        self._last_stats = (time(), {})
+        if kwargs.get("stats_interval"):
+            Timer(
+                kwargs["stats_interval"], _report_stats(), self.channel,
+                persist=True
+            ).register(self)
 
         self.secure = secure
         self.certfile = kwargs.get("certfile")
@@ -423,8 +1244,11 @@ class Server(BaseComponent):
         self.cert_reqs = kwargs.get("cert_reqs", CERT_NONE)
         self.ssl_version = kwargs.get("ssl_version", PROTOCOL_SSLv23)
         self.ca_certs = kwargs.get("ca_certs", None)
-        if self.secure and not self.certfile:
+        self.ssl_context = kwargs.get("ssl_context", None)
+        if self.secure and not (self.certfile or self.ssl_context):
             raise RuntimeError("certfile must be specified for server-side operations")
+        if self.secure and HAS_SSL and self.ssl_context is None:
+            self.ssl_context = self._get_ssl_context()
 
     def parse_bind_parameter(self, bind_parameter):
         return parse_ipv4_parameter(bind_parameter)
@@ -433,6 +1257,115 @@ class Server(BaseComponent):
     def connected(self):
         return True
 
+    @property
+    def connections(self):
+        """List of :class:`Connection` records of all connected clients"""
+
+        return list(self._connections.values())
+
+    @property
+    def accepting(self):
+        """Is the server accepting new connections?"""
+
+        return self._accepting
+
+    @property
+    def metrics(self):
+        """Connection metrics of the server
+
+        A dict of the current number of ``connections`` and of counters of
+        connections ``accepted``, failed attempts to accept (``accept_errors``),
+        times accepting was paused (``accept_pauses``), of connections
+        closed because of ``handshake_timeouts``, ``idle_timeouts`` or
+        ``lifetime_expirations`` and the sums of the I/O counters (see
+        :data:`IO_COUNTERS`) of all current and past connections.
+        """
+
+        metrics = dict(self._metrics)
+        for conn in self._io_connections():
+            for key in IO_COUNTERS:
+                metrics[key] += getattr(conn, key)
+        metrics["connections"] = self._count_connections()
+        metrics["buffered"] = sum(
+            conn.buffered for conn in self._io_connections()
+        )
+        return metrics
+
+    def get_stats(self, connections=True):
+        """Return a snapshot of the server's :attr:`metrics`
+
+        With ``connections`` the snapshot also holds the list of the
+        :meth:`Connection.stats` of all connections (``connection_stats``),
+        eg: to look for connections with a lot of ``buffered`` data or no
+        recent reads.
+        """
+
+        snapshot = self.metrics
+        if connections:
+            snapshot["connection_stats"] = [
+                conn.stats() for conn in self._io_connections()
+            ]
+        return snapshot
+
+    def _io_connections(self):
+        return self._connections.values()
+
+    @handler("_report_stats")
+    def _on_report_stats(self):
+        snapshot = self.get_stats(connections=False)
+        now = time()
+        then, previous = self._last_stats
+        self._last_stats = (now, snapshot)
+
+        rates = io_rates(self._metrics, snapshot, previous, now - then)
+        self.fire(stats(dict(snapshot, rates=rates)))
+
+    def _count_connections(self):
+        return len(self._connections) + len(self._handshakes)
+
+    def get_connection(self, sock):
+        """Return the :class:`Connection` record of ``sock`` (or ``None``)"""
+
+        return self._connections.get(sock)
+
+    @property
+    def handoffs(self):
+        """Number of active connections handed off per hand-off socket"""
+
+        return dict(self._handoffs)
+
+    def add_handoff(self, sock):
+        """Hand off accepted connections over the UNIX socket ``sock``
+
+        Once at least one hand-off socket has been added, accepted
+        connections are no longer handled by this server but are passed
+        (``SCM_RIGHTS``) to the hand-off socket with the least active
+        connections. The other end is normally a :class:`HandoffServer`
+        running in another process.
+
+        ``sock`` is made non-blocking; connections are handed off to the
+        next hand-off socket while a busy one's buffer is full.
+        """
+
+        sock.setblocking(False)
+        self._handoffs[sock] = 0
+        if self._poller is not None:
+            self._poller.addReader(self, sock)
+
+    def remove_handoff(self, sock):
+        """Stop handing off connections over the UNIX socket ``sock``"""
+
+        if self._handoffs.pop(sock, None) is None:
+            return
+
+        if self._poller is not None:
+            self._poller.discard(sock)
+
+        try:
+            sock.close()
+        except SocketError:
+            pass
+
     @property
     def host(self):
         if getattr(self, "_sock", None) is not None:
@@ -475,6 +1408,12 @@ class Server(BaseComponent):
                     self._poller.addReader(self, self._sock)
                     self.fire(ready(self, (self.host, self.port)))
 
+            if not self._accepting:
+                self._poller.removeReader(self._sock)
+
+            for sock in self._handoffs:
+                self._poller.addReader(self, sock)
+
     @handler("stopped", channel="*")
     def _on_stopped(self, component):
         self.fire(close())
@@ -489,22 +1428,26 @@ class Server(BaseComponent):
         if sock is None:
             return
 
-        if sock != self._sock and sock not in self._clients:
+        if sock in self._handshakes:
+            return self._abort_handshake(sock)
+
+        conn = self._connections.pop(sock, None)
+        if conn is None and sock != self._sock:
             return
 
         self._poller.discard(sock)
 
-        if sock in self._buffers:
-            del self._buffers[sock]
-
-        if sock in self._clients:
-            self._clients.remove(sock)
+        if conn is not None:
+            for key in IO_COUNTERS:
+                self._metrics[key] += getattr(conn, key)
+            close_transfers(conn.buffer)
+            conn.buffer.clear()
+            conn.buffered = 0
+            conn.closeflag = False
+            self._resume_accepting()
         else:
             self._sock = None
 
-        if sock in self.__starttls:
-            self.__starttls.remove(sock)
-
         try:
             sock.shutdown(2)
         except SocketError:
@@ -522,150 +1465,456 @@ class Server(BaseComponent):
 
         if sock is None:
             socks = [self._sock]
-            socks.extend(self._clients[:])
+            socks.extend(list(self._connections))
+            socks.extend(list(self._handshakes))
+
+            for handoff in list(self._handoffs):
+                self.remove_handoff(handoff)
         else:
             socks = [sock]
 
         for sock in socks:
-            if not self._buffers[sock]:
+            conn = self._connections.get(sock)
+            if conn is None or not conn.buffer:
                 self._close(sock)
-            elif sock not in self._closeq:
-                self._closeq.append(sock)
+            else:
+                conn.closeflag = True
 
         if is_closed:
             self.fire(closed())
 
     def _read(self, sock):
-        if sock not in self._clients:
+        conn = self._connections.get(sock)
+        if conn is None:
             return
 
         try:
             data = sock.recv(self._bufsize)
             if data:
+                conn.reads += 1
+                conn.bytes_read += len(data)
+                conn.last_read = time()
                 self.fire(read(sock, data)).notify = True
             else:
                 self.close(sock)
+        except SSLError as e:
+            if e.args[0] in (SSL_ERROR_WANT_READ, SSL_ERROR_WANT_WRITE):
+                conn.eagain += 1
+                return
+            conn.errors += 1
+            self.fire(error(sock, e))
+            self._close(sock)
         except SocketError as e:
             if e.args[0] == EWOULDBLOCK:
+                conn.eagain += 1
                 return
             else:
+                conn.errors += 1
                 self.fire(error(sock, e))
                 self._close(sock)
 
-    def _write(self, sock, data):
-        if sock not in self._clients:
-            return
+    def _write(self, conn, data):
+        sock = conn.sock
 
         try:
             nbytes = sock.send(data)
+            conn.writes += 1
+            conn.bytes_written += nbytes
+            conn.last_write = time()
             if nbytes < len(data):
-                self._buffers[sock].appendleft(data[nbytes:])
+                conn.partial_writes += 1
+                conn.buffer.appendleft(data[nbytes:])
+
+            conn.buffered -= nbytes
+            if conn.paused and conn.buffered <= self._low_water:
+                conn.paused = False
+                self.fire(drain(sock))
+        except SSLError as e:
+            if e.args[0] in (SSL_ERROR_WANT_READ, SSL_ERROR_WANT_WRITE):
+                conn.eagain += 1
+                conn.buffer.appendleft(data)
+            else:
+                conn.errors += 1
+                self.fire(error(sock, e))
+                self._close(sock)
         except SocketError as e:
             if e.args[0] not in (EINTR, EWOULDBLOCK, ENOBUFS):
+                conn.errors += 1
                 self.fire(error(sock, e))
                 self._close(sock)
             else:
-                self._buffers[sock].appendleft(data)
+                conn.eagain += 1
+                conn.buffer.appendleft(data)
 
     @handler("write")
     def write(self, sock, data):
+        conn = self._connections.get(sock)
+        if conn is None:
+            return
+
+        if conn.paused and self._overflow == "drop":
+            return
+
         if not self._poller.isWriting(sock):
             self._poller.addWriter(self, sock)
-        self._buffers[sock].append(data)
+        conn.buffer.append(data)
+        conn.buffered += len(data)
+
+        if not conn.paused and self._high_water and conn.buffered > self._high_water:
+            if self._overflow == "close":
+                self._close(sock)
+            else:
+                conn.paused = True
+                self.fire(pause_writing(sock))
+
+    def _sendfile(self, conn, transfer):
+        sock = conn.sock
 
-    def _accept(self):
         try:
-            newsock, host = self._sock.accept()
+            nbytes = transfer.send(sock)
+        except SSLError as e:
+            if e.args[0] in (SSL_ERROR_WANT_READ, SSL_ERROR_WANT_WRITE):
+                conn.eagain += 1
+                conn.buffer.appendleft(transfer)
+                return
+            conn.errors += 1
+            transfer.close()
+            self.fire(error(sock, e))
+            self._close(sock)
+            return
         except SocketError as e:
-            if e.args[0] in (EWOULDBLOCK, EAGAIN):
+            if e.args[0] in (EINTR, EWOULDBLOCK, ENOBUFS):
+                conn.eagain += 1
+                conn.buffer.appendleft(transfer)
                 return
-            elif e.args[0] == EPERM:
-                # Netfilter on Linux may have rejected the
-                # connection, but we get told to try to accept()
-                # anyway.
+            conn.errors += 1
+            transfer.close()
+            self.fire(error(sock, e))
+            self._close(sock)
+            return
+
+        conn.writes += 1
+        conn.bytes_written += nbytes
+        conn.last_write = time()
+
+        if transfer.done:
+            transfer.close()
+        else:
+            conn.buffer.appendleft(transfer)
+
+    @handler("sendfile")
+    def sendfile(self, sock, fileobj, offset=0, count=None):
+        conn = self._connections.get(sock)
+        if conn is None:
+            fileobj.close()
+            return
+
+        if not self._poller.isWriting(sock):
+            self._poller.addWriter(self, sock)
+        conn.buffer.append(FileTransfer(sock, fileobj, offset, count))
+
+    def _accept(self):
+        accepted = self._accept_connections()
+        self._metrics["accepted"] += len(accepted)
+
+        if self._handoffs:
+            for newsock, host in accepted:
+                self._handoff(newsock)
+        elif self.secure and HAS_SSL:
+            for newsock, host in accepted:
+                self._start_handshake(newsock, True, host)
+        else:
+            for newsock, host in accepted:
+                self._on_accept_done(newsock, True, host)
+
+        if self._at_capacity():
+            self._pause_accepting()
+
+    def _at_capacity(self):
+        if self._max_connections is None or self._handoffs:
+            return False
+        return self._count_connections() >= self._max_connections
+
+    def _pause_accepting(self):
+        if not self._accepting:
+            return
+
+        self._accepting = False
+        self._metrics["accept_pauses"] += 1
+
+        if self._poller is not None and self._sock is not None:
+            self._poller.removeReader(self._sock)
+
+        self.fire(pause_accepting(self._count_connections()))
+
+        # Retry periodically in case we ran out of file descriptors
+        self._schedule_expiry()
+
+    def _resume_accepting(self):
+        if self._accepting or self._sock is None or self._at_capacity():
+            return
+
+        self._accepting = True
+
+        if self._poller is not None:
+            self._poller.addReader(self, self._sock)
+
+        self.fire(resume_accepting(self._count_connections()))
+
+    def _accept_connections(self):
+        """Accept pending connections
+
+        Accepts up to ``accept_budget`` connections per wakeup of the
+        listening socket (or until there are none left) and returns
+        them as a list of ``(sock, peername)`` tuples.
+        """
+
+        accepted = []
+
+        budget = self._accept_budget
+        if self._max_connections is not None and not self._handoffs:
+            budget = min(budget, self._max_connections - self._count_connections())
+
+        for _ in range(budget):
+            try:
+                newsock, host = self._sock.accept()
+            except SocketError as e:
+                if e.args[0] in (EWOULDBLOCK, EAGAIN):
+                    break
+                elif e.args[0] in (EPERM, ECONNABORTED):
+                    # Netfilter on Linux may have rejected the
+                    # connection, but we get told to try to accept()
+                    # anyway. ECONNABORTED is documented as possible on
+                    # both Linux and Windows if a client sends a FIN or
+                    # RST before application code calls accept(2).
+                    # Either way the next connection may be fine.
+                    continue
+                elif e.args[0] in (EMFILE, ENOBUFS, ENFILE, ENOMEM):
+                    # Linux gives EMFILE when a process is not allowed
+                    # to allocate any more file descriptors.  *BSD and
+                    # Win32 give (WSA)ENOBUFS.  Linux can also give
+                    # ENFILE if the system is out of inodes, or ENOMEM
+                    # if there is insufficient memory to allocate a new
+                    # dentry. Stop accepting for a while instead of being
+                    # woken up for the same pending connection again.
+                    self._metrics["accept_errors"] += 1
+                    self.fire(error(self._sock, e))
+                    self._pause_accepting()
+                    break
+                else:
+                    raise
+
+            accepted.append((newsock, host))
+
+        return accepted
+
+    def _handoff(self, sock):
+        try:
+            # Least connections first, the next one if a worker is busy
+            # (its buffer is full) or gone. The connection is only dropped
+            # if none of them can take it.
+            for target in sorted(self._handoffs, key=self._handoffs.get):
+                try:
+                    send_fds(target, [b"\0"], [sock.fileno()])
+                except SocketError as e:
+                    if e.args[0] not in (EWOULDBLOCK, EAGAIN):
+                        self.fire(error(target, e))
+                        self.remove_handoff(target)
+                    continue
+
+                self._handoffs[target] += 1
                 return
-            elif e.args[0] in (EMFILE, ENOBUFS, ENFILE, ENOMEM, ECONNABORTED):
-                # Linux gives EMFILE when a process is not allowed
-                # to allocate any more file descriptors.  *BSD and
-                # Win32 give (WSA)ENOBUFS.  Linux can also give
-                # ENFILE if the system is out of inodes, or ENOMEM
-                # if there is insufficient memory to allocate a new
-                # dentry.  ECONNABORTED is documented as possible on
-                # both Linux and Windows, but it is not clear
-                # whether there are actually any circumstances under
-                # which it can happen (one might expect it to be
-                # possible if a client sends a FIN or RST after the
-                # server sends a SYN|ACK but before application code
-                # calls accept(2), however at least on Linux this
-                # _seems_ to be short-circuited by syncookies.
+        finally:
+            # The connection now lives on in the receiving process.
+            # Do not shutdown() the socket here, only release our copy.
+            sock.close()
+
+    def _read_handoff(self, sock):
+        # Every byte received is a closed connection.
+        try:
+            data = sock.recv(self._bufsize)
+        except SocketError as e:
+            if e.args[0] in (EWOULDBLOCK, EAGAIN):
                 return
-            else:
-                raise
+            data = None
 
-        if self.secure and HAS_SSL:
-            for _ in self._do_handshake(newsock):
-                yield
+        if data:
+            self._handoffs[sock] = max(0, self._handoffs[sock] - len(data))
         else:
-            self._on_accept_done(newsock)
+            self.remove_handoff(sock)
+
+    def _get_ssl_context(self):
+        if self.ssl_context is not None:
+            return self.ssl_context
 
-    def _do_handshake(self, sock, fire_connect_event=True):
-        sslsock = ssl_socket(
-            sock,
+        return get_ssl_context(
             server_side=True,
             keyfile=self.keyfile,
             ca_certs=self.ca_certs,
             certfile=self.certfile,
             cert_reqs=self.cert_reqs,
             ssl_version=self.ssl_version,
-            do_handshake_on_connect=False
         )
 
-        for _ in do_handshake(sslsock, self._on_accept_done, self._on_handshake_error, (fire_connect_event,)):
-            yield _
+    def _start_handshake(self, sock, fire_connect_event=True, peername=None):
+        sock.setblocking(False)
+        sslsock = self._get_ssl_context().wrap_socket(
+            sock, server_side=True, do_handshake_on_connect=False
+        )
+
+        deadline = time() + self._handshake_timeout
+        self._handshakes[sslsock] = (deadline, fire_connect_event, peername)
+        self._schedule_expiry()
+
+        self._continue_handshake(sslsock)
 
-    def _on_accept_done(self, sock, fire_connect_event=True):
+    def _continue_handshake(self, sock):
+        try:
+            done = handshake(sock, self._poller, self)
+        except SocketError as e:
+            self.fire(error(sock, e))
+            self._abort_handshake(sock)
+        else:
+            if done:
+                _, fire_connect_event, peername = self._handshakes.pop(sock)
+                self._on_accept_done(sock, fire_connect_event, peername)
+
+    def _abort_handshake(self, sock):
+        _, fire_connect_event, _ = self._handshakes.pop(sock)
+
+        self._poller.discard(sock)
+        try:
+            sock.close()
+        except SocketError:
+            pass
+
+        if not fire_connect_event:
+            # STARTTLS on an already connected client
+            self.fire(disconnect(sock))
+
+        self._resume_accepting()
+
+    def _schedule_expiry(self):
+        if self._expiry_timer is not None:
+            return
+
+        timeouts = (self._handshake_timeout, self._idle_timeout, self._max_lifetime)
+        interval = min([1.0] + [timeout for timeout in timeouts if timeout])
+
+        self._expiry_timer = Timer(
+            interval, _expire_connections(), self.channel, persist=True
+        ).register(self)
+
+    def _get_deadline(self, conn):
+        deadlines = []
+        if self._idle_timeout:
+            last_active = max(conn.last_read, conn.last_write)
+            deadlines.append(last_active + self._idle_timeout)
+        if self._max_lifetime:
+            deadlines.append(conn.created + self._max_lifetime)
+        return min(deadlines)
+
+    @handler("_expire_connections")
+    def _on_expire_connections(self):
+        now = time()
+
+        while self._handshakes:
+            sock, (deadline, _, _) = next(iter(self._handshakes.items()))
+            if deadline > now:
+                break
+            self._metrics["handshake_timeouts"] += 1
+            self.fire(error(sock, SocketTimeout("SSL handshake timed out")))
+            self._abort_handshake(sock)
+
+        # Deadlines are only pushed back (by activity) once they are due.
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, sock = heappop(self._deadlines)
+            conn = self._connections.get(sock)
+            if conn is None:
+                continue
+
+            deadline = self._get_deadline(conn)
+            if deadline > now:
+                heappush(self._deadlines, (deadline, next(self._deadline_seq), sock))
+                continue
+
+            if self._max_lifetime and conn.created + self._max_lifetime <= now:
+                self._metrics["lifetime_expirations"] += 1
+            else:
+                self._metrics["idle_timeouts"] += 1
+            self._close(sock)
+
+        self._resume_accepting()
+
+        if not (self._handshakes or self._deadlines) and self._accepting:
+            self._expiry_timer.unregister()
+            self._expiry_timer = None
+
+    def _on_accept_done(self, sock, fire_connect_event=True, peername=None):
         sock.setblocking(False)
         self._poller.addReader(self, sock)
-        self._clients.append(sock)
+        conn = self._connections[sock] = Connection(
+            sock, tls=hasattr(sock, "getpeercert")
+        )
+        if self._idle_timeout or self._max_lifetime:
+            deadline = self._get_deadline(conn)
+            heappush(self._deadlines, (deadline, next(self._deadline_seq), sock))
+            self._schedule_expiry()
         if fire_connect_event:
-            self.fire(connect(sock, *sock.getpeername()))
-
-    def _on_handshake_error(self, sock, err):
-        self.fire(error(sock, err))
-        self._close(sock)
+            if peername is None:
+                peername = sock.getpeername()
+            self.fire(connect(sock, *peername))
 
     @handler('starttls')
     def starttls(self, sock):
         if not HAS_SSL:
             raise RuntimeError('Cannot start TLS. No TLS support.')
-        if sock in self.__starttls:
+        conn = self._connections.get(sock)
+        if conn is None or conn.tls:
             raise RuntimeError('Cannot reuse socket for already started STARTTLS.')
-        self.__starttls.add(sock)
-        self._poller.removeReader(sock)
-        self._clients.remove(sock)
-        for _ in self._do_handshake(sock, False):
-            yield
+        self._poller.discard(sock)
+        del self._connections[sock]
+        self._start_handshake(sock, False)
 
     @handler("_disconnect", priority=1)
     def _on_disconnect(self, sock):
-        self._close(sock)
+        if sock in self._handshakes:
+            self._abort_handshake(sock)
+        elif sock in self._handoffs:
+            self.remove_handoff(sock)
+        else:
+            self._close(sock)
 
     @handler("_read", priority=1)
     def _on_read(self, sock):
         if sock == self._sock:
             return self._accept()
+        elif sock in self._handoffs:
+            self._read_handoff(sock)
+        elif sock in self._handshakes:
+            self._continue_handshake(sock)
         else:
             self._read(sock)
 
     @handler("_write", priority=1)
     def _on_write(self, sock):
-        if self._buffers[sock]:
-            data = self._buffers[sock].popleft()
-            self._write(sock, data)
+        conn = self._connections.get(sock)
+        if conn is None:
+            if sock in self._handshakes:
+                return self._continue_handshake(sock)
+            if self._poller.isWriting(sock):
+                self._poller.removeWriter(sock)
+            return
 
-        if not self._buffers[sock]:
-            if sock in self._closeq:
-                self._closeq.remove(sock)
+        if conn.buffer:
+            data = conn.buffer.popleft()
+            if isinstance(data, FileTransfer):
+                self._sendfile(conn, data)
+            else:
+                self._write(conn, data)
+
+        if not conn.buffer:
+            if conn.closeflag:
                 self._close(sock)
             elif self._poller.isWriting(sock):
                 self._poller.removeWriter(sock)
@@ -692,6 +1941,14 @@ class TCPServer(Server):
 
     def _create_socket(self):
         sock = super(TCPServer, self)._create_socket()
+
+        # Only wake up (and accept) once the client has sent some data.
+        # This is only supported on Linux and is silently ignored elsewhere.
+        if self._defer_accept and TCP_DEFER_ACCEPT is not None:
+            sock.setsockopt(
+                IPPROTO_TCP, TCP_DEFER_ACCEPT, int(self._defer_accept)
+            )
+
         sock.listen(self._backlog)
 
         return sock
@@ -755,8 +2012,99 @@ class UNIXServer(Server):
         return sock
 
 
+class HandoffServer(Server):
+
+    """Server Component for connections handed off by another process
+
+    Instead of listening on a socket of its own this server receives
+    connected sockets (``SCM_RIGHTS``) over the UNIX socket ``bind`` from
+    a :class:`Server` that has the other end of ``bind`` added with
+    :meth:`Server.add_handoff`. Received connections are handled as any
+    other connection (``connect``, ``read``, ``write``, ...). When a
+    connection is closed this is reported back so the handing off server
+    can balance connections by least active connections.
+
+    Usually the two ends are created with :func:`socket.socketpair`
+    before forking worker processes (see
+    :class:`~circuits.app.supervisor.Supervisor`).
+    """
+
+    socket_family = AF_UNIX
+    socket_type = SOCK_STREAM
+    socket_options = []
+
+    def parse_bind_parameter(self, bind_parameter):
+        return bind_parameter
+
+    @property
+    def host(self):
+        return None
+
+    @property
+    def port(self):
+        return None
+
+    def _accept_connections(self):
+        accepted = []
+
+        for _ in range(self._accept_budget):
+            try:
+                data, fds, _, _ = recv_fds(
+                    self._sock, self._bufsize, self._accept_budget
+                )
+            except SocketError as e:
+                if e.args[0] in (EWOULDBLOCK, EAGAIN):
+                    break
+                raise
+
+            if not (data or fds):
+                # The handing off server has gone away.
+                self._close(self._sock)
+                break
+
+            for fd in fds:
+                newsock = socket(fileno=fd)
+                try:
+                    accepted.append((newsock, newsock.getpeername()))
+                except SocketError:
+                    newsock.close()
+
+        return accepted
+
+    def _close(self, sock):
+        is_connection = sock in self._connections
+
+        super(HandoffServer, self)._close(sock)
+
+        if is_connection and self._sock is not None:
+            try:
+                self._sock.send(b"\0")
+            except SocketError:
+                pass
+
+
 class UDPServer(Server):
 
+    """UDP Server (and Client)
+
+    Up to ``datagram_budget`` datagrams are received per wakeup of the
+    socket and as many datagrams as possible (again at most
+    ``datagram_budget``) are sent per writability notification.
+
+    :param datagram_budget: maximum number of datagrams received or sent
+                            per wakeup.
+    :type datagram_budget:  ``int``
+
+    :param batch_reads:     fire one ``read_batch`` Event with all
+                            datagrams received per wakeup instead of a
+                            ``read`` Event per datagram.
+    :type batch_reads:      ``bool``
+
+    :param rcvbuf:          size of the socket's receive buffer
+                            (``SO_RCVBUF``).
+    :type rcvbuf:           ``int``
+    """
+
     socket_family = AF_INET
     socket_type = SOCK_DGRAM
     socket_options = [
@@ -764,11 +2112,28 @@ class UDPServer(Server):
         (SOL_SOCKET, SO_REUSEADDR, 1)
     ]
 
+    def __init__(self, bind, *args, **kwargs):
+        if kwargs.get("rcvbuf") is not None:
+            kwargs["socket_options"] = kwargs.get("socket_options", []) + [
+                (SOL_SOCKET, SO_RCVBUF, kwargs["rcvbuf"]),
+            ]
+
+        super(UDPServer, self).__init__(bind, *args, **kwargs)
+
+        self._datagram_budget = kwargs.get("datagram_budget", DATAGRAM_BUDGET)
+        self._batch_reads = kwargs.get("batch_reads", False)
+
+        self._conn = Connection(self._sock)
+
+    def _io_connections(self):
+        return (self._conn,)
+
     def _close(self, sock):
         self._poller.discard(sock)
 
-        if sock in self._buffers:
-            del self._buffers[sock]
+        self._conn.buffer.clear()
+        self._conn.buffered = 0
+        self._conn.closeflag = False
 
         try:
             sock.shutdown(2)
@@ -785,38 +2150,76 @@ class UDPServer(Server):
     def close(self):
         self.fire(closed())
 
-        if self._buffers[self._sock] and self._sock not in self._closeq:
-            self._closeq.append(self._sock)
+        if self._conn.buffer:
+            self._conn.closeflag = True
         else:
             self._close(self._sock)
 
     def _read(self):
-        try:
-            data, address = self._sock.recvfrom(self._bufsize)
+        datagrams = []
+        nbytes = 0
+
+        for _ in range(self._datagram_budget):
+            try:
+                data, address = self._sock.recvfrom(self._bufsize)
+            except SocketError as e:
+                if e.args[0] not in (EWOULDBLOCK, EAGAIN):
+                    self._conn.errors += 1
+                    self.fire(error(self._sock, e))
+                    self._close(self._sock)
+                break
+
             if data:
+                datagrams.append((address, data))
+                nbytes += len(data)
+
+        if not datagrams:
+            return
+
+        self._conn.reads += len(datagrams)
+        self._conn.bytes_read += nbytes
+        self._conn.last_read = time()
+
+        if self._batch_reads:
+            self.fire(read_batch(datagrams))
+        else:
+            for address, data in datagrams:
                 self.fire(read(address, data)).notify = True
-        except SocketError as e:
-            if e.args[0] in (EWOULDBLOCK, EAGAIN):
-                return
-            self.fire(error(self._sock, e))
-            self._close(self._sock)
 
     def _write(self, address, data):
+        """Send one datagram, returns ``False`` if no more can be sent now"""
+
         try:
             bytes = self._sock.sendto(data, address)
-            if bytes < len(data):
-                self._buffers[self._sock].appendleft(data[bytes:])
         except SocketError as e:
+            if e.args[0] in (EWOULDBLOCK, EAGAIN, ENOBUFS):
+                self._conn.eagain += 1
+                self._conn.buffer.appendleft((address, data))
+                return False
+
+            self._conn.errors += 1
+            self._conn.buffered -= len(data)
             if e.args[0] in (EPIPE, ENOTCONN):
                 self._close(self._sock)
-            else:
-                self.fire(error(self._sock, e))
+                return False
+            self.fire(error(self._sock, e))
+            return True
+
+        self._conn.buffered -= bytes
+        self._conn.writes += 1
+        self._conn.bytes_written += bytes
+        self._conn.last_write = time()
+        if bytes < len(data):
+            self._conn.buffer.appendleft((address, data[bytes:]))
+            return False
+        return True
 
     @handler("write", override=True)
     def write(self, address, data):
         if not self._poller.isWriting(self._sock):
             self._poller.addWriter(self, self._sock)
-        self._buffers[self._sock].append((address, data))
+        self._conn.buffer.append((address, data))
+        self._conn.buffered += len(data)
 
     @handler("broadcast", override=True)
     def broadcast(self, data, port):
@@ -832,13 +2235,15 @@ class UDPServer(Server):
 
     @handler("_write", priority=1, override=True)
     def _on_write(self, sock):
-        if self._buffers[self._sock]:
-            address, data = self._buffers[self._sock].popleft()
-            self._write(address, data)
+        for _ in range(self._datagram_budget):
+            if not self._conn.buffer:
+                break
+            address, data = self._conn.buffer.popleft()
+            if not self._write(address, data):
+                break
 
-        if not self._buffers[self._sock]:
-            if self._sock in self._closeq:
-                self._closeq.remove(self._sock)
+        if not self._conn.buffer:
+            if self._conn.closeflag:
                 self._close(self._sock)
             elif self._poller.isWriting(self._sock):
                 self._poller.removeWriter(self._sock)
@@ -1,7 +1,17 @@
 """Utilities"""
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from socket import getaddrinfo, inet_pton
+from threading import Lock
+from time import time
 
 from circuits.six import iterbytes
 
+DNS_TTL = 60  # Cache name lookups for 60s
+DNS_NEGATIVE_TTL = 5  # Cache failed lookups for 5s
+DNS_CACHE_SIZE = 1024  # Max. number of cached lookups
+DNS_WORKERS = 4
+
 
 def is_ssl_handshake(buf):
     """Detect an SSLv2 or SSLv3 handshake"""
@@ -15,3 +25,139 @@ def is_ssl_handshake(buf):
     v = list(iterbytes(buf[:2])) + [0x00, 0x00]
     if (v[0] & 0x80 == 0x80) and ((v[0] & 0x7f) << 8 | v[1]) > 9:
         return True
+
+
+def is_ip_address(host, family):
+    """Is ``host`` a literal address of the given address family?"""
+
+    try:
+        inet_pton(family, host)
+    except (ValueError, TypeError, OSError, IOError):
+        return False
+    return True
+
+
+def interleave_families(addresses):
+    """Interleave ``getaddrinfo()`` results by address family
+
+    Returns the addresses alternating between address families, starting
+    with the family of the first (most preferred) address and otherwise
+    keeping their order, as recommended for connection attempts by
+    RFC 8305 (Happy Eyeballs Version 2), section 4.
+    """
+
+    families = []
+    queues = {}
+    for address in addresses:
+        family = address[0]
+        if family not in queues:
+            families.append(family)
+            queues[family] = []
+        queues[family].append(address)
+
+    result = []
+    while len(result) < len(addresses):
+        for family in families:
+            if queues[family]:
+                result.append(queues[family].pop(0))
+    return result
+
+
+class Resolver(object):
+
+    """Asynchronous name resolver
+
+    Performs ``getaddrinfo()`` lookups in a small pool of threads so that
+    the event loop is never blocked by the system resolver. Results are
+    cached for ``ttl`` seconds (failures for ``negative_ttl`` seconds) and
+    concurrent lookups of the same name are coalesced into one. At most
+    ``cache_size`` results are cached, the least recently used ones are
+    evicted first.
+
+    ``getaddrinfo()`` does not expose the TTL of the DNS records it used,
+    so the cache lifetime is fixed per Resolver.
+    """
+
+    def __init__(self, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL,
+                 workers=DNS_WORKERS, cache_size=DNS_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.workers = workers
+        self.cache_size = cache_size
+
+        self._pool = None
+        self._lock = Lock()
+        self._cache = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """Clear the result cache"""
+
+        with self._lock:
+            self._cache.clear()
+
+    def resolve(self, callback, host, port, family=0, type=0, proto=0):
+        """Resolve ``host`` and ``port`` as ``getaddrinfo()`` would
+
+        ``callback(addresses, error)`` is called with the list of results
+        (and ``None``) or ``None`` and the raised exception. It is called
+        immediately if the result is cached and otherwise from one of the
+        Resolver's threads.
+        """
+
+        key = (host, port, family, type, proto)
+
+        with self._lock:
+            # Expired entries are dropped, valid ones become the most
+            # recently used ones.
+            entry = self._cache.pop(key, None)
+            if entry is not None and entry[0] > time():
+                self._cache[key] = entry
+                result = entry[1:]
+            else:
+                result = None
+                if key in self._pending:
+                    self._pending[key].append(callback)
+                    return
+                self._pending[key] = [callback]
+                if self._pool is None:
+                    self._pool = ThreadPool(self.workers)
+
+        if result is not None:
+            callback(*result)
+        else:
+            self._pool.apply_async(self._lookup, (key,))
+
+    def _lookup(self, key):
+        try:
+            result, err = getaddrinfo(*key), None
+            expires = time() + self.ttl
+        except Exception as e:
+            result, err = None, e
+            expires = time() + self.negative_ttl
+
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = (expires, result, err)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            callbacks = self._pending.pop(key, [])
+
+        for callback in callbacks:
+            callback(result, err)
+
+
+_resolver = None
+
+
+def get_resolver():
+    """Return the default (shared) :class:`Resolver`"""
+
+    global _resolver
+
+    if _resolver is None:
+        _resolver = Resolver()
+    return _resolver
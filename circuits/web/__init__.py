@@ -3,10 +3,10 @@
 circuits.web contains the circuits full stack web server that is HTTP
 and WSGI compliant.
 """
-from .controllers import BaseController, Controller, expose
+from .controllers import BaseController, Controller, body, expose
 from .dispatchers import XMLRPC, Dispatcher, Static, VirtualHosts
 from .errors import forbidden, httperror, notfound, redirect
-from .events import request, response, stream
+from .events import request, request_body, response, stream
 from .loggers import Logger
 from .servers import BaseServer, Server
 from .sessions import Sessions
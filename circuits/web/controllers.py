@@ -53,6 +53,28 @@ def expose(*channels, **config):
     return decorate
 
 
+def body(max_size=None, stream=False):
+    """Set how the request body of an exposed method is read
+
+    :param max_size: maximum size of the body in bytes. Larger requests
+                     are rejected with a 413 error before their body is
+                     read.
+    :type  max_size: int
+
+    :param stream:   Whether the method is called once the headers of
+                     the request have been received. Its body is then
+                     passed on in ``request_body`` events as it arrives.
+    :type  stream:   bool
+    """
+
+    def decorate(f):
+        f.max_body_size = max_size
+        f.stream_body = stream
+        return f
+
+    return decorate
+
+
 class ExposeMetaClass(type):
 
     def __init__(cls, name, bases, dct):
@@ -68,6 +90,18 @@ class BaseController(BaseComponent):
 
     channel = "/"
 
+    # Number of handler changes of all controllers, dispatchers cache the
+    # handlers they resolved requests to until it changes.
+    handler_changes = 0
+
+    def addHandler(self, f):
+        BaseController.handler_changes += 1
+        return super(BaseController, self).addHandler(f)
+
+    def removeHandler(self, method, event=None):
+        BaseController.handler_changes += 1
+        return super(BaseController, self).removeHandler(method, event)
+
     @property
     def uri(self):
         """Return the current Request URI
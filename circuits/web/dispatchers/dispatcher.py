@@ -3,33 +3,76 @@
 This module implements a basic URL to Channel dispatcher.
 This is the default dispatcher used by circuits.web
 """
+from collections import OrderedDict
+
 try:
     from urllib import quote, unquote
 except ImportError:
     from urllib.parse import quote, unquote  # NOQA
 
 from circuits import BaseComponent, Event, handler
-from circuits.six import text_type
+from circuits.six import string_types, text_type
 from circuits.web.controllers import BaseController
 from circuits.web.events import response
 from circuits.web.processors import process
 from circuits.web.utils import parse_qs
 
 
-def resolve_path(paths, parts):
+CACHE_SIZE = 1024  # Max. Number of resolved routes that are cached
+
+
+class Route(object):
+
+    """Node of a trie of controller paths by path segment"""
+
+    __slots__ = ("path", "children")
+
+    def __init__(self):
+        self.path = None
+        self.children = {}
+
+
+def compile_paths(paths):
+    """Compile the controller paths into a trie of path segments
+
+    :param paths: the paths (channels) of the controllers.
+
+    :returns: the root :class:`Route` of the trie.
+    """
 
-    def rebuild_path(url_parts):
-        return '/%s' % '/'.join(url_parts)
+    root = Route()
 
-    left_over = []
+    for path in paths:
+        if not isinstance(path, string_types) or not path.startswith("/"):
+            # Can't be matched by a request path
+            continue
 
-    while parts:
-        if rebuild_path(parts) in paths:
-            yield rebuild_path(parts), left_over
-        left_over.insert(0, parts.pop())
+        node = root
+        if path != "/":
+            for part in path[1:].split("/"):
+                node = node.children.setdefault(part, Route())
+        node.path = path
 
-    if '/' in paths:
-        yield '/', left_over
+    return root
+
+
+def resolve_path(routes, parts):
+    # Yield the matching controller paths, longest first and "/" last
+    matches = []
+
+    node = routes
+    for i, part in enumerate(parts):
+        node = node.children.get(part)
+        if node is None:
+            break
+        if node.path is not None:
+            matches.append((node.path, i + 1))
+
+    for path, i in reversed(matches):
+        yield path, parts[i:]
+
+    if routes.path is not None:
+        yield routes.path, parts
 
 
 def resolve_methods(parts):
@@ -41,7 +84,13 @@ def resolve_methods(parts):
     yield 'index', parts
 
 
-def find_handlers(req, paths):
+def resolve(method, path, paths, routes):
+    """Resolve a request to the handlers of a controller
+
+    :returns: a ``(handlers, name, channel, vpath, index)`` tuple where
+              ``index`` is ``None`` if ``req.index`` is left alone.
+    """
+
     def get_handlers(path, method):
         component = paths[path]
         return component._handlers.get(method, None)
@@ -56,55 +105,132 @@ def find_handlers(req, paths):
         )
 
     # Split /hello/world to ['hello', 'world']
-    starting_parts = [x for x in req.path.strip("/").split("/") if x]
+    starting_parts = [x for x in path.strip("/").split("/") if x]
 
-    for path, parts in resolve_path(paths, starting_parts):
-        handlers = get_handlers(path, req.method)
+    for path, parts in resolve_path(routes, starting_parts):
+        handlers = get_handlers(path, method)
         if handlers:
-            return handlers, req.method, path, parts
+            return handlers, method, path, parts, None
 
-        for method, vpath in resolve_methods(parts):
-            handlers = get_handlers(path, method)
+        for name, vpath in resolve_methods(parts):
+            handlers = get_handlers(path, name)
             if handlers and (not vpath or accepts_vpath(handlers, vpath)):
-                req.index = (method == 'index')
-                return handlers, method, path, vpath
+                return handlers, name, path, vpath, (name == 'index')
             else:
-                method, vpath = "index", [method] + vpath
-                handlers = get_handlers(path, method)
+                name, vpath = "index", [name] + vpath
+                handlers = get_handlers(path, name)
                 if handlers and (not vpath or accepts_vpath(handlers, vpath)):
-                    req.index = True
-                    return handlers, method, path, vpath
+                    return handlers, name, path, vpath, True
+
+    return [], None, None, None, None
+
 
-    return [], None, None, None
+def find_handlers(req, paths, routes=None):
+    if routes is None:
+        routes = compile_paths(paths)
+
+    handlers, name, channel, vpath, index = resolve(
+        req.method, req.path, paths, routes
+    )
+
+    if index is not None:
+        req.index = index
+
+    return handlers, name, channel, vpath
 
 
 class Dispatcher(BaseComponent):
 
+    """URL to Channel Dispatcher
+
+    Dispatches requests to the controller with the longest path (channel)
+    matching the request path. The paths are compiled into a trie of path
+    segments whenever a controller is (un)registered and the last
+    ``cache_size`` resolved ``(method, path)`` pairs are cached until
+    controllers or their handlers change.
+
+    :param cache_size: number of resolved routes to cache.
+    :type  cache_size: ``int``
+    """
+
     channel = "web"
 
-    def __init__(self, **kwargs):
+    def __init__(self, cache_size=CACHE_SIZE, **kwargs):
         super(Dispatcher, self).__init__(**kwargs)
 
         self.paths = dict()
 
+        self._routes = Route()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._handler_changes = BaseController.handler_changes
+
+    def _compile(self):
+        self._routes = compile_paths(self.paths)
+        self._cache.clear()
+
+    def _find_handlers(self, req):
+        if self._handler_changes != BaseController.handler_changes:
+            # Handlers were added to or removed from a controller
+            self._handler_changes = BaseController.handler_changes
+            self._cache.clear()
+
+        key = (req.method, req.path)
+
+        try:
+            result = self._cache.pop(key)
+        except KeyError:
+            result = resolve(req.method, req.path, self.paths, self._routes)
+            if result[3] is not None:
+                result = result[:3] + (tuple(result[3]),) + result[4:]
+            if len(self._cache) >= self._cache_size:
+                self._cache.popitem(last=False)
+
+        # Most recently used last
+        self._cache[key] = result
+
+        handlers, name, channel, vpath, index = result
+
+        if index is not None:
+            req.index = index
+
+        if vpath is not None:
+            vpath = list(vpath)
+
+        return handlers, name, channel, vpath
+
     @handler("registered", channel="*")
     def _on_registered(self, component, manager):
         if (isinstance(component, BaseController) and component.channel not
                 in self.paths):
             self.paths[component.channel] = component
+            self._compile()
 
     @handler("unregistered", channel="*")
     def _on_unregistered(self, component, manager):
         if (isinstance(component, BaseController) and component.channel in
                 self.paths):
             del self.paths[component.channel]
+            self._compile()
+
+    @handler("request_headers")
+    def _on_request_headers(self, req, res):
+        handlers, name, channel, vpath = self._find_handlers(req)
+
+        # Apply the body options of the request's route (see: body)
+        for h in handlers:
+            max_body_size = getattr(h, "max_body_size", None)
+            if max_body_size is not None:
+                req.max_body_size = max_body_size
+            if getattr(h, "stream_body", False):
+                req.stream_body = True
 
     @handler("request", priority=0.1)
     def _on_request(self, event, req, res, peer_cert=None):
         if peer_cert:
             event.peer_cert = peer_cert
 
-        handlers, name, channel, vpath = find_handlers(req, self.paths)
+        handlers, name, channel, vpath = self._find_handlers(req)
 
         if name is not None and channel is not None:
             event.kwargs = parse_qs(req.qs)
@@ -4,11 +4,22 @@ This modStatic implements a Static dispatcher used to serve up static
 resources and an optional apache-style directory listing.
 """
 import os
+from collections import OrderedDict
+from email.utils import formatdate
+from itertools import count
 from string import Template
+from time import time
 
 from circuits import BaseComponent, handler
 from circuits.six.moves.urllib_parse import quote, unquote
-from circuits.web.tools import serve_file
+from circuits.web.tools import (
+    PRECOMPRESSED, accepted_encodings, content_type, file_etag,
+    serve_content, serve_file, vary,
+)
+
+CACHE_FILE_SIZE = 64 * 1024  # Max. Size of files whose content is cached
+CACHE_CHECK = 1.0  # Seconds between checks whether a cached file changed
+ENTRY_SIZE = 512  # Approx. Size of a cache entry without the content
 
 DEFAULT_DIRECTORY_INDEX_TEMPLATE = """
 <!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
@@ -33,12 +44,242 @@ DEFAULT_DIRECTORY_INDEX_TEMPLATE = """
 _dirlisting_template = Template(DEFAULT_DIRECTORY_INDEX_TEMPLATE)
 
 
+class CachedFile(object):
+
+    """A file cached by a :class:`FileCache`"""
+
+    __slots__ = (
+        "location", "stat", "size", "lastmod", "etag", "type", "content",
+        "checked", "encoding", "variants", "missing",
+    )
+
+    def __init__(self, location, st, content=None, type=None,
+                 encoding=None):
+        self.location = location
+        self.stat = (st.st_ino, st.st_size, st.st_mtime)
+        self.size = st.st_size
+        self.lastmod = formatdate(st.st_mtime, usegmt=True)
+        self.etag = file_etag(st)
+        self.type = type or content_type(location)
+        self.content = content
+        self.checked = time()
+
+        # Precompressed variants of the file (in order of preference) and
+        # the locations of the ones that don't exist.
+        self.encoding = encoding
+        self.variants = ()
+        self.missing = ()
+
+    @property
+    def cost(self):
+        return ENTRY_SIZE + (len(self.content) if self.content else 0) + \
+            sum(variant.cost for variant in self.variants)
+
+    def changed(self):
+        """Check whether the file (or a variant) changed since it was cached"""
+
+        try:
+            st = os.stat(self.location)
+        except OSError:
+            return True
+
+        self.checked = time()
+        if (st.st_ino, st.st_size, st.st_mtime) != self.stat:
+            return True
+
+        return any(variant.changed() for variant in self.variants) or \
+            any(os.path.exists(location) for location in self.missing)
+
+    def serve(self, request, response):
+        entry = self
+        if self.variants:
+            vary(response, "Accept-Encoding")
+            accepted = accepted_encodings(
+                request, [variant.encoding for variant in self.variants]
+            )
+            if accepted:
+                entry = next(
+                    variant for variant in self.variants
+                    if variant.encoding == accepted[0]
+                )
+                response.headers["Content-Encoding"] = entry.encoding
+
+        return serve_content(
+            request, response, entry.location, entry.size, entry.lastmod,
+            content=entry.content, etag=entry.etag, type=self.type
+        )
+
+
+class FileCache(object):
+
+    """Cache of the files served by :class:`Static`
+
+    Keeps up to ``size`` bytes of :class:`CachedFile` entries, evicting the
+    least recently used ones first. The content of files up to
+    ``file_size`` bytes is cached, too. Cached files are checked for
+    changes at most every ``check`` seconds (never if ``None``); in between
+    they are served without touching the file system.
+    """
+
+    def __init__(self, size, file_size=CACHE_FILE_SIZE, check=CACHE_CHECK):
+        self.size = size
+        self.file_size = file_size
+        self.check = check
+
+        self.used = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return None
+
+        if self.check is not None and \
+                time() - entry.checked >= self.check and entry.changed():
+            self.used -= entry.cost
+            return None
+
+        # Most recently used last
+        self._entries[path] = entry
+        return entry
+
+    def _load(self, location, type=None, encoding=None):
+        try:
+            st = os.stat(location)
+            content = None
+            if st.st_size <= self.file_size:
+                with open(location, "rb") as f:
+                    content = f.read()
+                if len(content) != st.st_size:
+                    return None
+        except (IOError, OSError):
+            return None
+
+        return CachedFile(location, st, content, type, encoding)
+
+    def add(self, path, location, precompressed=()):
+        """Cache the file at location served for path
+
+        :param precompressed: the ``(encoding, suffix)`` pairs of the
+                              precompressed variants of the file to cache.
+
+        :returns: the :class:`CachedFile` or ``None`` if the file can't be
+                  cached (eg: it changed while it was read).
+        """
+
+        entry = self._load(location)
+        if entry is None:
+            return None
+
+        variants, missing = [], []
+        for encoding, suffix in precompressed:
+            if not os.path.isfile(location + suffix):
+                missing.append(location + suffix)
+                continue
+            variant = self._load(location + suffix, entry.type, encoding)
+            if variant is None:
+                return None
+            variants.append(variant)
+        entry.variants, entry.missing = tuple(variants), tuple(missing)
+
+        if entry.cost > self.size:
+            return entry
+
+        self.remove(path)
+        self._entries[path] = entry
+        self.used += entry.cost
+
+        while self.used > self.size:
+            path, evicted = self._entries.popitem(last=False)
+            self.used -= evicted.cost
+
+        return entry
+
+    def remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.used -= entry.cost
+
+    def invalidate(self, location):
+        """Remove the entries of the file or directory at location"""
+
+        prefix = os.path.join(location, "")
+        for path, entry in list(self._entries.items()):
+            if entry.location == location or \
+                    entry.location.startswith(prefix):
+                self.remove(path)
+
+    def clear(self):
+        self._entries.clear()
+        self.used = 0
+
+
+class Invalidator(BaseComponent):
+
+    """Invalidates the entries of a :class:`FileCache` on file events
+
+    Listens to the events of a :class:`~circuits.io.notify.Notify`
+    Component on the same channel.
+    """
+
+    def init(self, cache, channel=None):
+        self.cache = cache
+
+    @handler("modified", "closed", "deleted")
+    def _on_changed(self, name, path, pathname, dir):
+        self.cache.invalidate(pathname)
+
+    @handler("created", "moved")
+    def _on_created(self, name, path, pathname, dir):
+        # A new file might take precedence (eg: a new index.html)
+        self.cache.invalidate(path)
+
+
+_ids = count(1)
+
+
 class Static(BaseComponent):
 
+    """Static files dispatcher
+
+    Serves the files below ``docroot`` for requests below ``path``.
+
+    Optionally (if ``cache_size`` is given) the files served are cached
+    in memory: their location, metadata (Content-Type, Last-Modified and
+    ETag) and, for files up to ``cache_file_size`` bytes, their content.
+    Cached files are served without touching the file system; they are
+    checked for changes at most every ``cache_check`` seconds or, with
+    ``cache_notify``, invalidated by inotify events (which requires
+    pyinotify, see: :class:`~circuits.io.notify.Notify`).
+
+    :param cache_size: size of the cache in bytes (``None`` to disable it).
+    :type  cache_size: ``int``
+
+    :param cache_file_size: max. size of the files whose content is cached.
+    :type  cache_file_size: ``int``
+
+    :param cache_check: seconds between checks of a cached file.
+    :type  cache_check: ``float``
+
+    :param cache_notify: invalidate cached files on inotify events instead.
+    :type  cache_notify: ``bool``
+
+    :param precompressed: serve precompressed variants of the files (eg:
+                          ``style.css.gz`` for ``style.css``) to the
+                          clients accepting them.
+    :type  precompressed: ``bool``
+    """
+
     channel = "web"
 
     def __init__(self, path=None, docroot=None,
-                 defaults=("index.html", "index.xhtml",), dirlisting=False, **kwargs):
+                 defaults=("index.html", "index.xhtml",), dirlisting=False,
+                 cache_size=None, cache_file_size=CACHE_FILE_SIZE,
+                 cache_check=CACHE_CHECK, cache_notify=False,
+                 precompressed=False, **kwargs):
         super(Static, self).__init__(**kwargs)
 
         self.path = path
@@ -46,6 +287,49 @@ class Static(BaseComponent):
             docroot) if docroot is not None else os.path.abspath(os.getcwd())
         self.defaults = defaults
         self.dirlisting = dirlisting
+        self.precompressed = precompressed
+
+        self.cache = None
+        if cache_size:
+            self.cache = FileCache(
+                cache_size, cache_file_size,
+                None if cache_notify else cache_check
+            )
+
+            if cache_notify:
+                from circuits.io.notify import (
+                    Notify, IN_ATTRIB, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE,
+                    IN_DELETE_SELF, IN_MODIFY, IN_MOVE_SELF, IN_MOVED_FROM,
+                    IN_MOVED_TO,
+                )
+
+                channel = "static.{0:d}".format(next(_ids))
+                notify = Notify(channel=channel).register(self)
+                Invalidator(self.cache, channel=channel).register(self)
+                notify.add_path(
+                    self.docroot,
+                    IN_ATTRIB | IN_CLOSE_WRITE | IN_CREATE | IN_DELETE |
+                    IN_DELETE_SELF | IN_MODIFY | IN_MOVE_SELF |
+                    IN_MOVED_FROM | IN_MOVED_TO,
+                    recursive=True
+                )
+
+    def _serve_file(self, request, response, path, location):
+        # Don't set cookies for static content
+        response.cookie.clear()
+
+        if self.cache is not None:
+            entry = self.cache.add(
+                path, location, PRECOMPRESSED if self.precompressed else ()
+            )
+            if entry is not None:
+                return entry.serve(request, response)
+
+        # The same validators as for cached files, see: CachedFile
+        return serve_file(
+            request, response, location, precompressed=self.precompressed,
+            etag=self.cache is not None
+        )
 
     @handler("request", priority=0.9)
     def _on_request(self, event, request, response):
@@ -59,6 +343,16 @@ class Static(BaseComponent):
 
         path = unquote(path.strip("/"))
 
+        if self.cache is not None:
+            entry = self.cache.get(path)
+            if entry is not None:
+                # Don't set cookies for static content
+                response.cookie.clear()
+                try:
+                    return entry.serve(request, response)
+                finally:
+                    event.stop()
+
         if path:
             location = os.path.abspath(os.path.join(self.docroot, path))
         else:
@@ -72,10 +366,8 @@ class Static(BaseComponent):
 
         # Is it a file we can serve directly?
         if os.path.isfile(location):
-            # Don't set cookies for static content
-            response.cookie.clear()
             try:
-                return serve_file(request, response, location)
+                return self._serve_file(request, response, path, location)
             finally:
                 event.stop()
 
@@ -88,10 +380,10 @@ class Static(BaseComponent):
                     os.path.join(self.docroot, path, default)
                 )
                 if os.path.exists(location):
-                    # Don't set cookies for static content
-                    response.cookie.clear()
                     try:
-                        return serve_file(request, response, location)
+                        return self._serve_file(
+                            request, response, path, location
+                        )
                     finally:
                         event.stop()
 
@@ -38,8 +38,21 @@ class VirtualHosts(BaseComponent):
 
         self.domains = domains
 
+    @handler("request_headers", priority=1.0)
+    def _on_request_headers(self, request, response):
+        # Requests with a body are routed (see: body) before the request
+        # event, their path is rewritten then already.
+        self._rewrite(request)
+
     @handler("request", priority=1.0)
     def _on_request(self, event, request, response):
+        self._rewrite(request)
+
+    def _rewrite(self, request):
+        if getattr(request, "vhost_rewritten", False):
+            return
+        request.vhost_rewritten = True
+
         path = request.path.strip("/")
 
         header = request.headers.get
@@ -17,6 +17,31 @@ class request(Event):
     complete = True
 
 
+class request_headers(Event):
+
+    """request_headers(Event) -> request_headers Event
+
+    Fired when the headers of a request with a body have been received,
+    before its body is read. Handlers may set the request's
+    ``max_body_size`` and ``stream_body``.
+
+    args: request, response
+    """
+
+    complete = True
+
+
+class request_body(Event):
+
+    """request_body(Event) -> request_body Event
+
+    A chunk of the body of a request with ``stream_body`` set. The data
+    is ``None`` once the whole body has been received.
+
+    args: request, response, data
+    """
+
+
 class response(Event):
 
     """response(Event) -> response Event
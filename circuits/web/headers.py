@@ -6,6 +6,11 @@ import re
 
 from circuits.six import b, iteritems, u
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping  # NOQA
+
 # Regular expression that matches `special' characters in parameters, the
 # existance of which force quoting of the parameter value.
 
@@ -199,38 +204,160 @@ class CaseInsensitiveDict(dict):
         return dict.pop(self, str(key).title(), default)
 
 
-class Headers(CaseInsensitiveDict):
+class Headers(MutableMapping):
     """
     This class implements a storage for headers as key value pairs.
-    The underlying model of a case insensitive dict matches the requirements
-    for headers quite well, because usually header keys are unique. If
-    several values may be associated with a header key, most HTTP headers
-    represent the values as an enumeration using a comma as item separator.
-
-    There is, however one exception (currently) to this rule. In order to
-    set several cookies, there should be multiple headers with the same
-    key, each setting one cookie ("Set-Cookie: some_cookie").
 
+    The header fields are kept as ``(name, value)`` pairs in the order they
+    were added, with their names title-cased (as ``CaseInsensitiveDict``
+    does). Lookups are case insensitive, through an index of the lowercased
+    names that is built on first use. The serialized form (see:
+    ``bytes(headers)``) is cached until the headers change.
+
+    Several values of the same header (eg: from ``append``) are joined by
+    a comma, as most HTTP headers represent several values as an
+    enumeration. There is, however one exception (currently) to this rule.
+    In order to set several cookies, there should be multiple headers with
+    the same key, each setting one cookie ("Set-Cookie: some_cookie").
     This is modeled by having either a string (common case) or a list
-    (cookie case) as value in the underlying dict. In order to allow
-    easy iteration over all headers as they appear in the HTTP request,
-    the items() method expands associated lists of values. So if you have
-    { "Set-Cookie": [ "cookie1", "cookie2" ] }, the items() method returns
-    the two pairs ("Set-Cookie", "cookie1") and ("Set-Cookie", "cookie2").
-    This is convenient for most use cases. The only drawback is that
-    len(keys()) is not equal to len(items()) for this specialized dict.
+    (cookie case, or a list set explicitly) as value. The values of a list
+    are serialized as separate fields and ``items()`` returns a pair for
+    each of them. Thus ``len(keys())`` is not necessarily equal to
+    ``len(items())``.
     """
 
+    def __init__(self, *args, **kwargs):
+        self._fields = []
+        self._lists = set()
+        self._index = None
+        self._bytes = None
+
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def _positions(self):
+        """Return the positions of the fields by lowercased name"""
+
+        index = self._index
+        if index is None:
+            index = self._index = {}
+            for i, (name, value) in enumerate(self._fields):
+                index.setdefault(name.lower(), []).append(i)
+        return index
+
+    def _values(self, key):
+        positions = self._positions().get(key.lower())
+        if positions is None:
+            return []
+        fields = self._fields
+        return [fields[i][1] for i in positions]
+
+    def _add(self, key, value):
+        self._fields.append((str(key).title(), value))
+        if self._index is not None:
+            self._index.setdefault(key.lower(), []).append(
+                len(self._fields) - 1
+            )
+        self._bytes = None
+
+    def __len__(self):
+        return len(self._positions())
+
+    def __iter__(self):
+        positions = self._positions()
+        for i, (name, value) in enumerate(self._fields):
+            if positions[name.lower()][0] == i:
+                yield name
+
+    def __contains__(self, key):
+        return key.lower() in (self._index or self._positions())
+
+    def _value(self, name, positions):
+        fields = self._fields
+        if name in self._lists:
+            return [fields[i][1] for i in positions]
+        elif len(positions) == 1:
+            return fields[positions[0]][1]
+        return ", ".join(fields[i][1] for i in positions)
+
+    def __getitem__(self, key):
+        name = key.lower()
+        positions = (self._index or self._positions()).get(name)
+        if positions is None:
+            raise KeyError(key)
+        return self._value(name, positions)
+
+    def __setitem__(self, key, value):
+        name = key.lower()
+        positions = self._positions().get(name)
+        if positions is not None:
+            if len(positions) == 1 and not isinstance(value, list) and \
+                    name not in self._lists:
+                self._fields[positions[0]] = (str(key).title(), value)
+                self._bytes = None
+                return
+            del self[key]
+
+        if isinstance(value, list):
+            self._lists.add(name)
+            for value in value:
+                self._add(key, value)
+        else:
+            self._add(key, value)
+
+    def __delitem__(self, key):
+        name = key.lower()
+        if name not in self._positions():
+            raise KeyError(key)
+
+        self._fields = [
+            field for field in self._fields if field[0].lower() != name
+        ]
+        self._lists.discard(name)
+        self._index = None
+        self._bytes = None
+
+    def get(self, key, default=None):
+        name = key.lower()
+        positions = (self._index or self._positions()).get(name)
+        if positions is None:
+            return default
+        return self._value(name, positions)
+
+    def setdefault(self, key, default=None):
+        if key.lower() in self._positions():
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        if key in self:
+            del self[key]
+        return value
+
+    def clear(self):
+        del self._fields[:]
+        self._lists.clear()
+        self._index = None
+        self._bytes = None
+
+    def copy(self):
+        headers = Headers()
+        headers._fields = self._fields[:]
+        headers._lists = set(self._lists)
+        return headers
+
     def elements(self, key):
         """Return a sorted list of HeaderElements for the given header."""
         return header_elements(key, self.get(key))
 
     def get_all(self, name):
         """Return a list of all the values for the named field."""
-        value = self.get(name, '')
-        if isinstance(value, list):
-            return value
-        return [val.strip() for val in value.split(',')]
+        values = self._values(name)
+        if name.lower() in self._lists:
+            return values
+        return [val.strip() for val in ", ".join(values).split(',')]
 
     def __repr__(self):
         return "Headers(%s)" % repr(list(self.items()))
@@ -240,15 +367,32 @@ class Headers(CaseInsensitiveDict):
         return "".join(headers) + '\r\n'
 
     def items(self):
-        for k, v in super(Headers, self).items():
-            if isinstance(v, list):
-                for vv in v:
-                    yield (k, vv)
-            else:
-                yield (k, v)
+        positions = self._positions()
+        fields = self._fields
+
+        if len(positions) == len(fields):
+            # No header with several values
+            for field in fields:
+                yield field
+            return
+
+        lists = self._lists
+        for i, (name, value) in enumerate(fields):
+            key = name.lower()
+            if key in lists:
+                yield (name, value)
+                continue
+
+            found = positions[key]
+            if len(found) == 1:
+                yield (name, value)
+            elif found[0] == i:
+                yield (name, ", ".join(fields[j][1] for j in found))
 
     def __bytes__(self):
-        return str(self).encode("latin1")
+        if self._bytes is None:
+            self._bytes = str(self).encode("latin1")
+        return self._bytes
 
     def append(self, key, value):
         """
@@ -259,16 +403,10 @@ class Headers(CaseInsensitiveDict):
         value of type list (as is the case for "Set-Cookie"),
         the new value is appended to that list.
         """
-        if key not in self:
-            if key.lower() == "set-cookie":
-                self[key] = [value]
-            else:
-                self[key] = value
-        else:
-            if isinstance(self[key], list):
-                self[key].append(value)
-            else:
-                self[key] = ", ".join([self[key], value])
+        name = key.lower()
+        if name == "set-cookie" and name not in self._positions():
+            self._lists.add(name)
+        self._add(key, value)
 
     def add_header(self, _name, _value, **_params):
         """Extended header setting.
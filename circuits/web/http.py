@@ -3,11 +3,14 @@
 This module implements the server side Hyper Text Transfer Protocol
 or commonly known as HTTP.
 """
+from collections import deque
 from io import BytesIO
 from socket import socket
+from tempfile import SpooledTemporaryFile
 
 from circuits.core import BaseComponent, Value, handler
-from circuits.net.events import close, write
+from circuits.net.events import close, sendfile, write
+from circuits.net.sockets import Server
 from circuits.net.utils import is_ssl_handshake
 from circuits.six import text_type
 from circuits.six.moves.urllib_parse import quote
@@ -15,7 +18,9 @@ from circuits.six.moves.urllib_parse import quote
 from . import wrappers
 from .constants import SERVER_PROTOCOL, SERVER_VERSION
 from .errors import httperror, notfound, redirect
-from .events import request, response, stream
+from .events import (
+    request, request_body, request_headers, response, stream,
+)
 from .exceptions import HTTPException, Redirect as RedirectException
 from .parsers import BAD_FIRST_LINE, HttpParser
 from .url import parse_url
@@ -23,6 +28,8 @@ from .utils import is_unix_socket
 
 MAX_HEADER_FRAGENTS = 20
 HTTP_ENCODING = 'utf-8'
+SPOOL_SIZE = 1024 * 1024  # Max. Request body size kept in memory
+INLINE_SIZE = 64 * 1024  # Max. Response body size sent with the headers
 
 
 class HTTP(BaseComponent):
@@ -39,22 +46,65 @@ class HTTP(BaseComponent):
     object. Then it emits a :class:`~circuits.web.events.Request`
     event with these objects as arguments.
 
+    Pipelined requests (sent by a client before the responses to its
+    previous requests) are queued per connection and processed one after
+    another so their responses are sent in the order they were requested.
+
+    Request bodies are collected as they arrive; bodies larger than
+    ``spool_size`` bytes are spooled to a temporary file. Before the body
+    of a request is read a :class:`~circuits.web.events.request_headers`
+    event is fired which may set the request's ``max_body_size`` (bodies
+    exceeding it are rejected with a 413 error) or ``stream_body``. The
+    ``request`` event of a request with ``stream_body`` set is fired
+    right away and its body is passed on in
+    :class:`~circuits.web.events.request_body` events as it arrives.
+
     The component defines several handlers that send a response back to
     the client.
+
+    :param spool_size: body size above which bodies are spooled to disk.
+    :type  spool_size: ``int``
+
+    :param max_body_size: default maximum body size (``None`` for no limit).
+    :type  max_body_size: ``int``
     """
 
     channel = "web"
 
-    def __init__(self, server, encoding=HTTP_ENCODING, channel=channel):
+    def __init__(self, server, encoding=HTTP_ENCODING, channel=channel,
+                 spool_size=SPOOL_SIZE, max_body_size=None):
         super(HTTP, self).__init__(channel=channel)
 
         self._server = server
         self._encoding = encoding
+        self._spool_size = spool_size
+        self._max_body_size = max_body_size
 
         self._uri = None
         self._clients = {}
         self._buffers = {}
 
+        # Remote address of each connection, reused by its requests
+        self._peers = {}
+
+        # Requests being received and requests queued behind the
+        # response in progress (in _clients) on each connection.
+        self._requests = {}
+        self._pipelines = {}
+
+        # Requests waiting for their request_headers event to complete
+        # (mapped to their request event once they were received), data
+        # held back until they are dispatched and connections whose
+        # remaining data is discarded.
+        self._routing = {}
+        self._held = {}
+        self._discard = set()
+
+        # Write flow control: paused sockets and the responses
+        # waiting for them to drain before streaming on.
+        self._paused = set()
+        self._streams = {}
+
     @property
     def version(self):
         return SERVER_VERSION
@@ -112,24 +162,52 @@ class HTTP(BaseComponent):
             self.fire(write(sock, data))
 
             if res.body and not res.done:
-                try:
-                    data = next(res.body)
-                    while not data:  # Skip over any null byte sequences
-                        data = next(res.body)
-                except StopIteration:
-                    data = None
-                self.fire(stream(res, data))
+                if sock in self._paused:
+                    self._streams[sock] = res
+                else:
+                    self._stream_next(res)
         else:
             if res.body:
                 res.body.close()
             if res.chunked:
                 self.fire(write(sock, b"0\r\n\r\n"))
-            if res.close:
-                self.fire(close(sock))
-            if sock in self._clients:
-                del self._clients[sock]
 
-            res.done = True
+            self._response_done(res)
+
+    def _stream_next(self, res):
+        try:
+            data = next(res.body)
+            while not data:  # Skip over any null byte sequences
+                data = next(res.body)
+        except StopIteration:
+            data = None
+        self.fire(stream(res, data))
+
+    def _can_sendfile(self, res):
+        """Whether the file body of ``res`` can be sent with ``sendfile``
+
+        The file is then handed over to the underlying socket Server
+        which sends it straight from the page cache (where possible)
+        instead of streaming it through Python one chunk at a time.
+        """
+
+        return (
+            res.file is not None and not res.chunked and
+            "Content-Length" in res.headers and
+            isinstance(getattr(self._server, "server", None), Server)
+        )
+
+    @handler("pause_writing")
+    def _on_pause_writing(self, sock):
+        self._paused.add(sock)
+
+    @handler("drain")
+    def _on_drain(self, sock):
+        self._paused.discard(sock)
+
+        res = self._streams.pop(sock, None)
+        if res is not None:
+            self._stream_next(res)
 
     @handler("response")  # noqa
     def _on_response(self, res):
@@ -150,19 +228,32 @@ class HTTP(BaseComponent):
         sock = req.sock
 
         if req.method == "HEAD":
-            self.fire(write(sock, bytes(res)))
-            self.fire(write(sock, bytes(headers)))
+            self.fire(write(sock, bytes(res) + bytes(headers)))
+            self._response_done(res)
         elif res.stream and res.body:
+            head = bytes(res) + bytes(headers)
+
+            if self._can_sendfile(res):
+                self.fire(write(sock, head))
+                self.fire(
+                    sendfile(
+                        sock, res.file, res.file.tell(),
+                        int(headers["Content-Length"])
+                    )
+                )
+                self._response_done(res)
+                return
+
             try:
                 data = next(res.body)
             except StopIteration:
                 data = None
-            self.fire(write(sock, bytes(res)))
-            self.fire(write(sock, bytes(headers)))
+            self.fire(write(sock, head))
             self.fire(stream(res, data))
         else:
-            self.fire(write(sock, bytes(res)))
-            self.fire(write(sock, bytes(headers)))
+            # The status line must be serialized first, it finalizes the
+            # headers (eg: Content-Length).
+            buf = [bytes(res), bytes(headers)]
 
             if isinstance(res.body, bytes):
                 body = res.body
@@ -178,31 +269,129 @@ class HTTP(BaseComponent):
 
             if body:
                 if res.chunked:
-                    buf = [
-                        hex(len(body))[2:].encode(self._encoding),
-                        b"\r\n",
-                        body,
-                        b"\r\n"
-                    ]
-                    body = b"".join(buf)
-
-                self.fire(write(sock, body))
+                    buf.append(hex(len(body))[2:].encode(self._encoding))
+                    buf.append(b"\r\n")
+
+                if len(body) > INLINE_SIZE:
+                    # Don't copy large bodies into the response buffer
+                    self.fire(write(sock, b"".join(buf)))
+                    self.fire(write(sock, body))
+                    buf = []
+                else:
+                    buf.append(body)
 
                 if res.chunked:
-                    self.fire(write(sock, b"0\r\n\r\n"))
+                    buf.append(b"\r\n0\r\n\r\n")
+
+            # Send small responses with a single write
+            if buf:
+                self.fire(write(sock, b"".join(buf)))
 
             if not res.stream:
-                if res.close:
-                    self.fire(close(sock))
-                # Delete the request/response objects if present
-                if sock in self._clients:
-                    del self._clients[sock]
-                res.done = True
+                self._response_done(res)
+
+    def _response_done(self, res):
+        """Finish the response ``res`` and move on to the next request"""
+
+        req = res.request
+        sock = req.sock
+
+        res.done = True
+
+        if res.close:
+            self.fire(close(sock))
+
+        client = self._clients.get(sock)
+        if client is None or client[0] is not req:
+            return
+
+        del self._clients[sock]
+
+        pipeline = self._pipelines.get(sock)
+        if pipeline and not res.close:
+            req, res, event = pipeline.popleft()
+            self._clients[sock] = (req, res)
+            self.fire(event)
+        else:
+            self._pipelines.pop(sock, None)
+
+    def _dispatch(self, req, res, event):
+        """Fire ``event`` for ``req`` unless a previous request of the
+        same connection is still being responded to"""
+
+        sock = req.sock
+        if sock in self._clients:
+            self._pipelines.setdefault(sock, deque()).append(
+                (req, res, event)
+            )
+        else:
+            self._clients[sock] = (req, res)
+            self.fire(event)
+
+    def _request_event(self, req, res):
+        sock = req.sock
+
+        # Guard against unwanted request paths (SECURITY).
+        path = req.path
+        _path = req.uri._path
+        if (path.encode(self._encoding) != _path) and (
+                quote(path).encode(self._encoding) != _path):
+            return redirect(req, res, [req.uri.utf8()], 301)
+
+        if hasattr(sock, "getpeercert"):
+            peer_cert = sock.getpeercert()
+            if peer_cert:
+                return request(req, res, peer_cert)
+
+        return request(req, res)
+
+    def _abort(self, req, res, code):
+        """Reject ``req`` with an error and ignore the rest of its body"""
+
+        sock = req.sock
+
+        if self._requests.get(sock, (None,))[0] is req:
+            del self._requests[sock]
+            del self._buffers[sock]
+            self._discard.add(sock)
+        elif self._held.pop(sock, None) is not None:
+            self._discard.add(sock)
+
+        self._routing.pop(req, None)
+
+        res.close = True
+        self._dispatch(req, res, httperror(req, res, code))
+
+    @handler("connect")
+    def _on_connect(self, sock, *peername):
+        """``Connect`` Event Handler
+
+        Remembers the remote address of TCP connections, so their requests
+        don't have to look it up.
+        """
+
+        if len(peername) == 2:
+            self._peers[sock] = wrappers.Host(*peername)
 
     @handler("disconnect")
     def _on_disconnect(self, sock):
-        if sock in self._clients:
-            del self._clients[sock]
+        for clients in (
+                self._clients, self._buffers, self._requests,
+                self._pipelines, self._held, self._peers):
+            if sock in clients:
+                del clients[sock]
+
+        self._discard.discard(sock)
+        for req in [req for req in self._routing if req.sock is sock]:
+            del self._routing[req]
+
+        self._paused.discard(sock)
+
+        res = self._streams.pop(sock, None)
+        if res is not None:
+            if hasattr(res.body, "close"):
+                res.body.close()
+            res.done = True
 
     @handler("read")  # noqa
     def _on_read(self, sock, data):
@@ -213,6 +402,19 @@ class HTTP(BaseComponent):
         Raw Event per line. Any unfinished lines of text, leave in the buffer.
         """
 
+        if sock in self._discard:
+            return
+
+        if sock in self._held:
+            self._held[sock].append(data)
+            return
+
+        # Feed any data following a complete request (pipelining)
+        # into the parser of the next one.
+        while data:
+            data = self._parse(sock, data)
+
+    def _parse(self, sock, data):
         if sock in self._buffers:
             parser = self._buffers[sock]
         else:
@@ -223,11 +425,13 @@ class HTTP(BaseComponent):
             # client connection since we can't respond to it anyway.
 
             if is_ssl_handshake(data) and not self._server.secure:
-                if sock in self._buffers:
-                    del self._buffers[sock]
-                if sock in self._clients:
-                    del self._clients[sock]
-                return self.fire(close(sock))
+                for clients in (
+                        self._clients, self._buffers, self._requests,
+                        self._pipelines):
+                    if sock in clients:
+                        del clients[sock]
+                self.fire(close(sock))
+                return None
 
         _scheme = "https" if self._server.secure else "http"
         parser.execute(data, len(data))
@@ -247,12 +451,15 @@ class HTTP(BaseComponent):
                     )
                 req.server = self._server
                 res = wrappers.Response(req, encoding=self._encoding)
+                # Nothing after a malformed request can be trusted
+                res.close = True
                 del self._buffers[sock]
-                return self.fire(httperror(req, res, 400))
+                self._discard.add(sock)
+                self._dispatch(req, res, httperror(req, res, 400))
             return
 
-        if sock in self._clients:
-            req, res = self._clients[sock]
+        if sock in self._requests:
+            req, res, received = self._requests[sock]
         else:
             method = parser.get_method()
             scheme = parser.get_scheme() or _scheme
@@ -265,46 +472,117 @@ class HTTP(BaseComponent):
                 headers=parser.get_headers(), server=self._server
             )
 
-            res = wrappers.Response(req, encoding=self._encoding)
+            if sock in self._peers:
+                req.remote = self._peers[sock]
 
-            self._clients[sock] = (req, res)
+            res = wrappers.Response(req, encoding=self._encoding)
 
             rp = req.protocol
             sp = self.protocol
 
             if rp[0] != sp[0]:
                 # the major HTTP version differs
-                return self.fire(httperror(req, res, 505))
+                res.close = True
+                del self._buffers[sock]
+                self._discard.add(sock)
+                return self._dispatch(req, res, httperror(req, res, 505))
 
             res.protocol = "HTTP/{0:d}.{1:d}".format(*min(rp, sp))
             res.close = not parser.should_keep_alive()
 
-        clen = int(req.headers.get("Content-Length", "0"))
-        if clen and not parser.is_message_complete():
-            return
+            received = 0
+            self._requests[sock] = (req, res, received)
 
-        if hasattr(sock, "getpeercert"):
-            peer_cert = sock.getpeercert()
-            if peer_cert:
-                e = request(req, res, peer_cert)
+            clen = int(req.headers.get("Content-Length", 0))
+            if clen or parser.is_chunked():
+                req.max_body_size = self._max_body_size
+                if req.max_body_size is not None and \
+                        clen > req.max_body_size:
+                    return self._abort(req, res, 413)
+
+                if clen and clen <= self._spool_size:
+                    req.body = BytesIO()
+                else:
+                    req.body = SpooledTemporaryFile(self._spool_size)
+
+                # Let the request's route decide on its body first
+                self._routing[req] = None
+                self.fire(request_headers(req, res))
+
+        data = parser.recv_body()
+        if data:
+            received += len(data)
+            self._requests[sock] = (req, res, received)
+
+            if req.max_body_size is not None and \
+                    received > req.max_body_size:
+                return self._abort(req, res, 413)
+
+            if req.stream_body and req not in self._routing:
+                self.fire(request_body(req, res, data))
             else:
-                e = request(req, res)
-        else:
-            e = request(req, res)
+                req.body.write(data)
 
-        # Guard against unwanted request paths (SECURITY).
-        path = req.path
-        _path = req.uri._path
-        if (path.encode(self._encoding) != _path) and (
-                quote(path).encode(self._encoding) != _path):
-            return self.fire(
-                redirect(req, res, [req.uri.utf8()], 301)
-            )
+        if not parser.is_message_complete():
+            if parser.errno is not None:
+                self._abort(req, res, 400)
+            return
 
-        req.body = BytesIO(parser.recv_body())
         del self._buffers[sock]
+        del self._requests[sock]
+
+        if req in self._routing:
+            # Dispatched once the route is known, hold back any following
+            # requests until then to keep them in order.
+            self._routing[req] = self._request_event(req, res)
+            if not parser.is_upgrade():
+                self._held[sock] = [parser.recv_rest()]
+            return
+        elif req.stream_body:
+            self.fire(request_body(req, res, None))
+        else:
+            req.body.seek(0)
+            self._dispatch(req, res, self._request_event(req, res))
+
+        # The connection is handed over to another protocol
+        if parser.is_upgrade():
+            return
+
+        return parser.recv_rest()
+
+    @handler("request_headers_complete")
+    def _on_request_headers_complete(self, e, value):
+        req, res = e.args
+        if req not in self._routing:
+            # Rejected or disconnected meanwhile
+            return
 
-        self.fire(e)
+        # The request event if the whole request was received already
+        event = self._routing.pop(req)
+
+        received = req.body.tell()
+        clen = int(req.headers.get("Content-Length", 0))
+        if req.max_body_size is not None and \
+                max(clen, received) > req.max_body_size:
+            return self._abort(req, res, 413)
+
+        if req.stream_body:
+            req.body.seek(0)
+            data = req.body.read()
+            req.body = BytesIO()
+
+            self._dispatch(req, res, event or self._request_event(req, res))
+            if data:
+                self.fire(request_body(req, res, data))
+            if event is not None:
+                self.fire(request_body(req, res, None))
+        elif event is not None:
+            req.body.seek(0)
+            self._dispatch(req, res, event)
+
+        held = self._held.pop(req.sock, None)
+        if held:
+            self._on_read(req.sock, b"".join(held))
 
     @handler("httperror")
     def _on_httperror(self, event, req, res, code, **kwargs):
@@ -5,6 +5,7 @@
 circutis.web Web Server and Testing Tool.
 """
 import os
+from functools import partial
 from hashlib import md5
 from optparse import OptionParser
 from sys import stderr
@@ -13,6 +14,7 @@ from wsgiref.validate import validator
 
 import circuits
 from circuits import Component, Debugger, Manager, handler
+from circuits.app import Supervisor
 from circuits.core.pollers import Select
 from circuits.tools import graph, inspect
 from circuits.web import BaseServer, Controller, Logger, Server, Static
@@ -65,7 +67,7 @@ def parse_options():
     parser.add_option(
         "-j", "--jobs",
         action="store", type="int", default=0, dest="jobs",
-        help="Specify no. of jobs/processes to start"
+        help="Specify no. of worker processes to start (SO_REUSEPORT)"
     )
 
     parser.add_option(
@@ -175,20 +177,7 @@ def parse_bind(bind):
     return (address, port)
 
 
-def main():
-    opts, args = parse_options()
-
-    bind = parse_bind(opts.bind)
-
-    if opts.validate:
-        application = (Application() + Root())
-        app = validator(application)
-
-        httpd = make_server(bind[0], bind[1], app)
-        httpd.serve_forever()
-
-        raise SystemExit(0)
-
+def setup_manager(opts, args, bind, **kwargs):
     manager = Manager()
 
     opts.debug and Debugger().register(manager)
@@ -197,10 +186,10 @@ def main():
     Poller().register(manager)
 
     if opts.server.lower() == "base":
-        BaseServer(bind).register(manager)
+        BaseServer(bind, **kwargs).register(manager)
         HelloWorld().register(manager)
     else:
-        Server(bind).register(manager)
+        Server(bind, **kwargs).register(manager)
         Root().register(manager)
 
     docroot = os.getcwd() if not args else args[0]
@@ -211,6 +200,31 @@ def main():
 
     opts.logging and Logger().register(manager)
 
+    return manager
+
+
+def main():
+    opts, args = parse_options()
+
+    bind = parse_bind(opts.bind)
+
+    if opts.validate:
+        application = (Application() + Root())
+        app = validator(application)
+
+        httpd = make_server(bind[0], bind[1], app)
+        httpd.serve_forever()
+
+        raise SystemExit(0)
+
+    if opts.jobs:
+        factory = partial(
+            setup_manager, opts, args, bind, reuse_port=True
+        )
+        manager = Manager() + Supervisor(factory, workers=opts.jobs)
+    else:
+        manager = setup_manager(opts, args, bind)
+
     if opts.profile and hotshot:
         profiler = hotshot.Profile(".profile")
         profiler.start()
@@ -220,9 +234,6 @@ def main():
         print()
         print(inspect(manager))
 
-    for i in range(opts.jobs):
-        manager.start(process=True)
-
     manager.run()
 
     if opts.profile and hotshot:
@@ -50,17 +50,23 @@ class HttpParser(object):
         self.errstr = ""
 
         # protected variables
+        self._head = bytearray()
+        self._scan = 0
+        self._eol = 0
         self._buf = []
+        self._buffered = 0
+        self._need = 0
         self._version = None
         self._method = None
         self._status_code = None
         self._status = None
         self._reason = None
         self._url = None
+        self._scheme = None
         self._path = None
         self._query_string = None
         self._headers = Headers([])
-        self._environ = dict()
+        self._environ = None
         self._chunked = False
         self._body = []
         self._trailers = None
@@ -100,6 +106,23 @@ class HttpParser(object):
     def get_headers(self):
         return self._headers
 
+    def get_wsgi_environ(self):
+        """ return the WSGI environ of the request, built on first use """
+        if self._environ is None:
+            environ = dict(
+                ("HTTP_%s" % name.upper().replace("-", "_"), value)
+                for name, value in self._headers.items()
+            )
+            environ.update({
+                "PATH_INFO": self._path,
+                "QUERY_STRING": self._query_string,
+                "RAW_URI": self._url,
+                "REQUEST_METHOD": self._method,
+                "SERVER_PROTOCOL": "HTTP/%d.%d" % self._version
+            })
+            self._environ = environ
+        return self._environ
+
     def recv_body(self):
         """ return last chunk of the parsed body"""
         body = b("").join(self._body)
@@ -107,6 +130,16 @@ class HttpParser(object):
         self._partial_body = False
         return body
 
+    def recv_rest(self):
+        """ return data received after the end of the message (eg: the
+        next pipelined request) """
+        if not self.__on_message_complete:
+            return b("")
+        rest = b("").join(self._buf)
+        self._buf = []
+        self._buffered = 0
+        return rest
+
     def recv_body_into(self, barray):
         """ Receive the last chunk of the parsed bodyand store the data
         in a buffer rather than creating a new string. """
@@ -161,68 +194,82 @@ class HttpParser(object):
         # end of body can be passed manually by putting a length of 0
 
         if length == 0:
-            self.on_message_complete = True
+            self.__on_message_complete = True
             return length
 
-        # start to parse
-        nb_parsed = 0
-        while True:
-            if not self.__on_firstline:
-                idx = data.find(b("\r\n"))
-                if idx < 0:
-                    self._buf.append(data)
-                    return len(data)
-                else:
-                    self.__on_firstline = True
-                    self._buf.append(data[:idx])
-                    first_line = b("").join(self._buf)
-                    if PY3:
-                        first_line = str(first_line, 'unicode_escape')
-                    nb_parsed = nb_parsed + idx + 2
-
-                    rest = data[idx + 2:]
-                    data = b("")
-                    if self._parse_firstline(first_line):
-                        self._buf = [rest]
-                    else:
-                        return nb_parsed
-            elif not self.__on_headers_complete:
-                if data:
-                    self._buf.append(data)
-                    data = b("")
+        if self.errno is not None:
+            return 0
 
-                try:
-                    to_parse = b("").join(self._buf)
-                    ret = self._parse_headers(to_parse)
-                    if not ret:
-                        return length
-                    nb_parsed = nb_parsed + (len(to_parse) - ret)
-                except InvalidHeader as e:
-                    self.errno = INVALID_HEADER
-                    self.errstr = str(e)
-                    return nb_parsed
-            elif not self.__on_message_complete:
-                if not self.__on_message_begin:
-                    self.__on_message_begin = True
-
-                if data:
-                    self._buf.append(data)
-                    data = b("")
-
-                ret = self._parse_body()
-                if ret is None:
-                    return length
-
-                elif ret < 0:
-                    return ret
-                elif ret == 0:
-                    self.__on_message_complete = True
-                    return length
-                else:
-                    nb_parsed = max(length, ret)
-
-            else:
+        if not self.__on_headers_complete:
+            nb_parsed = self._parse_head(data)
+            if not self.__on_headers_complete:
+                return nb_parsed
+            # the rest of data was moved to the body buffer
+            data = b("")
+
+        if self.__on_message_complete:
+            return 0
+
+        self.__on_message_begin = True
+
+        if data:
+            self._buf.append(data)
+            self._buffered += len(data)
+
+        while not self.__on_message_complete:
+            # don't rescan a chunk we know is not complete yet
+            if self._buffered < self._need:
+                return length
+
+            ret = self._parse_body()
+            if ret is None:
+                return length
+            elif ret < 0:
+                return ret
+            elif ret == 0:
+                self.__on_message_complete = True
+
+        return length
+
+    def _parse_head(self, data):
+        # The request/status line and headers are collected in one buffer
+        # and every search resumes where the previous one stopped, so
+        # headers trickling in byte by byte are still scanned only once.
+        head = self._head
+        head.extend(data)
+
+        if not self.__on_firstline:
+            idx = head.find(b("\r\n"), self._scan)
+            if idx < 0:
+                self._scan = max(len(head) - 1, 0)
+                return len(data)
+
+            self.__on_firstline = True
+            if not self._parse_firstline(_native(head[:idx])):
                 return 0
+            self._eol = self._scan = idx
+
+        # An empty header block ends right at the first line's CRLF
+        idx = head.find(b("\r\n\r\n"), self._scan)
+        if idx < 0:
+            self._scan = max(len(head) - 3, self._eol)
+            return len(data)
+
+        try:
+            self._parse_headers(head[self._eol + 2:idx])
+        except InvalidHeader as e:
+            self.errno = INVALID_HEADER
+            self.errstr = str(e)
+            return 0
+
+        rest = bytes(head[idx + 4:])
+        self._head = None
+        if rest:
+            self._buf.append(rest)
+            self._buffered = len(rest)
+
+        self.__on_headers_complete = True
+        return len(data)
 
     def _parse_firstline(self, line):
         try:
@@ -288,48 +335,9 @@ class HttpParser(object):
             raise InvalidRequestLine("Invalid HTTP version: %s" % bits[2])
         self._version = (int(match.group(1)), int(match.group(2)))
 
-        # update environ
-        if hasattr(self, 'environ'):
-            self._environ.update({
-                "PATH_INFO": self._path,
-                "QUERY_STRING": self._query_string,
-                "RAW_URI": self._url,
-                "REQUEST_METHOD": self._method,
-                "SERVER_PROTOCOL": bits[2]})
-
     def _parse_headers(self, data):
-        idx = data.find(b("\r\n\r\n"))
-        if idx < 0:  # we don't have all headers
-            return False
-
-        # Split lines on \r\n keeping the \r\n on each line
-        lines = [(str(line, 'unicode_escape') if PY3 else line) + "\r\n"
-                 for line in data[:idx].split(b("\r\n"))]
-
-        # Parse headers into key/value pairs paying attention
-        # to continuation lines.
-        while len(lines):
-            # Parse initial header name : value pair.
-            curr = lines.pop(0)
-            if curr.find(":") < 0:
-                raise InvalidHeader("invalid line %s" % curr.strip())
-            name, value = curr.split(":", 1)
-            name = name.rstrip(" \t").upper()
-            if HEADER_RE.search(name):
-                raise InvalidHeader("invalid header name %s" % name)
-            name, value = name.strip(), [value.lstrip()]
-
-            # Consume value continuation lines
-            while len(lines) and lines[0].startswith((" ", "\t")):
-                value.append(lines.pop(0))
-            value = ''.join(value).rstrip()
-
-            # store new header value
-            self._headers.add_header(name, value)
-
-            # update WSGI environ
-            key = 'HTTP_%s' % name.upper().replace('-', '_')
-            self._environ[key] = value
+        for name, value in _parse_header_lines(data):
+            self._headers.append(name, value)
 
         # detect now if body is sent by chunks.
         clen = self._headers.get('content-length')
@@ -339,11 +347,13 @@ class HttpParser(object):
             try:
                 self._clen_rest = self._clen = int(clen)
             except ValueError:
-                pass
+                raise InvalidHeader("invalid content-length %s" % clen)
         else:
             self._chunked = (te == 'chunked')
             if not self._chunked:
-                self._clen_rest = MAXSIZE
+                # a request without a length has no body, a response
+                # without one lasts until the connection is closed
+                self._clen_rest = 0 if self._method is not None else MAXSIZE
 
         # detect encoding and set decompress object
         encoding = self._headers.get('content-encoding')
@@ -353,14 +363,19 @@ class HttpParser(object):
             elif encoding == "deflate":
                 self.__decompress_obj = zlib.decompressobj()
 
-        rest = data[idx + 4:]
-        self._buf = [rest]
-        self.__on_headers_complete = True
-        return len(rest)
-
     def _parse_body(self):
         if not self._chunked:
             body_part = b("").join(self._buf)
+            self._buf = []
+            self._buffered = 0
+
+            # keep anything past the end of the body for the next message
+            if len(body_part) > self._clen_rest:
+                rest = body_part[self._clen_rest:]
+                body_part = body_part[:self._clen_rest]
+                self._buf = [rest]
+                self._buffered = len(rest)
+
             self._clen_rest -= len(body_part)
 
             # maybe decompress
@@ -369,17 +384,16 @@ class HttpParser(object):
 
             self._partial_body = True
             self._body.append(body_part)
-            self._buf = []
 
             if self._clen_rest <= 0:
                 self.__on_message_complete = True
             return
         else:
             data = b("").join(self._buf)
+            self._buf = [data]
             try:
-
                 size, rest = self._parse_chunk_size(data)
-            except InvalidChunkSize as e:
+            except (InvalidChunkSize, InvalidHeader) as e:
                 self.errno = INVALID_CHUNK
                 self.errstr = "invalid chunk size [%s]" % str(e)
                 return -1
@@ -387,11 +401,18 @@ class HttpParser(object):
             if size == 0:
                 return size
 
-            if size is None or len(rest) < size:
+            if size is None:
+                # wait for the rest of the chunk size line
+                self._need = len(data) + 1
+                return None
+
+            if len(rest) < size + 2:
+                # wait for the whole chunk and its terminator
+                self._need = len(data) - len(rest) + size + 2
                 return None
 
             body_part, rest = rest[:size], rest[size:]
-            if len(rest) < 2:
+            if rest[:2] != b("\r\n"):
                 self.errno = INVALID_CHUNK
                 self.errstr = "chunk missing terminator [%s]" % data
                 return -1
@@ -404,7 +425,9 @@ class HttpParser(object):
             self._body.append(body_part)
 
             self._buf = [rest[2:]]
-            return len(rest)
+            self._buffered = len(rest) - 2
+            self._need = 0
+            return len(data) - len(rest) + 2
 
     def _parse_chunk_size(self, data):
         idx = data.find(b("\r\n"))
@@ -418,12 +441,55 @@ class HttpParser(object):
             raise InvalidChunkSize(chunk_size)
 
         if chunk_size == 0:
-            self._parse_trailers(rest_chunk)
+            if not self._parse_trailers(rest_chunk):
+                return None, None
             return 0, None
         return chunk_size, rest_chunk
 
     def _parse_trailers(self, data):
+        if data[:2] == b("\r\n"):
+            self._buf = [data[2:]]
+            return True
+
         idx = data.find(b("\r\n\r\n"))
+        if idx < 0:
+            return False
 
-        if data[:2] == b("\r\n"):
-            self._trailers = self._parse_headers(data[:idx])
+        self._trailers = Headers(_parse_header_lines(data[:idx]))
+        self._buf = [data[idx + 4:]]
+        return True
+
+
+def _native(data):
+    """Decode raw header bytes into a native string"""
+
+    if PY3:
+        return data.decode("iso-8859-1")
+    return bytes(data)
+
+
+def _parse_header_lines(data):
+    """Parse a block of header lines into a list of (name, value) pairs"""
+
+    headers = []
+    if not data:
+        return headers
+
+    for line in _native(data).split("\r\n"):
+        # Consume value continuation lines
+        if line[:1] in (" ", "\t"):
+            if not headers:
+                raise InvalidHeader("invalid line %s" % line.strip())
+            name, value = headers[-1]
+            headers[-1] = (name, (value + " " + line.strip()).strip())
+            continue
+
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise InvalidHeader("invalid line %s" % line.strip())
+        name = name.rstrip(" \t")
+        if HEADER_RE.search(name):
+            raise InvalidHeader("invalid header name %s" % name)
+        headers.append((name.strip(), value.strip()))
+
+    return headers
@@ -116,7 +116,7 @@ def tob(data, enc='utf8'):  # Convert strings to bytes (py2 and py3)
     return data.encode(enc) if isinstance(data, text_type) else data
 
 
-def copy_file(stream, target, maxread=-1, buffer_size=2 * 16):
+def copy_file(stream, target, maxread=-1, buffer_size=2 ** 16):
     ''' Read from :stream and write to :target until :maxread or EOF. '''
     size, read = 0, stream.read
     while 1:
@@ -176,17 +176,30 @@ class MultipartError(ValueError):
     pass
 
 
+# Parser states
+PREAMBLE, HEADERS, BODY, END = range(4)
+
+
 class MultipartParser(object):
 
     def __init__(self, stream, boundary, content_length=-1,
                  disk_limit=2 ** 30, mem_limit=2 ** 20, memfile_limit=2 ** 18,
-                 buffer_size=2 ** 16, charset='latin1'):
+                 buffer_size=2 ** 16, charset='latin1', sink=None):
         ''' Parse a multipart/form-data byte stream. This object is an iterator
             over the parts of the message.
 
+            Instead of reading it from a stream the message can also be fed
+            to the parser as it arrives (eg: from a streamed request body)
+            with :meth:`feed` and :meth:`close`.
+
             :param stream: A file-like stream. Must implement ``.read(size)``.
+                           May be ``None`` if the message is fed.
             :param boundary: The multipart boundary as a byte string.
             :param content_length: The maximum number of bytes to read.
+            :param sink: A callable that is passed each part once its headers
+                         are parsed and returns the file-like object to write
+                         its body to, or ``None`` for the default (a temporary
+                         file for uploaded files, memory for other fields).
         '''
         self.stream, self.boundary = stream, boundary
         self.content_length = content_length
@@ -195,20 +208,31 @@ class MultipartParser(object):
         self.mem_limit = min(mem_limit, self.disk_limit)
         self.buffer_size = min(buffer_size, self.mem_limit)
         self.charset = charset
+        self.sink = sink
         if self.buffer_size - 6 < len(boundary):  # "--boundary--\r\n"
             raise MultipartError('Boundary does not fit into buffer_size.')
         self._done = []
         self._part_iter = None
 
+        # The delimiter is searched for in whole blocks of data. As it
+        # starts with a line break, the message is prefixed with one.
+        self._delimiter = tob('\r\n--') + tob(boundary)
+        self._buf = tob('\r\n')
+        self._state = PREAMBLE
+        self._part = None
+        self._mem_used, self._disk_used = 0, 0  # Prevent DoS
+
     def __iter__(self):
         ''' Iterate over the parts of the multipart message. '''
         if not self._part_iter:
-            self._part_iter = self._iterparse()
-        for part in self._done:
-            yield part
-        for part in self._part_iter:
-            self._done.append(part)
-            yield part
+            self._part_iter = self._readiter()
+        index = 0
+        while True:
+            while index < len(self._done):
+                yield self._done[index]
+                index += 1
+            if next(self._part_iter, None) is None:
+                break
 
     def parts(self):
         ''' Returns a list with all parts of the multipart message. '''
@@ -225,90 +249,114 @@ class MultipartParser(object):
         ''' Return a list of parts with that name. '''
         return [p for p in self if p.name == name]
 
-    def _lineiter(self):
-        ''' Iterate over a binary file-like object line by line. Each line is
-            returned as a (line, line_ending) tuple. If the line does not fit
-            into self.buffer_size, line_ending is empty and the rest of the line
-            is returned with the next iteration.
-        '''
+    def _readiter(self):
+        ''' Feed the stream to the parser in blocks of self.buffer_size,
+            yielding after each block. '''
+        if self.stream is None:
+            return
         read = self.stream.read
         maxread, maxbuf = self.content_length, self.buffer_size
-        _bcrnl = tob('\r\n')
-        _bcr = _bcrnl[:1]
-        _bnl = _bcrnl[1:]
-        _bempty = _bcrnl[:0]  # b'rn'[:0] -> b''
-        buffer = _bempty  # buffer for the last (partial) line
-        while 1:
+        while self._state != END:
             data = read(maxbuf if maxread < 0 else min(maxbuf, maxread))
-            maxread -= len(data)
-            lines = (buffer + data).splitlines(True)
-            len_first_line = len(lines[0])
-            # be sure that the first line does not become too big
-            if len_first_line > self.buffer_size:
-                # at the same time don't split a '\r\n' accidentally
-                if (len_first_line == self.buffer_size + 1 and
-                        lines[0].endswith(_bcrnl)):
-                    splitpos = self.buffer_size - 1
-                else:
-                    splitpos = self.buffer_size
-                lines[:1] = [lines[0][:splitpos],
-                             lines[0][splitpos:]]
-            if data:
-                buffer = lines[-1]
-                lines = lines[:-1]
-            for line in lines:
-                if line.endswith(_bcrnl):
-                    yield line[:-2], _bcrnl
-                elif line.endswith(_bnl):
-                    yield line[:-1], _bnl
-                elif line.endswith(_bcr):
-                    yield line[:-1], _bcr
-                else:
-                    yield line, _bempty
             if not data:
                 break
+            maxread -= len(data)
+            self.feed(data)
+            yield True
+        self.close()
+
+    def feed(self, data):
+        ''' Parse the next block of the message. Returns a list of the parts
+            completed by it. '''
+        parts = len(self._done)
+        buf = self._buf + data if self._buf else data
+        pos = search = 0
+        size = len(self._delimiter)
+
+        while self._state != END:
+            if self._state == HEADERS:
+                # The header block starts with the line break that ended
+                # the boundary line, so an empty one is found, too.
+                idx = buf.find(tob('\r\n\r\n'), pos)
+                if idx < 0:
+                    if len(buf) - pos > self.buffer_size:
+                        raise MultipartError("Part headers too large.")
+                    break
+                self._start_part(buf[pos + 2:idx])
+                pos = search = idx + 4
+                self._state = BODY
+                continue
+
+            idx = buf.find(self._delimiter, search)
+            if idx < 0:
+                # Keep what might be the start of a delimiter
+                end = max(pos, len(buf) - size + 1)
+                self._write(buf[pos:end])
+                pos = end
+                break
 
-    def _iterparse(self):
-        lines, line = self._lineiter(), ''
-        separator = tob('--') + tob(self.boundary)
-        terminator = tob('--') + tob(self.boundary) + tob('--')
-        # Consume first boundary. Ignore leading blank lines
-        for line, nl in lines:
-            if line:
+            # The boundary line ends with "--" or (padding and) a line break
+            if buf[idx + size:idx + size + 2] == tob('--'):
+                self._write(buf[pos:idx])
+                self._finish_part()
+                self._state = END
                 break
-        if line != separator:
-            raise MultipartError("Stream does not start with boundary")
-        # For each part in stream...
-        mem_used, disk_used = 0, 0  # Track used resources to prevent DoS
-        is_tail = False  # True if the last line was incomplete (cutted)
-        opts = {'buffer_size': self.buffer_size,
-                'memfile_limit': self.memfile_limit,
-                'charset': self.charset}
-        part = MultipartPart(**opts)
-        for line, nl in lines:
-            if line == terminator and not is_tail:
-                part.file.seek(0)
-                yield part
+            eol = buf.find(tob('\r\n'), idx + size)
+            if eol < 0 and len(buf) - idx <= self.buffer_size:
+                # Wait for the rest of the boundary line
+                self._write(buf[pos:idx])
+                pos = idx
                 break
-            elif line == separator and not is_tail:
-                if part.is_buffered():
-                    mem_used += part.size
-                else:
-                    disk_used += part.size
-                part.file.seek(0)
-                yield part
-                part = MultipartPart(**opts)
-            else:
-                is_tail = not nl  # The next line continues this one
-                part.feed(line, nl)
-                if part.is_buffered():
-                    if part.size + mem_used > self.mem_limit:
-                        raise MultipartError("Memory limit reached.")
-                elif part.size + disk_used > self.disk_limit:
-                    raise MultipartError("Disk limit reached.")
-        if line != terminator:
+            if eol < 0 or buf[idx + size:eol].strip():
+                # Not a boundary but data starting like one
+                search = idx + 1
+                continue
+            self._write(buf[pos:idx])
+            self._finish_part()
+            pos = search = eol
+            self._state = HEADERS
+
+        self._buf = buf[pos:] if self._state != END else tob('')
+        return self._done[parts:]
+
+    def close(self):
+        ''' Finish parsing, checking that the message was complete. '''
+        if self._state == PREAMBLE:
+            raise MultipartError("Stream does not start with boundary")
+        if self._state != END:
             raise MultipartError("Unexpected end of multipart stream.")
 
+    def _start_part(self, data):
+        self._part = MultipartPart(
+            buffer_size=self.buffer_size, memfile_limit=self.memfile_limit,
+            charset=self.charset
+        )
+        self._part.write_headers(data, self.sink)
+
+    def _write(self, data):
+        if not data or self._state != BODY:
+            return
+        part = self._part
+        part.write_body(data)
+        if part.is_buffered():
+            if part.size + self._mem_used > self.mem_limit:
+                raise MultipartError("Memory limit reached.")
+        elif part.size + self._disk_used > self.disk_limit:
+            raise MultipartError("Disk limit reached.")
+
+    def _finish_part(self):
+        part = self._part
+        if part is None:  # The first boundary
+            return
+        if part.is_buffered():
+            self._mem_used += part.size
+        else:
+            self._disk_used += part.size
+        if part.spooled:
+            part.file.seek(0)
+        self._part = None
+        self._done.append(part)
+
 
 class MultipartPart(object):
 
@@ -317,52 +365,44 @@ class MultipartPart(object):
         self.headers = None
         self.file = False
         self.size = 0
-        self._buf = tob('')
         self.disposition, self.name, self.filename = None, None, None
         self.content_type, self.charset = None, charset
+        self.content_length = -1
+        self.spooled = True
         self.memfile_limit = memfile_limit
         self.buffer_size = buffer_size
 
-    def feed(self, line, nl=''):
-        if self.file:
-            return self.write_body(line, nl)
-        return self.write_header(line, nl)
-
-    def write_header(self, line, nl):
-        line = line.decode(self.charset or 'latin1')
-        if not nl:
-            raise MultipartError('Unexpected end of line in header.')
-        if not line.strip():  # blank line -> end of header segment
-            self.finish_header()
-        elif line[0] in ' \t' and self.headerlist:
-            name, value = self.headerlist.pop()
-            self.headerlist.append((name, value + line.strip()))
-        else:
-            if ':' not in line:
-                raise MultipartError("Syntax error in header: No colon.")
-            name, value = line.split(':', 1)
-            self.headerlist.append((name.strip(), value.strip()))
-
-    def write_body(self, line, nl):
-        if not line and not nl:
-            return  # This does not even flush the buffer
-        self.size += len(line) + len(self._buf)
-        self.file.write(self._buf + line)
-        self._buf = nl
+    def write_headers(self, data, sink=None):
+        ''' Parse the header block of the part and open its file. '''
+        if data:
+            for line in data.decode(self.charset or 'latin1').split('\r\n'):
+                if line[:1] in (' ', '\t') and self.headerlist:
+                    name, value = self.headerlist.pop()
+                    self.headerlist.append((name, value + line.strip()))
+                else:
+                    if ':' not in line:
+                        raise MultipartError("Syntax error in header: No colon.")
+                    name, value = line.split(':', 1)
+                    self.headerlist.append((name.strip(), value.strip()))
+        self.finish_header(sink)
+
+    def write_body(self, data):
+        self.size += len(data)
+        self.file.write(data)
         if self.content_length > 0 and self.size > self.content_length:
             raise MultipartError('Size of body exceeds Content-Length header.')
-        if self.size > self.memfile_limit and isinstance(self.file, BytesIO):
+        if self.spooled and self.size > self.memfile_limit and \
+                isinstance(self.file, BytesIO):
+            # A sink's file is the caller's, it is never swapped.
             # TODO: What about non-file uploads that exceed the memfile_limit?
             self.file, old = TemporaryFile(mode='w+b'), self.file
             old.seek(0)
             copy_file(old, self.file, self.size, self.buffer_size)
 
-    def finish_header(self):
-        self.file = BytesIO()
+    def finish_header(self, sink=None):
         self.headers = Headers(self.headerlist)
         cdis = self.headers.get('Content-Disposition', '')
         ctype = self.headers.get('Content-Type', '')
-        self.headers.get('Content-Length', '-1')
         if not cdis:
             raise MultipartError('Content-Disposition header is missing.')
         self.disposition, self.options = parse_options_header(cdis)
@@ -372,6 +412,12 @@ class MultipartPart(object):
         self.charset = options.get('charset') or self.charset
         self.content_length = int(self.headers.get('Content-Length', '-1'))
 
+        # Uploaded files are written straight to disk
+        self.file = sink(self) if sink is not None else None
+        self.spooled = self.file is None
+        if self.spooled:
+            self.file = TemporaryFile(mode='w+b') if self.filename else BytesIO()
+
     def is_buffered(self):
         ''' Return true if the data is fully buffered in memory.'''
         return isinstance(self.file, BytesIO)
@@ -37,7 +37,8 @@ def process_multipart(request, params):
 
 def process_urlencoded(request, params, encoding="utf-8"):
     params.update(QueryStringParser(request.qs).result)
-    body = request.body.getvalue()
+    body = request.body.read()
+    request.body.seek(0)
     if PY3:
         body = body.decode(encoding)
     result = QueryStringParser(body).result
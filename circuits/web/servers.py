@@ -2,6 +2,7 @@
 
 This module implements the several Web Server components.
 """
+from socket import AF_UNIX, socket
 from sys import stderr
 
 from circuits import io
@@ -11,7 +12,7 @@ from circuits.net.sockets import TCPServer, UNIXServer
 
 from .dispatchers import Dispatcher
 from .events import terminate
-from .http import HTTP
+from .http import HTTP, SPOOL_SIZE
 
 
 class BaseServer(BaseComponent):
@@ -24,7 +25,7 @@ class BaseServer(BaseComponent):
     :ivar server: Reference to underlying Server Component
 
     :param bind: IP Address / Port or UNIX Socket to bind to.
-    :type bind: Instance of int, list, tuple or str
+    :type bind: Instance of int, list, tuple, str or socket
 
     The 'bind' parameter is quite flexible with what valid values it accepts.
 
@@ -44,12 +45,23 @@ class BaseServer(BaseComponent):
     Otherwise if a str is passed and it does not contain the ':'
     character, a file path is assumed and a UNIXServer is created and
     bound to the file given by the 'bind' argument.
+
+    If a bound and listening socket is passed, a TCPServer (or UNIXServer
+    for UNIX Sockets) is created using that socket.
+
+    Request bodies larger than 'spool_size' bytes are spooled to a
+    temporary file. Requests with a body larger than 'max_body_size'
+    bytes (if given) are rejected.
+
+    Any additional keyword arguments (eg: ``reuse_port``) are passed on
+    to the underlying Server Component.
     """
 
     channel = "web"
 
     def __init__(self, bind, encoding="utf-8", secure=False, certfile=None,
-                 channel=channel, display_banner=True):
+                 channel=channel, display_banner=True,
+                 spool_size=SPOOL_SIZE, max_body_size=None, **kwargs):
         "x.__init__(...) initializes x; see x.__class__.__doc__ for signature"
 
         super(BaseServer, self).__init__(channel=channel)
@@ -58,6 +70,8 @@ class BaseServer(BaseComponent):
 
         if isinstance(bind, (int, list, tuple,)):
             SocketType = TCPServer
+        elif isinstance(bind, socket):
+            SocketType = UNIXServer if bind.family == AF_UNIX else TCPServer
         else:
             SocketType = TCPServer if ":" in bind else UNIXServer
 
@@ -65,11 +79,13 @@ class BaseServer(BaseComponent):
             bind,
             secure=secure,
             certfile=certfile,
-            channel=channel
+            channel=channel,
+            **kwargs
         ).register(self)
 
         self.http = HTTP(
-            self, encoding=encoding, channel=channel
+            self, encoding=encoding, channel=channel,
+            spool_size=spool_size, max_body_size=max_body_size
         ).register(self)
 
     @property
@@ -11,15 +11,30 @@ import stat
 from datetime import datetime, timedelta
 from email.generator import _make_boundary
 from email.utils import formatdate
+from io import BytesIO
+from itertools import count
 from time import mktime
 
-from circuits import BaseComponent, handler
+from circuits import BaseComponent, Worker, handler, task
+from circuits.six import binary_type, text_type
 from circuits.web.wrappers import Host
 
 from . import _httpauth
 from .errors import httperror, notfound, redirect, unauthorized
+from .events import response as response_event
 from .utils import compress, get_ranges
 
+try:
+    import brotli  # NOQA
+except ImportError:
+    brotli = None
+
+# Content codings of precompressed files (by file name suffix) in the order
+# they are preferred in.
+PRECOMPRESSED = ((("br", ".br"),) if brotli is not None else ()) + (
+    ("gzip", ".gz"),
+)
+
 mimetypes.init()
 mimetypes.add_type("image/x-dwg", ".dwg")
 mimetypes.add_type("image/x-icon", ".ico")
@@ -76,8 +91,66 @@ def expires(request, response, secs=0, force=False):
             headers["Expires"] = expiry
 
 
+def content_type(path):
+    """Return the Content-Type of the file at path (by its extension)"""
+
+    ext = ""
+    i = path.rfind('.')
+    if i != -1:
+        ext = path[i:].lower()
+    return mimetypes.types_map.get(ext, "text/plain")
+
+
+def file_etag(st):
+    """Return an ETag for the file with the stat result st
+
+    The ETag is unique per file (inode) and version (sub-second mtime and
+    size) and doesn't require reading the file.
+    """
+
+    return '"{0:x}-{1:x}-{2:x}"'.format(
+        st.st_ino, int(st.st_mtime * 1000000), st.st_size
+    )
+
+
+def accepted_encodings(request, encodings):
+    """Return the content codings acceptable to the client
+
+    :param encodings: the content codings available in order of preference.
+
+    :returns: the acceptable ones of encodings, the ones with the highest
+              qvalue of the request's Accept-Encoding header first.
+    """
+
+    acceptable = request.headers.elements('Accept-Encoding')
+    if not acceptable:
+        return []
+
+    qvalues = {}
+    for coding in acceptable:
+        value = "gzip" if coding.value == "x-gzip" else coding.value
+        qvalues.setdefault(value, coding.qvalue)
+
+    accepted = []
+    for i, encoding in enumerate(encodings):
+        qvalue = qvalues.get(encoding, qvalues.get("*", 0))
+        if qvalue > 0:
+            accepted.append((-qvalue, i, encoding))
+    return [encoding for _, _, encoding in sorted(accepted)]
+
+
+def vary(response, header):
+    """Add header to the Vary header of the response"""
+
+    varies = response.headers.get("Vary", "")
+    varies = [x.strip() for x in varies.split(",") if x.strip()]
+    if header not in varies:
+        varies.append(header)
+    response.headers['Vary'] = ", ".join(varies)
+
+
 def serve_file(request, response, path, type=None, disposition=None,
-               name=None):
+               name=None, precompressed=False, etag=False):
     """Set status, headers, and body in order to serve the given file.
 
     The Content-Type header will be set to the type arg, if provided.
@@ -88,11 +161,37 @@ def serve_file(request, response, path, type=None, disposition=None,
     to "<disposition>; filename=<name>". If name is None, it will be set
     to the basename of path. If disposition is None, no Content-Disposition
     header will be written.
+
+    If precompressed is True, a precompressed version of the file (eg:
+    'path'.gz, see: PRECOMPRESSED) is served instead if there is one the
+    client accepts (by its Accept-Encoding header).
+
+    If etag is True, an ETag (see: file_etag) is sent and validated.
     """
 
     if not os.path.isabs(path):
         raise ValueError("'%s' is not an absolute path." % path)
 
+    if precompressed:
+        vary(response, "Accept-Encoding")
+        suffixes = dict(PRECOMPRESSED)
+        encodings = [encoding for encoding, suffix in PRECOMPRESSED]
+        for encoding in accepted_encodings(request, encodings):
+            try:
+                st = os.stat(path + suffixes[encoding])
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                response.headers['Content-Encoding'] = encoding
+                return serve_content(
+                    request, response, path + suffixes[encoding],
+                    st.st_size, formatdate(st.st_mtime, usegmt=True),
+                    etag=file_etag(st) if etag else None,
+                    type=type or content_type(path),
+                    disposition=disposition,
+                    name=name or os.path.basename(path)
+                )
+
     try:
         st = os.stat(path)
     except OSError:
@@ -103,23 +202,43 @@ def serve_file(request, response, path, type=None, disposition=None,
         # Let the caller deal with it as they like.
         return notfound(request, response)
 
+    return serve_content(
+        request, response, path, st.st_size,
+        formatdate(st.st_mtime, usegmt=True),
+        etag=file_etag(st) if etag else None, type=type,
+        disposition=disposition, name=name
+    )
+
+
+def serve_content(request, response, path, size, lastmod, content=None,
+                  etag=None, type=None, disposition=None, name=None):
+    """Set status, headers, and body in order to serve a file.
+
+    Like :func:`serve_file` but for a file whose size and Last-Modified
+    date are already known (see: :class:`~circuits.web.dispatchers.Static`).
+
+    If content is not None, it is served instead of the file's content and
+    the file isn't touched at all. If etag is not None, it is sent as the
+    ETag header and validated against If-Match and If-None-Match headers.
+    """
+
     # Set the Last-Modified response header, so that
     # modified-since validation code can work.
-    response.headers['Last-Modified'] = formatdate(
-        st.st_mtime, usegmt=True
-    )
+    response.headers['Last-Modified'] = lastmod
 
     result = validate_since(request, response)
     if result is not None:
         return result
 
+    if etag is not None:
+        response.headers['ETag'] = etag
+        result = validate_etags(request, response)
+        if result is not None:
+            return result
+
     if type is None:
         # Set content-type based on filename extension
-        ext = ""
-        i = path.rfind('.')
-        if i != -1:
-            ext = path[i:].lower()
-        type = mimetypes.types_map.get(ext, "text/plain")
+        type = content_type(path)
     response.headers['Content-Type'] = type
 
     if disposition is not None:
@@ -128,10 +247,14 @@ def serve_file(request, response, path, type=None, disposition=None,
         cd = '%s; filename="%s"' % (disposition, name)
         response.headers["Content-Disposition"] = cd
 
-    # Set Content-Length and use an iterable (file object)
-    #   this way CP won't load the whole file in memory
-    c_len = st.st_size
-    bodyfile = open(path, 'rb')
+    # Set Content-Length and use the file object as body; the HTTP
+    #   component hands it to the server's sendfile() so that the file is
+    #   never loaded into memory (or even copied through Python)
+    c_len = size
+    if content is not None:
+        bodyfile = BytesIO(content)
+    else:
+        bodyfile = open(path, 'rb')
 
     # HTTP/1.0 didn't have Range/Accept-Ranges headers, or the 206 code
     if request.protocol >= (1, 1):
@@ -182,10 +305,10 @@ def serve_file(request, response, path, type=None, disposition=None,
                 response.body = file_ranges()
         else:
             response.headers['Content-Length'] = c_len
-            response.body = bodyfile
+            response.body = bodyfile if content is None else content
     else:
         response.headers['Content-Length'] = c_len
-        response.body = bodyfile
+        response.body = bodyfile if content is None else content
 
     return response
 
@@ -394,27 +517,26 @@ def digest_auth(request, response, realm, users):
     return unauthorized(request, response)
 
 
-def gzip(response, level=4, mime_types=("text/html", "text/plain",)):
-    """Try to gzip the response body if Content-Type in mime_types.
+def _gzip_negotiate(response, mime_types):
+    """Check whether the response should be gzipped
 
-    response.headers['Content-Type'] must be set to one of the
-    values in the mime_types arg before calling this function.
-
-    No compression is performed if any of the following hold:
-        * The client sends no Accept-Encoding request header
-        * No 'gzip' or 'x-gzip' is present in the Accept-Encoding header
-        * No 'gzip' or 'x-gzip' with a qvalue > 0 is present
-        * The 'identity' value is given with a qvalue > 0.
+    :returns: ``True`` if so, ``None`` if it should be sent as is or the
+              ``httperror`` if the client accepts neither.
     """
 
     if not response.body:
         # Response body is empty (might be a 304 for instance)
-        return response
+        return None
 
     # If returning cached content (which should already have been gzipped),
     # don't re-zip.
     if getattr(response.request, "cached", False):
-        return response
+        return None
+
+    # Don't compress content that is encoded already (eg: a precompressed
+    # file, see: serve_file)
+    if "Content-Encoding" in response.headers:
+        return None
 
     acceptable = response.request.headers.elements('Accept-Encoding')
     if not acceptable:
@@ -425,34 +547,252 @@ def gzip(response, level=4, mime_types=("text/html", "text/plain",)):
         # the "identity" content-coding, unless it has additional
         # information that a different content-coding is meaningful
         # to the client.
-        return response
+        return None
 
     ct = response.headers.get('Content-Type', 'text/html').split(';')[0]
     for coding in acceptable:
         if coding.value == 'identity' and coding.qvalue != 0:
-            return response
+            return None
         if coding.value in ('gzip', 'x-gzip'):
             if coding.qvalue == 0:
-                return response
+                return None
             if ct in mime_types:
-                # Return a generator that compresses the page
-                varies = response.headers.get("Vary", "")
-                varies = [x.strip() for x in varies.split(",") if x.strip()]
-                if "Accept-Encoding" not in varies:
-                    varies.append("Accept-Encoding")
-                response.headers['Vary'] = ", ".join(varies)
-
-                response.headers['Content-Encoding'] = 'gzip'
-                response.body = compress(response.body, level)
-                if "Content-Length" in response.headers:
-                    # Delete Content-Length header so finalize() recalcs it.
-                    del response.headers["Content-Length"]
-            return response
+                return True
+            return None
     return httperror(
         response.request, response, 406, description="identity, gzip"
     )
 
 
+def _gzip_body(body, level):
+    if isinstance(body, (binary_type, text_type)):
+        body = [body]
+    return b"".join(compress(body, level))
+
+
+def _cache_key(response, cache):
+    """Return the key of the response's compressed body in cache
+
+    Only complete (200 OK) responses with an ETag whose size is known and
+    fits into the cache are cached. An ETag only identifies a version of
+    one resource so the key includes the request's Host, path and query
+    string, too.
+    """
+
+    if cache is None or response.status != 200:
+        return None
+
+    etag = response.headers.get("ETag")
+    size = response.headers.get("Content-Length")
+    if etag is None or size is None or int(size) > cache.size:
+        return None
+
+    request = response.request
+    return (
+        request.headers.get("Host"), request.path, request.qs, etag, "gzip"
+    )
+
+
+def _set_gzipped(response, body):
+    if response.file is not None:
+        response.file.close()
+    response.body = body
+    response.stream = False
+
+
+class CompressionCache(object):
+
+    """Cache of compressed response bodies
+
+    Keeps up to ``size`` bytes of compressed bodies keyed by the URL and
+    ETag of the response and the content coding, evicting the least
+    recently used ones first.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+        self.used = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        body = self._entries.pop(key, None)
+        if body is not None:
+            # Most recently used last
+            self._entries[key] = body
+        return body
+
+    def add(self, key, body):
+        if len(body) > self.size:
+            return
+
+        self.remove(key)
+        self._entries[key] = body
+        self.used += len(body)
+
+        while self.used > self.size:
+            key, evicted = self._entries.popitem(last=False)
+            self.used -= len(evicted)
+
+    def remove(self, key):
+        body = self._entries.pop(key, None)
+        if body is not None:
+            self.used -= len(body)
+
+    def clear(self):
+        self._entries.clear()
+        self.used = 0
+
+
+def gzip(response, level=4, mime_types=("text/html", "text/plain",),
+         cache=None):
+    """Try to gzip the response body if Content-Type in mime_types.
+
+    response.headers['Content-Type'] must be set to one of the
+    values in the mime_types arg before calling this function.
+
+    No compression is performed if any of the following hold:
+        * The client sends no Accept-Encoding request header
+        * No 'gzip' or 'x-gzip' is present in the Accept-Encoding header
+        * No 'gzip' or 'x-gzip' with a qvalue > 0 is present
+        * The 'identity' value is given with a qvalue > 0.
+        * The response has a Content-Encoding already.
+
+    If a :class:`CompressionCache` is given the compressed bodies of
+    responses with an ETag are cached and reused.
+    """
+
+    result = _gzip_negotiate(response, mime_types)
+    if result is None:
+        return response
+    elif result is not True:
+        return result
+
+    key = _cache_key(response, cache)
+
+    vary(response, "Accept-Encoding")
+    response.headers['Content-Encoding'] = 'gzip'
+
+    if key is not None:
+        body = cache.get(key)
+        if body is None:
+            body = _gzip_body(response.body, level)
+            cache.add(key, body)
+        _set_gzipped(response, body)
+    else:
+        # Return a generator that compresses the page
+        response.body = compress(response.body, level)
+
+    if "Content-Length" in response.headers:
+        # Delete Content-Length header so finalize() recalcs it.
+        del response.headers["Content-Length"]
+
+    return response
+
+
+_ids = count(1)
+
+
+class Gzip(BaseComponent):
+
+    """Web Component gzipping responses (see: :func:`gzip`)
+
+    Optionally (if ``cache_size`` is given) the compressed bodies of
+    responses with an ETag (eg: static files) are cached in memory. Bodies
+    larger than ``threshold`` bytes are compressed by a thread pool
+    :class:`~circuits.core.workers.Worker` so they don't block the event
+    loop.
+
+    :param level: the gzip compression level.
+    :type  level: ``int``
+
+    :param mime_types: the Content-Types to compress.
+    :type  mime_types: ``tuple``
+
+    :param cache_size: size of the cache in bytes (``None`` to disable it).
+    :type  cache_size: ``int``
+
+    :param threshold: size of the bodies compressed by the worker
+                      (``None`` to compress all of them in the event loop).
+    :type  threshold: ``int``
+    """
+
+    channel = "web"
+
+    def init(self, level=4, mime_types=("text/html", "text/plain",),
+             cache_size=None, threshold=None, channel=channel):
+        self.level = level
+        self.mime_types = mime_types
+        self.threshold = threshold
+
+        self.cache = CompressionCache(cache_size) if cache_size else None
+
+        self.worker = None
+        if threshold is not None:
+            self.worker = Worker(
+                channel="gzip.{0:d}".format(next(_ids))
+            ).register(self)
+
+    @handler("response", priority=1.0)
+    def _on_response(self, event, response):
+        if response.status == 406:
+            # Our own error (see below), send it as is
+            return
+
+        result = _gzip_negotiate(response, self.mime_types)
+        if result is None:
+            return
+        elif result is not True:
+            event.stop()
+            self.fire(result, *event.channels)
+            return
+
+        size = None
+        body = response.body
+        if "Content-Length" in response.headers:
+            size = int(response.headers["Content-Length"])
+        elif isinstance(body, (binary_type, text_type)):
+            size = len(body)
+        elif isinstance(body, list):
+            size = sum(len(chunk) for chunk in body)
+
+        key = _cache_key(response, self.cache)
+        if self.worker is None or size is None or size <= self.threshold or \
+                (key is not None and self.cache.get(key) is not None):
+            gzip(response, self.level, self.mime_types, self.cache)
+            return
+
+        event.stop()
+        return self._compress(event, response, key)
+
+    def _compress(self, event, response, key):
+        value = yield self.call(
+            task(_gzip_body, response.body, self.level), self.worker.channel
+        )
+
+        if value.errors:
+            etype, evalue, traceback = value.value
+            self.fire(httperror(
+                response.request, response,
+                error=(etype, evalue, traceback)
+            ), *event.channels)
+            return
+
+        if key is not None:
+            self.cache.add(key, value.value)
+
+        vary(response, "Accept-Encoding")
+        response.headers['Content-Encoding'] = 'gzip'
+        _set_gzipped(response, value.value)
+        if "Content-Length" in response.headers:
+            del response.headers["Content-Length"]
+
+        self.fire(response_event(response), *event.channels)
+
+
 class ReverseProxy(BaseComponent):
 
     headers = ('X-Real-IP', 'X-Forwarded-For')
@@ -133,7 +133,7 @@ def compress(body, compress_level):
         yield zobj.compress(chunk)
 
     yield zobj.flush() \
-        + struct.pack("<l", crc) \
+        + struct.pack("<L", crc & 0xFFFFFFFF) \
         + struct.pack("<L", size & 0xFFFFFFFF)
 
 
@@ -4,6 +4,7 @@ This module implements the Request and Response objects.
 """
 from functools import partial
 from io import BytesIO
+from socket import error as SocketError
 from time import time
 
 from circuits.net.sockets import BUFSIZE
@@ -32,6 +33,26 @@ except NameError:
     unicode = str
 
 
+# Last (second, Date header value) and the status lines sent so far
+_date = (None, None)
+_status_lines = {}
+
+
+def http_date():
+    """Return the current time formatted for the Date header
+
+    The value only changes once per second, so it is formatted only once
+    per second, too.
+    """
+
+    global _date
+
+    now = int(time())
+    if _date[0] != now:
+        _date = (now, formatdate(now))
+    return _date[1]
+
+
 def file_generator(input, chunkSize=BUFSIZE):
     chunk = input.read(chunkSize)
     while chunk:
@@ -123,6 +144,10 @@ class Request(object):
 
     """Creates a new Request object to hold information about a request.
 
+    The attributes derived from the request line, the headers and the
+    socket (``cookie``, ``host``, ``port``, ``local``, ``remote``, ``base``
+    and ``uri``) are only computed when they are first accessed.
+
     :param sock: The socket object of the request.
     :type  sock: socket.socket
 
@@ -142,20 +167,23 @@ class Request(object):
     :type  qs: str
     """
 
-    server = None
-    """:cvar: A reference to the underlying server"""
+    # Attributes not listed here (eg: ``session``) are kept in __dict__
+    __slots__ = (
+        "sock", "method", "scheme", "path", "protocol", "qs", "headers",
+        "server", "print_debug", "index", "handled",
+        "_body", "_cookie", "_host", "_port", "_local", "_remote", "_base",
+        "_uri", "__dict__",
+    )
 
-    scheme = "http"
-    protocol = (1, 1)
-    host = ""
-    local = Host("127.0.0.1", 80)
-    remote = Host("", 0)
-
-    index = None
     script_name = ""
 
     login = None
-    handled = False
+
+    max_body_size = None
+    """:cvar: Maximum size of the request body (``None`` for no limit)"""
+
+    stream_body = False
+    """:cvar: Whether the body is passed on in ``request_body`` events"""
 
     def __init__(self, sock, method="GET", scheme="http", path="/",
                  protocol=(1, 1), qs="", headers=None, server=None):
@@ -163,7 +191,7 @@ class Request(object):
 
         self.sock = sock
         self.method = method
-        self.scheme = scheme or Request.scheme
+        self.scheme = scheme or "http"
         self.path = path
         self.protocol = protocol
         self.qs = qs
@@ -172,26 +200,79 @@ class Request(object):
         self.headers = headers or Headers()
         self.server = server
 
-        self.cookie = SimpleCookie()
+        self.index = None
+        self.handled = False
 
-        if sock is not None:
-            name = sock.getpeername()
-            try:
-                ip, port = name
-                name = None
-            except ValueError:  # AF_UNIX
-                ip, port = None, None
-            self.remote = Host(ip, port, name)
+        self._body = None
+        self._cookie = None
+        self._host = None
+        self._port = None
+        self._local = None
+        self._remote = None
+        self._base = None
+        self._uri = None
+
+    def __repr__(self):
+        protocol = "HTTP/%d.%d" % self.protocol
+        return "<Request %s %s %s>" % (self.method, self.path, protocol)
 
-        cookie = self.headers.get("Cookie")
-        if cookie is not None:
-            self.cookie.load(cookie)
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = BytesIO()
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
+    @property
+    def cookie(self):
+        if self._cookie is None:
+            self._cookie = SimpleCookie()
+            cookie = self.headers.get("Cookie")
+            if cookie is not None:
+                self._cookie.load(cookie)
+        return self._cookie
+
+    @cookie.setter
+    def cookie(self, value):
+        self._cookie = value
 
-        self.body = BytesIO()
+    @property
+    def local(self):
+        if self._local is None:
+            if self.server is not None:
+                self._local = Host(self.server.host, self.server.port)
+            else:
+                self._local = Host("127.0.0.1", 80)
+        return self._local
 
-        if self.server is not None:
-            self.local = Host(self.server.host, self.server.port)
+    @local.setter
+    def local(self, value):
+        self._local = value
 
+    @property
+    def remote(self):
+        if self._remote is None:
+            try:
+                name = self.sock.getpeername()
+            except (AttributeError, SocketError):  # No or a closed socket
+                self._remote = Host("", 0)
+            else:
+                try:
+                    ip, port = name
+                    name = None
+                except ValueError:  # AF_UNIX
+                    ip, port = None, None
+                self._remote = Host(ip, port, name)
+        return self._remote
+
+    @remote.setter
+    def remote(self, value):
+        self._remote = value
+
+    def _resolve_host(self):
         try:
             host = self.headers["Host"]
             if ":" in host:
@@ -204,10 +285,31 @@ class Request(object):
             host = self.local.name or self.local.ip
             port = getattr(self.server, "port")
 
-        self.host = host
-        self.port = port
+        self._host = host
+        self._port = port
 
-        base = "{0:s}://{1:s}{2:s}/".format(
+    @property
+    def host(self):
+        if self._host is None:
+            self._resolve_host()
+        return self._host
+
+    @host.setter
+    def host(self, value):
+        self._host = value
+
+    @property
+    def port(self):
+        if self._port is None:
+            self._resolve_host()
+        return self._port
+
+    @port.setter
+    def port(self, value):
+        self._port = value
+
+    def _base_url(self):
+        return "{0:s}://{1:s}{2:s}/".format(
             self.scheme,
             self.host,
             ":{0:d}".format(self.port)
@@ -215,19 +317,31 @@ class Request(object):
             else ""
         )
 
-        self.base = parse_url(base)
+    @property
+    def base(self):
+        if self._base is None:
+            self._base = parse_url(self._base_url())
+        return self._base
 
-        url = "{0:s}{1:s}{2:s}".format(
-            base,
-            self.path,
-            "?{0:s}".format(self.qs) if self.qs else ""
-        )
-        self.uri = parse_url(url)
-        self.uri.sanitize()
+    @base.setter
+    def base(self, value):
+        self._base = value
 
-    def __repr__(self):
-        protocol = "HTTP/%d.%d" % self.protocol
-        return "<Request %s %s %s>" % (self.method, self.path, protocol)
+    @property
+    def uri(self):
+        if self._uri is None:
+            url = "{0:s}{1:s}{2:s}".format(
+                self._base_url(),
+                self.path,
+                "?{0:s}".format(self.qs) if self.qs else ""
+            )
+            self._uri = parse_url(url)
+            self._uri.sanitize()
+        return self._uri
+
+    @uri.setter
+    def uri(self, value):
+        self._uri = value
 
 
 class Body(object):
@@ -244,6 +358,8 @@ class Body(object):
         if response == value:
             return
 
+        response.file = None
+
         if isinstance(value, binary_type):
             if value:
                 value = [value]
@@ -251,6 +367,7 @@ class Body(object):
                 value = []
         elif hasattr(value, "read"):
             response.stream = True
+            response.file = value
             value = file_generator(value)
         elif isinstance(value, httperror):
             value = [str(value)]
@@ -285,27 +402,34 @@ class Response(object):
     is sent in the correct order.
     """
 
+    # Attributes not listed here (eg: ``gzip``) are kept in __dict__
+    __slots__ = (
+        "request", "encoding", "headers", "protocol", "time", "done",
+        "file", "close", "stream", "chunked", "_body", "_status", "__dict__",
+    )
+
     body = Body()
     status = Status()
 
-    done = False
-    close = False
-    stream = False
-    chunked = False
-
     def __init__(self, request, encoding='utf-8', status=None):
         "initializes x; see x.__class__.__doc__ for signature"
 
         self.request = request
         self.encoding = encoding
 
+        self.done = False
+        self.file = None
+        self.close = False
+        self.stream = False
+        self.chunked = False
+
         self._body = []
         self._status = HTTPStatus(status if status is not None else 200)
 
         self.time = time()
 
         self.headers = Headers()
-        self.headers["Date"] = formatdate()
+        self.headers["Date"] = http_date()
 
         if getattr(self.request.server, "display_banner", False):
             if self.request.server is not None:
@@ -313,8 +437,6 @@ class Response(object):
             else:
                 self.headers.add_header("X-Powered-By", SERVER_VERSION)
 
-        self.cookie = self.request.cookie
-
         self.protocol = "HTTP/%d.%d" % self.request.protocol
 
     def __repr__(self):
@@ -326,13 +448,38 @@ class Response(object):
 
     def __str__(self):
         self.prepare()
+        return self._status_line()
+
+    @property
+    def cookie(self):
+        """The cookies of the request, sent back with the response"""
+
+        return self.request.cookie
+
+    @cookie.setter
+    def cookie(self, value):
+        self.request.cookie = value
+
+    def __bytes__(self):
+        self.prepare()
+
+        status = self.status
+        if status.reason != HTTP_STATUS_CODES.get(status.status):
+            # Don't cache custom reason phrases
+            return self._status_line().encode(self.encoding)
+
+        key = (self.protocol, status.status, self.encoding)
+        line = _status_lines.get(key)
+        if line is None:
+            line = self._status_line().encode(self.encoding)
+            _status_lines[key] = line
+        return line
+
+    def _status_line(self):
         protocol = self.protocol
         status = "{0:s}".format(self.status)
         return "{0:s} {1:s}\r\n".format(protocol, status)
 
-    def __bytes__(self):
-        return str(self).encode(self.encoding)
-
     def prepare(self):
         # Set a default content-Type if we don't have one.
         self.headers.setdefault(
@@ -358,8 +505,11 @@ class Response(object):
         if cLength is not None:
             self.headers["Content-Length"] = str(cLength)
 
-        for k, v in self.cookie.items():
-            self.headers.add_header("Set-Cookie", v.OutputString())
+        # Don't create the request's cookies just to find there are none
+        request = self.request
+        if request._cookie is not None or "Cookie" in request.headers:
+            for k, v in self.cookie.items():
+                self.headers.add_header("Set-Cookie", v.OutputString())
 
         status = self.status
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+from errno import ESRCH
+from os import getpid, kill
+from signal import SIGKILL
+from socket import AF_INET, SOCK_STREAM, create_connection, socket
+from time import sleep
+
+import pytest
+
+from circuits import Component, Manager
+from circuits.app import Supervisor
+from circuits.net.sockets import SCM_RIGHTS, HandoffServer, TCPServer
+
+pytestmark = pytest.mark.skipif(pytest.PLATFORM == 'win32', reason='Unsupported Platform')
+
+
+class Echo(Component):
+
+    channel = "server"
+
+    def read(self, sock, data):
+        return str(getpid()).encode("ascii")
+
+
+def is_running(pid):
+    try:
+        kill(pid, 0)
+    except OSError as error:
+        if error.errno == ESRCH:
+            return False
+    return True
+
+
+def request(host, port):
+    sock = create_connection((host, port))
+    try:
+        sock.send(b"ping")
+        return int(sock.recv(64))
+    finally:
+        sock.close()
+
+
+def test_shared_socket(manager, watcher):
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    host, port = sock.getsockname()
+
+    def factory():
+        return Manager() + TCPServer(sock) + Echo()
+
+    supervisor = Supervisor(factory, workers=2, interval=0.1)
+    supervisor.register(manager)
+
+    try:
+        assert watcher.wait("spawned", "supervisor")
+        assert pytest.wait_for(
+            supervisor, "pids", lambda obj, attr: len(obj.pids) == 2
+        )
+
+        pids = supervisor.pids
+        for _ in range(4):
+            assert request(host, port) in pids
+
+        # Dead workers are respawned
+        kill(pids[0], SIGKILL)
+        assert watcher.wait("reaped", "supervisor")
+        assert pytest.wait_for(
+            supervisor, "pids",
+            lambda obj, attr: len(obj.pids) == 2 and pids[0] not in obj.pids
+        )
+        assert request(host, port) in supervisor.pids
+
+        # Graceful shutdown terminates all workers
+        pids = supervisor.pids
+        supervisor.terminate()
+        assert pytest.wait_for(
+            supervisor, "pids", lambda obj, attr: not obj.pids
+        )
+        assert not any(is_running(pid) for pid in pids)
+    finally:
+        supervisor.unregister()
+        sock.close()
+
+
+def test_reuse_port(manager, watcher):
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    host, port = sock.getsockname()
+    sock.close()
+
+    def factory():
+        server = TCPServer((host, port), reuse_port=True)
+        return Manager() + server + Echo()
+
+    supervisor = Supervisor(factory, workers=2, interval=0.1)
+    supervisor.register(manager)
+
+    try:
+        assert pytest.wait_for(
+            supervisor, "pids", lambda obj, attr: len(obj.pids) == 2
+        )
+
+        for _ in range(20):
+            try:
+                assert request(host, port) in supervisor.pids
+                break
+            except IOError:
+                # Workers might not have bound their sockets yet
+                sleep(0.2)
+        else:
+            assert False, "no worker is listening"
+    finally:
+        supervisor.terminate()
+        pytest.wait_for(supervisor, "pids", lambda obj, attr: not obj.pids)
+        supervisor.unregister()
+
+
+@pytest.mark.skipif(SCM_RIGHTS is None or pytest.PYVER < (3, 3), reason="No SCM_RIGHTS")
+def test_handoff(manager, watcher):
+    server = TCPServer(("127.0.0.1", 0)).register(manager)
+
+    def factory(sock):
+        return Manager() + HandoffServer(sock) + Echo()
+
+    supervisor = Supervisor(factory, workers=2, interval=0.1, server=server)
+    supervisor.register(manager)
+
+    try:
+        assert pytest.wait_for(
+            supervisor, "pids", lambda obj, attr: len(obj.pids) == 2
+        )
+        assert pytest.wait_for(
+            server, "handoffs", lambda obj, attr: len(obj.handoffs) == 2
+        )
+
+        pids = set(request(server.host, server.port) for _ in range(4))
+        assert pids <= set(supervisor.pids)
+
+        kill(supervisor.pids[0], SIGKILL)
+        assert watcher.wait("reaped", "supervisor")
+        assert pytest.wait_for(
+            supervisor, "pids", lambda obj, attr: len(obj.pids) == 2
+        )
+        assert len(server.handoffs) == 2
+        assert request(server.host, server.port) in supervisor.pids
+    finally:
+        supervisor.terminate()
+        pytest.wait_for(supervisor, "pids", lambda obj, attr: not obj.pids)
+        supervisor.unregister()
+        server.unregister()
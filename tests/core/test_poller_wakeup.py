@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import os
+import select
+from socket import socket
+from threading import Event as ThreadEvent, Thread
+
+import pytest
+
+from circuits import Component, Event, Manager
+from circuits.core.pollers import EPoll, Poll, Select
+
+
+class ping(Event):
+    """ping Event"""
+
+
+class App(Component):
+
+    def init(self):
+        self.count = 0
+        self.pinged = ThreadEvent()
+
+    def ping(self):
+        self.count += 1
+        self.pinged.set()
+
+
+def pytest_generate_tests(metafunc):
+    metafunc.addcall(funcargs={"Poller": Select})
+
+    if hasattr(select, "poll"):
+        metafunc.addcall(funcargs={"Poller": Poll})
+
+    if hasattr(select, "epoll"):
+        metafunc.addcall(funcargs={"Poller": EPoll})
+
+
+def pending_wakeups(poller):
+    try:
+        if isinstance(poller._ctrl_recv, socket):
+            return len(poller._ctrl_recv.recv(4096))
+        elif poller._ctrl_recv == poller._ctrl_send:
+            return os.eventfd_read(poller._ctrl_recv)
+        else:
+            return len(os.read(poller._ctrl_recv, 4096))
+    except (IOError, OSError):
+        return 0
+
+
+def test_coalesced_resume(Poller):
+    poller = Poller()
+
+    for _ in range(1000):
+        poller.resume()
+
+    # Only one wakeup is written while it is pending
+    assert pending_wakeups(poller) == 1
+
+    poller._read_ctrl()
+    for _ in range(3):
+        poller.resume()
+        poller._read_ctrl()
+
+    # The control channel is drained completely
+    assert pending_wakeups(poller) == 0
+
+
+def test_foreign_thread_events(Poller):
+    m = Manager() + Poller()
+    app = App().register(m)
+    m.start()
+
+    def fire():
+        for _ in range(1000):
+            app.fire(ping())
+
+    try:
+        threads = [Thread(target=fire) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert pytest.wait_for(app, "count", 4000)
+    finally:
+        m.stop()
+
+
+def test_foreign_thread_wakeups(Poller):
+    m = Manager() + Poller()
+    app = App().register(m)
+    m.start()
+
+    def fire():
+        # The manager is idle (blocking in the poller) before every event
+        for _ in range(200):
+            app.pinged.clear()
+            app.fire(ping())
+            if not app.pinged.wait(5):
+                break
+
+    try:
+        thread = Thread(target=fire)
+        thread.start()
+        thread.join()
+
+        assert app.count == 200
+    finally:
+        m.stop()
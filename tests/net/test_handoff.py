@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+import select
+from errno import EAGAIN, EWOULDBLOCK
+from socket import (
+    AF_UNIX, SOCK_STREAM, create_connection, error as SocketError,
+    socketpair,
+)
+
+import pytest
+
+from circuits import Component, Manager
+from circuits.core.pollers import EPoll, Poll, Select
+from circuits.net.sockets import SCM_RIGHTS, HandoffServer, TCPServer
+
+pytestmark = pytest.mark.skipif(
+    pytest.PLATFORM == 'win32' or SCM_RIGHTS is None or pytest.PYVER < (3, 3),
+    reason='Unsupported Platform'
+)
+
+
+class Echo(Component):
+
+    def init(self, name, channel=None):
+        self.prefix = name
+
+    def read(self, sock, data):
+        return self.prefix + data
+
+
+def pytest_generate_tests(metafunc):
+    metafunc.addcall(funcargs={"Poller": Select})
+
+    if hasattr(select, "poll"):
+        metafunc.addcall(funcargs={"Poller": Poll})
+
+    if hasattr(select, "epoll"):
+        metafunc.addcall(funcargs={"Poller": EPoll})
+
+
+def test_handoff(Poller):
+    m = Manager() + Poller()
+
+    server = TCPServer(("127.0.0.1", 0)).register(m)
+
+    workers = []
+    for name in ("a", "b"):
+        sock, worker_sock = socketpair(AF_UNIX, SOCK_STREAM)
+        worker = HandoffServer(worker_sock, channel=name).register(m)
+        Echo(name.encode("ascii"), channel=name).register(m)
+        server.add_handoff(sock)
+        workers.append((sock, worker))
+
+    m.start()
+
+    clients = []
+
+    try:
+        assert pytest.wait_for(server, "port", lambda obj, attr: obj.port)
+
+        # Connections are balanced by least active connections
+        names = set()
+        for _ in range(2):
+            client = create_connection((server.host, server.port))
+            clients.append(client)
+            client.send(b"foo")
+            data = client.recv(64)
+            assert data[1:] == b"foo"
+            names.add(data[:1])
+        assert names == set([b"a", b"b"])
+
+        assert server.connections == []
+        assert sorted(server.handoffs.values()) == [1, 1]
+        assert len(workers[0][1].connections) == 1
+        assert len(workers[1][1].connections) == 1
+
+        # Closed connections are reported back to the handing off server
+        for client in clients:
+            client.close()
+        assert pytest.wait_for(
+            server, "handoffs",
+            lambda obj, attr: sorted(obj.handoffs.values()) == [0, 0]
+        )
+
+        # A closed hand-off socket is removed
+        workers[0][1].close()
+        assert pytest.wait_for(
+            server, "handoffs", lambda obj, attr: len(obj.handoffs) == 1
+        )
+
+        client = create_connection((server.host, server.port))
+        clients.append(client)
+        client.send(b"foo")
+        assert client.recv(64) == b"bfoo"
+    finally:
+        for client in clients:
+            client.close()
+        m.stop()
+
+
+def test_handoff_busy(Poller):
+    m = Manager() + Poller()
+
+    server = TCPServer(("127.0.0.1", 0)).register(m)
+
+    # A stuck worker that never reads, its buffer is full
+    stuck, stuck_peer = socketpair(AF_UNIX, SOCK_STREAM)
+    server.add_handoff(stuck)
+    try:
+        while True:
+            stuck.send(b"\0" * 4096)
+    except SocketError as e:
+        assert e.args[0] in (EAGAIN, EWOULDBLOCK)
+
+    sock, worker_sock = socketpair(AF_UNIX, SOCK_STREAM)
+    HandoffServer(worker_sock, channel="b").register(m)
+    Echo(b"b", channel="b").register(m)
+    server.add_handoff(sock)
+
+    m.start()
+
+    clients = []
+
+    try:
+        assert pytest.wait_for(server, "port", lambda obj, attr: obj.port)
+
+        # Connections go to the next worker instead of blocking the server
+        for _ in range(3):
+            client = create_connection((server.host, server.port))
+            clients.append(client)
+            client.send(b"foo")
+            assert client.recv(64) == b"bfoo"
+
+        assert server.handoffs == {stuck: 0, sock: 3}
+    finally:
+        for client in clients:
+            client.close()
+        m.stop()
+        stuck_peer.close()
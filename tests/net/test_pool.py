@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+import pytest
+
+from circuits import Component, Event
+from circuits.net.events import close, write
+from circuits.net.pool import ConnectionPool, acquire, release
+from circuits.net.sockets import TCPServer
+
+
+class Echo(Component):
+
+    channel = "server"
+
+    def init(self):
+        self.connects = 0
+
+    def connect(self, sock, *args):
+        self.connects += 1
+
+    def read(self, sock, data):
+        return data
+
+
+class Reader(Component):
+
+    def init(self, channel=None):
+        self.data = b""
+
+    def read(self, data):
+        self.data += data
+
+
+class request(Event):
+    """request Event"""
+
+    success = True
+
+
+class App(Component):
+
+    channel = "app"
+
+    def request(self, host, port, data):
+        lease = yield self.call(acquire(host, port), "pool")
+        client = lease.value
+
+        self.fire(write(data), client.channel)
+        yield self.wait("read", client.channel)
+
+        self.fire(release(client), "pool")
+        yield client
+
+
+def leased(value):
+    assert pytest.wait_for(value, "result")
+    assert not value.errors
+    return value.value
+
+
+@pytest.fixture
+def server(request, manager, watcher):
+    server = Echo()
+    server.tcp = TCPServer(("127.0.0.1", 0)).register(server)
+    server.register(manager)
+    assert watcher.wait("ready", "server")
+
+    def finalizer():
+        server.unregister()
+
+    request.addfinalizer(finalizer)
+
+    return server
+
+
+@pytest.fixture
+def pool(request, manager, watcher):
+    pool = ConnectionPool(max_per_host=1, check_interval=0.1).register(manager)
+
+    def finalizer():
+        pool.fire(close())
+        pool.unregister()
+
+    request.addfinalizer(finalizer)
+
+    return pool
+
+
+def test_reuse(manager, watcher, server, pool):
+    host, port = server.tcp.host, server.tcp.port
+
+    client = leased(pool.fire(acquire(host, port)))
+    assert client.connected
+    assert pool.hosts[(host, port, False)] == (0, 1, 0, 0)
+
+    reader = Reader(channel=client.channel).register(client)
+    client.fire(write(b"foo"))
+    assert pytest.wait_for(reader, "data", b"foo")
+
+    pool.fire(release(client))
+    assert pytest.wait_for(
+        pool, "hosts", lambda obj, attr: obj.hosts[(host, port, False)][0]
+    )
+
+    assert leased(pool.fire(acquire(host, port))) is client
+    assert server.connects == 1
+
+
+def test_waiters(manager, watcher, server, pool):
+    host, port = server.tcp.host, server.tcp.port
+
+    values = [pool.fire(acquire(host, port)) for _ in range(3)]
+
+    first = leased(values[0])
+    assert pytest.wait_for(
+        pool, "hosts",
+        lambda obj, attr: obj.hosts[(host, port, False)][3] == 2
+    )
+    assert not values[1].result and not values[2].result
+
+    # Waiters are served in order, within the per host limit
+    pool.fire(release(first))
+    assert leased(values[1]) is first
+    assert not values[2].result
+
+    pool.fire(release(first))
+    assert leased(values[2]) is first
+    assert server.connects == 1
+
+
+def test_timeout(manager, watcher, server, pool):
+    host, port = server.tcp.host, server.tcp.port
+
+    leased(pool.fire(acquire(host, port)))
+
+    value = pool.fire(acquire(host, port, timeout=0.2))
+    assert pytest.wait_for(value, "errors")
+
+
+def test_unreachable(manager, watcher, server, pool):
+    host, port = server.tcp.host, server.tcp.port
+
+    server.fire(close())
+    assert watcher.wait("closed", "server")
+
+    value = pool.fire(acquire(host, port))
+    assert pytest.wait_for(value, "errors")
+    assert pool.hosts[(host, port, False)] == (0, 0, 0, 0)
+
+
+def test_closed_idle_connection(manager, watcher, server, pool):
+    host, port = server.tcp.host, server.tcp.port
+
+    client = leased(pool.fire(acquire(host, port)))
+    pool.fire(release(client))
+    assert pytest.wait_for(
+        pool, "hosts", lambda obj, attr: obj.hosts[(host, port, False)][0]
+    )
+
+    # The server closes the idle connection
+    server.fire(close(server.tcp.connections[0].sock))
+    assert pytest.wait_for(
+        pool, "hosts",
+        lambda obj, attr: obj.hosts[(host, port, False)] == (0, 0, 0, 0)
+    )
+
+    assert leased(pool.fire(acquire(host, port))) is not client
+    assert server.connects == 2
+
+
+def test_call(manager, watcher, server, pool):
+    host, port = server.tcp.host, server.tcp.port
+
+    app = App().register(manager)
+    try:
+        first = leased(app.fire(request(host, port, b"foo")))
+        second = leased(app.fire(request(host, port, b"bar")))
+        assert first is second
+        assert server.connects == 1
+    finally:
+        app.unregister()
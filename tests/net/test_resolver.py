@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+from socket import AF_INET, AF_INET6, SOCK_STREAM, gaierror
+from threading import Event, current_thread
+
+from circuits.net.utils import Resolver, interleave_families, is_ip_address
+
+
+class Results(object):
+
+    def __init__(self):
+        self.results = []
+        self.threads = []
+        self.done = Event()
+
+    def __call__(self, addresses, err):
+        self.results.append((addresses, err))
+        self.threads.append(current_thread())
+        self.done.set()
+
+
+def test_is_ip_address():
+    assert is_ip_address("127.0.0.1", AF_INET)
+    assert not is_ip_address("localhost", AF_INET)
+    assert not is_ip_address("::1", AF_INET)
+
+
+def test_resolve():
+    resolver = Resolver(ttl=60)
+
+    results = Results()
+    resolver.resolve(results, "127.0.0.1", 80, AF_INET, SOCK_STREAM)
+    assert results.done.wait(5)
+
+    addresses, err = results.results[0]
+    assert err is None
+    assert addresses[0][4] == ("127.0.0.1", 80)
+
+    # Cached results are returned immediately
+    results = Results()
+    resolver.resolve(results, "127.0.0.1", 80, AF_INET, SOCK_STREAM)
+    assert results.done.is_set()
+    assert results.results[0] == (addresses, None)
+
+
+def test_resolve_failure():
+    resolver = Resolver(negative_ttl=0)
+
+    results = Results()
+    resolver.resolve(results, "foo.bar.baz", 80, AF_INET, SOCK_STREAM)
+    assert results.done.wait(10)
+
+    addresses, err = results.results[0]
+    assert addresses is None
+    assert isinstance(err, gaierror)
+
+    # Failures are not cached for longer than negative_ttl
+    results = Results()
+    resolver.resolve(results, "foo.bar.baz", 80, AF_INET, SOCK_STREAM)
+    assert not results.done.is_set()
+    assert results.done.wait(10)
+
+
+def test_cache_size():
+    resolver = Resolver(ttl=60, cache_size=2)
+
+    def resolve(port):
+        results = Results()
+        resolver.resolve(results, "127.0.0.1", port, AF_INET, SOCK_STREAM)
+        return results
+
+    for port in (1, 2, 1, 3):
+        assert resolve(port).done.wait(5)
+
+    # The least recently used result (port 2) was evicted
+    assert len(resolver) == 2
+    assert resolve(1).threads == [current_thread()]
+    assert resolve(3).threads == [current_thread()]
+
+    results = resolve(2)
+    assert results.done.wait(5)
+    assert results.threads != [current_thread()]
+    assert len(resolver) == 2
+
+
+def test_interleave_families():
+    def address(family, host):
+        return (family, SOCK_STREAM, 6, "", (host, 80))
+
+    a, b = address(AF_INET6, "::1"), address(AF_INET6, "::2")
+    c, d = address(AF_INET, "127.0.0.1"), address(AF_INET, "127.0.0.2")
+
+    assert interleave_families([a, b, c, d]) == [a, c, b, d]
+    assert interleave_families([c, a, b, d]) == [c, a, d, b]
+    assert interleave_families([a, b, c]) == [a, c, b]
+    assert interleave_families([c, d]) == [c, d]
+    assert interleave_families([]) == []
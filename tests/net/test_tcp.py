@@ -3,16 +3,18 @@ import os.path
 import select
 from socket import (
     AF_INET, AF_INET6, EAI_NODATA, EAI_NONAME, SOCK_STREAM,
-    error as SocketError, has_ipv6, socket,
+    error as SocketError, gaierror, getaddrinfo, has_ipv6, socket,
 )
-from ssl import wrap_socket as sslsocket
+from ssl import PROTOCOL_SSLv23, SSLContext, wrap_socket as sslsocket
+from tempfile import TemporaryFile
+from time import sleep, time
 
 import pytest
 from tests.conftest import WaitEvent
 
 from circuits import Debugger, Manager
 from circuits.core.pollers import EPoll, KQueue, Poll, Select
-from circuits.net.events import close, connect, write
+from circuits.net.events import close, connect, sendfile, write
 from circuits.net.sockets import TCP6Client, TCP6Server, TCPClient, TCPServer
 
 from .client import Client
@@ -171,6 +173,122 @@ def test_tcps_basic(manager, watcher, client, Poller, ipv6):
         server.unregister()
 
 
+def test_tcps_stalled_handshake(manager, watcher, client, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(
+            ("::1", 0), secure=True, certfile=CERT_FILE, handshake_timeout=1
+        )
+        stalled = socket(AF_INET6, SOCK_STREAM)
+    else:
+        tcp_server = TCPServer(
+            0, secure=True, certfile=CERT_FILE, handshake_timeout=1
+        )
+        stalled = socket(AF_INET, SOCK_STREAM)
+
+    server = Server() + tcp_server
+
+    server.register(manager)
+
+    try:
+        watcher.wait("ready", "server")
+
+        # Connects but never sends a ClientHello
+        stalled.connect((server.host, server.port))
+
+        client.connect(server.host, server.port)
+        assert watcher.wait("connect", "server")
+        assert client.recv() == b"Ready"
+
+        client.send(b"foo")
+        assert watcher.wait("read", "server")
+        assert client.recv() == b"foo"
+
+        # The stalled handshake is aborted after handshake_timeout
+        stalled.settimeout(5)
+        assert stalled.recv(64) == b""
+        assert watcher.wait("error", "server")
+    finally:
+        stalled.close()
+        poller.unregister()
+        server.unregister()
+
+
+def test_tcps_client(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), secure=True, certfile=CERT_FILE)
+        tcp_client = TCP6Client()
+    else:
+        tcp_server = TCPServer(0, secure=True, certfile=CERT_FILE)
+        tcp_client = TCPClient()
+
+    server = Server() + tcp_server
+    client = Client() + tcp_client
+
+    server.register(manager)
+    client.register(manager)
+
+    try:
+        assert watcher.wait("ready", "client")
+        assert watcher.wait("ready", "server")
+
+        client.fire(connect(server.host, server.port, secure=True))
+        assert watcher.wait("connected", "client")
+        assert watcher.wait("connect", "server")
+        assert watcher.wait("read", "client")
+        assert client.data == b"Ready"
+
+        client.fire(write(b"foo"))
+        assert watcher.wait("read", "server")
+        assert server.data == b"foo"
+    finally:
+        poller.unregister()
+        client.unregister()
+        server.unregister()
+
+
+def test_tcps_session_resumption(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    context = SSLContext(PROTOCOL_SSLv23)
+    context.load_cert_chain(CERT_FILE)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), secure=True, ssl_context=context)
+        tcp_client = TCP6Client()
+    else:
+        tcp_server = TCPServer(0, secure=True, ssl_context=context)
+        tcp_client = TCPClient()
+
+    server = Server() + tcp_server
+    client = Client() + tcp_client
+
+    server.register(manager)
+    client.register(manager)
+
+    try:
+        assert watcher.wait("ready", "client")
+        assert watcher.wait("ready", "server")
+
+        for resumed in (False, True):
+            watcher.clear()
+            client.fire(connect(server.host, server.port, secure=True))
+            assert watcher.wait("connected", "client")
+            assert watcher.wait("read", "client")
+            assert tcp_client._sock.session_reused is resumed
+
+            client.fire(close())
+            assert watcher.wait("disconnected", "client")
+            assert watcher.wait("disconnect", "server")
+    finally:
+        poller.unregister()
+        client.unregister()
+        server.unregister()
+
+
 def test_tcp_reconnect(Poller, ipv6):
     # XXX: Apparently this doesn't work on Windows either?
     # XXX: UPDATE: Apparently Broken on Windows + Python 3.2
@@ -262,8 +380,8 @@ def test_tcp_connect_closed_port(Poller, ipv6):
         tcp_server._sock.close()
 
         # 1st connect
-        client.fire(connect(host, port))
         waiter = WaitEvent(m, "unreachable", channel='client')
+        client.fire(connect(host, port))
         assert waiter.wait()
     finally:
         server.unregister()
@@ -345,3 +463,586 @@ def test_tcp_lookup_failure(manager, watcher, Poller, ipv6):
     finally:
         poller.unregister()
         client.unregister()
+
+
+def test_tcp_connections(Poller, ipv6):
+    m = Manager() + Poller()
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0))
+        tcp_client = TCP6Client()
+    else:
+        tcp_server = TCPServer(0)
+        tcp_client = TCPClient()
+    server = Server() + tcp_server
+    client = Client() + tcp_client
+
+    server.register(m)
+    client.register(m)
+
+    m.start()
+
+    try:
+        assert pytest.wait_for(client, "ready")
+        assert pytest.wait_for(server, "ready")
+        wait_host(server)
+
+        assert tcp_server.connections == []
+
+        client.fire(connect(server.host, server.port))
+        assert pytest.wait_for(client, "connected")
+        assert pytest.wait_for(server, "connected")
+        assert pytest.wait_for(client, "data", b"Ready")
+
+        client.fire(write(b"foo"))
+        assert pytest.wait_for(server, "data", b"foo")
+        assert pytest.wait_for(client, "data", b"foo")
+
+        conn, = tcp_server.connections
+        assert tcp_server.get_connection(conn.sock) is conn
+        assert conn.bytes_read == 3
+        assert conn.bytes_written == len(b"Ready") + 3
+        assert conn.buffered == 0
+        assert not conn.tls
+
+        client.fire(close())
+        assert pytest.wait_for(client, "disconnected")
+        assert pytest.wait_for(server, "disconnected")
+
+        assert tcp_server.connections == []
+        assert tcp_server.get_connection(conn.sock) is None
+
+        server.fire(close())
+        assert pytest.wait_for(server, "closed")
+    finally:
+        m.stop()
+
+
+def test_tcp_accept_batch(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), accept_budget=4)
+        family = AF_INET6
+    else:
+        tcp_server = TCPServer(0, accept_budget=4)
+        family = AF_INET
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    clients = []
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        for _ in range(10):
+            sock = socket(family, SOCK_STREAM)
+            sock.connect((server.host, server.port))
+            clients.append(sock)
+
+        assert pytest.wait_for(
+            tcp_server, "connections", lambda obj, attr: len(obj.connections) == 10
+        )
+    finally:
+        for sock in clients:
+            sock.close()
+        poller.unregister()
+        server.unregister()
+
+
+def test_tcp_defer_accept(manager, watcher, Poller, ipv6):
+    if not pytest.PLATFORM.startswith("linux"):
+        pytest.skip("TCP_DEFER_ACCEPT is only available on Linux")
+
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), defer_accept=5)
+        sock = socket(AF_INET6, SOCK_STREAM)
+    else:
+        tcp_server = TCPServer(0, defer_accept=5)
+        sock = socket(AF_INET, SOCK_STREAM)
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        sock.connect((server.host, server.port))
+        assert not watcher.wait("connect", "server", timeout=0.5)
+
+        sock.send(b"foo")
+        assert watcher.wait("connect", "server")
+        assert watcher.wait("read", "server")
+        assert server.data == b"foo"
+    finally:
+        sock.close()
+        poller.unregister()
+        server.unregister()
+
+
+class StalledResolver(object):
+
+    def resolve(self, callback, *args):
+        pass
+
+
+class StaticResolver(object):
+
+    def __init__(self, *addresses):
+        self.addresses = [
+            (family, SOCK_STREAM, 6, "", address)
+            for family, address in addresses
+        ]
+
+    def resolve(self, callback, *args):
+        callback(self.addresses, None)
+
+
+def black_hole(family, host):
+    """Listening socket with a full accept queue that drops new SYNs"""
+
+    sock = socket(family, SOCK_STREAM)
+    sock.bind((host, 0))
+    sock.listen(0)
+
+    fillers = []
+    for _ in range(3):
+        filler = socket(family, SOCK_STREAM)
+        filler.setblocking(False)
+        filler.connect_ex(sock.getsockname()[:2])
+        fillers.append(filler)
+
+    return [sock] + fillers
+
+
+def test_tcp_connect_timeout(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    TCPClientType = TCP6Client if ipv6 else TCPClient
+    tcp_client = TCPClientType(connect_timeout=0.5, resolver=StalledResolver())
+
+    client = Client() + tcp_client
+    client.register(manager)
+
+    try:
+        assert watcher.wait("ready", "client")
+
+        client.fire(connect("foo.bar.baz", 1234))
+        assert pytest.wait_for(tcp_client, "connecting")
+
+        # The event loop keeps running while the connection is pending
+        client.fire(write(b"foo"))
+        assert watcher.wait("write", "client")
+
+        assert watcher.wait("unreachable", "client")
+        assert not tcp_client.connecting
+        assert not tcp_client.connected
+    finally:
+        poller.unregister()
+        client.unregister()
+
+
+def test_tcp_connect_hostname(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0))
+        tcp_client = TCP6Client()
+        localhost = "ip6-localhost"
+    else:
+        tcp_server = TCPServer(("127.0.0.1", 0))
+        tcp_client = TCPClient()
+        localhost = "localhost"
+
+    try:
+        getaddrinfo(localhost, 0, tcp_client.socket_family)
+    except gaierror:
+        pytest.skip("Cannot resolve {0:s}".format(localhost))
+
+    server = Server() + tcp_server
+    client = Client() + tcp_client
+
+    server.register(manager)
+    client.register(manager)
+
+    try:
+        assert watcher.wait("ready", "client")
+        assert watcher.wait("ready", "server")
+
+        client.fire(connect(localhost, server.port))
+        assert watcher.wait("connected", "client")
+        assert watcher.wait("connect", "server")
+
+        client.fire(write(b"foo"))
+        assert watcher.wait("read", "server")
+        assert server.data == b"foo"
+    finally:
+        poller.unregister()
+        client.unregister()
+        server.unregister()
+
+
+def test_tcp_write_flow_control(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), write_high_water=65536)
+        sock = socket(AF_INET6, SOCK_STREAM)
+    else:
+        tcp_server = TCPServer(0, write_high_water=65536)
+        sock = socket(AF_INET, SOCK_STREAM)
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        sock.connect((server.host, server.port))
+        assert watcher.wait("connect", "server")
+
+        conn = tcp_server.connections[0]
+        for _ in range(16):
+            server.fire(write(conn.sock, b"x" * 1048576))
+
+        assert watcher.wait("pause_writing", "server")
+        assert conn.paused
+        assert conn.buffered > 65536
+
+        size, expected = 0, 5 + 16 * 1048576
+        while size < expected:
+            size += len(sock.recv(1048576))
+
+        assert watcher.wait("drain", "server")
+        assert not conn.paused
+        assert conn.buffered == 0
+    finally:
+        sock.close()
+        poller.unregister()
+        server.unregister()
+
+
+def test_tcp_write_overflow_close(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(
+            ("::1", 0), write_high_water=65536, write_overflow="close"
+        )
+        sock = socket(AF_INET6, SOCK_STREAM)
+    else:
+        tcp_server = TCPServer(
+            0, write_high_water=65536, write_overflow="close"
+        )
+        sock = socket(AF_INET, SOCK_STREAM)
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        sock.connect((server.host, server.port))
+        assert watcher.wait("connect", "server")
+
+        conn = tcp_server.connections[0]
+        for _ in range(16):
+            server.fire(write(conn.sock, b"x" * 1048576))
+
+        assert watcher.wait("disconnect", "server")
+        assert not tcp_server.connections
+    finally:
+        sock.close()
+        poller.unregister()
+        server.unregister()
+
+
+def test_tcp_idle_timeout(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), idle_timeout=0.5, max_lifetime=1.5)
+        idle, busy = socket(AF_INET6, SOCK_STREAM), socket(AF_INET6, SOCK_STREAM)
+    else:
+        tcp_server = TCPServer(0, idle_timeout=0.5, max_lifetime=1.5)
+        idle, busy = socket(AF_INET, SOCK_STREAM), socket(AF_INET, SOCK_STREAM)
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        for sock in (idle, busy):
+            sock.connect((server.host, server.port))
+            sock.settimeout(5)
+            assert sock.recv(5) == b"Ready"
+
+        # The idle connection is closed, the busy one is kept alive
+        # until it has reached its maximum lifetime.
+        while True:
+            try:
+                busy.send(b"foo")
+                data = busy.recv(3)
+            except SocketError:
+                break
+            if not data:
+                break
+            assert data == b"foo"
+            sleep(0.2)
+
+        assert idle.recv(64) == b""
+        assert tcp_server.metrics["idle_timeouts"] == 1
+        assert tcp_server.metrics["lifetime_expirations"] == 1
+        assert tcp_server.metrics["connections"] == 0
+    finally:
+        idle.close()
+        busy.close()
+        poller.unregister()
+        server.unregister()
+
+
+def test_tcp_max_connections(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), max_connections=1)
+        first, second = socket(AF_INET6, SOCK_STREAM), socket(AF_INET6, SOCK_STREAM)
+    else:
+        tcp_server = TCPServer(0, max_connections=1)
+        first, second = socket(AF_INET, SOCK_STREAM), socket(AF_INET, SOCK_STREAM)
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        first.connect((server.host, server.port))
+        assert watcher.wait("pause_accepting", "server")
+        assert not tcp_server.accepting
+
+        # Left in the listen backlog ...
+        second.connect((server.host, server.port))
+        second.settimeout(0.5)
+        with pytest.raises(SocketError):
+            second.recv(5)
+
+        # ... until there is room for it
+        first.close()
+        assert watcher.wait("resume_accepting", "server")
+        second.settimeout(5)
+        assert second.recv(5) == b"Ready"
+
+        assert tcp_server.metrics["accepted"] == 2
+        assert tcp_server.metrics["accept_pauses"] == 2
+    finally:
+        first.close()
+        second.close()
+        poller.unregister()
+        server.unregister()
+
+
+@pytest.mark.parametrize("secure", [False, True])
+def test_tcp_sendfile(manager, watcher, Poller, ipv6, secure):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), secure=secure, certfile=CERT_FILE)
+        sock = socket(AF_INET6, SOCK_STREAM)
+    else:
+        tcp_server = TCPServer(0, secure=secure, certfile=CERT_FILE)
+        sock = socket(AF_INET, SOCK_STREAM)
+
+    if secure:
+        sock = sslsocket(sock)
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    content = os.urandom(1024) * 3072
+    fileobj = TemporaryFile()
+    fileobj.write(content)
+    fileobj.flush()
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        sock.connect((server.host, server.port))
+        assert watcher.wait("connect", "server")
+
+        conn = tcp_server.connections[0]
+
+        # File data is sent in order with data written before and after it
+        server.fire(write(conn.sock, b"<"))
+        server.fire(sendfile(conn.sock, fileobj, 10, len(content) - 20))
+        server.fire(write(conn.sock, b">"))
+
+        expected = b"Ready<" + content[10:-10] + b">"
+
+        data = b""
+        while len(data) < len(expected):
+            chunk = sock.recv(1048576)
+            assert chunk
+            data += chunk
+        assert data == expected
+
+        assert pytest.wait_for(fileobj, "closed")
+        assert pytest.wait_for(conn, "bytes_written", len(expected))
+    finally:
+        sock.close()
+        fileobj.close()
+        poller.unregister()
+        server.unregister()
+
+
+def test_tcp_stats(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0), stats_interval=0.1)
+        tcp_client = TCP6Client()
+    else:
+        tcp_server = TCPServer(0, stats_interval=0.1)
+        tcp_client = TCPClient()
+
+    server = Server() + tcp_server
+    client = Client() + tcp_client
+    server.register(manager)
+    client.register(manager)
+
+    try:
+        assert watcher.wait("ready", "server")
+        assert watcher.wait("ready", "client")
+
+        client.fire(connect(server.host, server.port))
+        assert watcher.wait("connected", "client")
+        assert watcher.wait("connect", "server")
+
+        client.fire(write(b"foo"))
+        assert watcher.wait("read", "server")
+        assert pytest.wait_for(
+            tcp_client, "get_stats",
+            lambda obj, attr: obj.get_stats()["bytes_read"] == 8
+        )
+
+        snapshot = tcp_server.get_stats()
+        assert snapshot["connections"] == 1
+        assert snapshot["reads"] == 1
+        assert snapshot["bytes_read"] == 3
+        assert snapshot["bytes_written"] == len(b"Ready") + 3
+
+        conn_stats, = snapshot["connection_stats"]
+        assert conn_stats["bytes_read"] == 3
+        assert conn_stats["peer"][1] == tcp_client._sock.getsockname()[1]
+
+        snapshot = tcp_client.get_stats()
+        assert snapshot["connects"] == 1
+        assert snapshot["writes"] == 1
+        assert snapshot["bytes_written"] == 3
+
+        # Counters of closed connections are kept in the server totals
+        client.fire(close())
+        assert watcher.wait("disconnect", "server")
+        snapshot = tcp_server.get_stats()
+        assert snapshot["connections"] == 0
+        assert snapshot["connection_stats"] == []
+        assert snapshot["bytes_read"] == 3
+
+        watcher.clear()
+        assert watcher.wait("stats", "server")
+        event = [e for e in watcher.events if e.name == "stats"][-1]
+        summary = event.args[0]
+        assert summary["accepted"] == 1
+        assert "connection_stats" not in summary
+        assert set(summary["rates"]) >= set(("accepted", "bytes_read"))
+    finally:
+        poller.unregister()
+        client.unregister()
+        server.unregister()
+
+
+def test_tcp_happy_eyeballs(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    # The first address does not answer, a connection to the second one
+    # (IPv6 if available) is started after attempt_delay and wins.
+    socks = black_hole(AF_INET, "127.0.0.1")
+    if ipv6:
+        tcp_server = TCP6Server(("::1", 0))
+    else:
+        tcp_server = TCPServer(("127.0.0.1", 0))
+
+    server = Server() + tcp_server
+    server.register(manager)
+
+    try:
+        assert watcher.wait("ready", "server")
+
+        resolver = StaticResolver(
+            (AF_INET, socks[0].getsockname()),
+            (tcp_server._sock.family, tcp_server._sock.getsockname()[:2]),
+        )
+        tcp_client = TCPClient(
+            connect_timeout=10, resolver=resolver, happy_eyeballs=True,
+            attempt_delay=0.1,
+        )
+        client = Client() + tcp_client
+        client.register(manager)
+        assert watcher.wait("ready", "client")
+
+        start = time()
+        client.fire(connect("foo.bar.baz", 1234))
+        assert watcher.wait("connected", "client")
+        assert time() - start < 5
+
+        assert tcp_client._sock.family == tcp_server._sock.family
+        assert tcp_client._sock.getpeername()[1] == tcp_server.port
+        assert not tcp_client._racing
+
+        client.fire(write(b"foo"))
+        assert pytest.wait_for(server, "data", b"foo")
+
+        client.unregister()
+    finally:
+        for sock in socks:
+            sock.close()
+        poller.unregister()
+        server.unregister()
+
+
+def test_tcp_happy_eyeballs_unreachable(manager, watcher, Poller, ipv6):
+    poller = Poller().register(manager)
+
+    # All attempts fail (refused) without waiting for connect_timeout
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    closed_port = sock.getsockname()[1]
+    sock.close()
+
+    resolver = StaticResolver(
+        (AF_INET, ("127.0.0.1", closed_port)),
+        (AF_INET, ("127.0.0.1", closed_port)),
+    )
+    tcp_client = TCPClient(
+        connect_timeout=10, resolver=resolver, happy_eyeballs=True,
+        attempt_delay=5,
+    )
+    client = Client() + tcp_client
+    client.register(manager)
+
+    try:
+        assert watcher.wait("ready", "client")
+
+        start = time()
+        client.fire(connect("foo.bar.baz", 1234))
+        assert watcher.wait("unreachable", "client")
+        assert time() - start < 5
+        assert not tcp_client.connecting
+        assert not tcp_client._racing
+    finally:
+        poller.unregister()
+        client.unregister()
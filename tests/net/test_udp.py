@@ -4,7 +4,7 @@ import socket
 
 import pytest
 
-from circuits import Manager
+from circuits import Component, Manager
 from circuits.core.pollers import EPoll, KQueue, Poll, Select
 from circuits.net.events import close, write
 from circuits.net.sockets import UDP6Client, UDP6Server, UDPClient, UDPServer
@@ -38,6 +38,21 @@ def pytest_generate_tests(metafunc):
         _pytest_generate_tests(metafunc, ipv6=True)
 
 
+class Batches(Component):
+
+    channel = "server"
+
+    def init(self):
+        self.batches = []
+
+    def read_batch(self, datagrams):
+        self.batches.append(datagrams)
+
+    @property
+    def received(self):
+        return [data for batch in self.batches for _, data in batch]
+
+
 def test_basic(Poller, ipv6):
     m = Manager() + Poller()
 
@@ -99,3 +114,55 @@ def test_close(Poller, ipv6):
         assert pytest.wait_for(server, "ready", timeout=30.0)
     finally:
         m.stop()
+
+
+def test_batch_reads(Poller, ipv6):
+    m = Manager() + Poller()
+
+    if ipv6:
+        udp_server = UDP6Server(
+            ("::1", 0), batch_reads=True, rcvbuf=262144, datagram_budget=8
+        )
+        family, host = socket.AF_INET6, "::1"
+    else:
+        udp_server = UDPServer(
+            ("127.0.0.1", 0), batch_reads=True, rcvbuf=262144,
+            datagram_budget=8
+        )
+        family, host = socket.AF_INET, "127.0.0.1"
+    server = Server() + udp_server
+    batches = Batches().register(server)
+    server.register(m)
+
+    m.start()
+
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+
+    try:
+        assert pytest.wait_for(server, "ready")
+        wait_host(server)
+
+        rcvbuf = udp_server._sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF
+        )
+        assert rcvbuf >= 262144
+
+        expected = [str(i).encode("ascii") for i in range(32)]
+        for data in expected:
+            sock.sendto(data, (host, server.port))
+
+        assert pytest.wait_for(
+            batches, "received",
+            lambda obj, attr: len(obj.received) == len(expected)
+        )
+        assert batches.received == expected
+        assert all(len(batch) <= 8 for batch in batches.batches)
+        assert all(
+            address[1] == sock.getsockname()[1]
+            for batch in batches.batches for address, _ in batch
+        )
+        # No per-datagram read Events were fired
+        assert server.data == ""
+    finally:
+        sock.close()
+        m.stop()
@@ -17,6 +17,8 @@ from .server import Server
 if sys.platform in ("win32", "cygwin"):
     pytest.skip("Test Not Applicable on Windows")
 
+CERT_FILE = os.path.join(os.path.dirname(__file__), "cert.pem")
+
 
 @fixture
 def tmpfile(request):
@@ -70,3 +72,34 @@ def test_unix(tmpfile, Poller):
         assert pytest.wait_for(server, "closed")
     finally:
         m.stop()
+
+
+def test_unix_secure(tmpfile, Poller):
+    m = Manager() + Poller()
+
+    server = Server() + UNIXServer(tmpfile, secure=True, certfile=CERT_FILE)
+    client = Client() + UNIXClient()
+
+    server.register(m)
+    client.register(m)
+
+    m.start()
+
+    try:
+        assert pytest.wait_for(server, "ready")
+        assert pytest.wait_for(client, "ready")
+
+        # The handshake is driven by the poller, not by a busy loop
+        client.fire(connect(tmpfile, secure=True))
+        assert pytest.wait_for(client, "connected")
+        assert pytest.wait_for(server, "connected")
+        assert pytest.wait_for(client, "data", b"Ready")
+
+        client.fire(write(b"foo"))
+        assert pytest.wait_for(server, "data", b"foo")
+
+        client.fire(close())
+        assert pytest.wait_for(client, "disconnected")
+        assert pytest.wait_for(server, "disconnected")
+    finally:
+        m.stop()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 from circuits.web import Controller
+from circuits.web.headers import Headers
 
 from .helpers import urlopen
 
@@ -51,3 +52,64 @@ def test_empty(webapp):
 
     content_length = f.headers["Content-Length"]
     assert int(content_length) == 0
+
+
+def test_headers():
+    headers = Headers([("content-type", "text/plain"), ("X-Foo", "1")])
+    headers.append("x-foo", "2")
+    headers.add_header("Set-Cookie", "a=b")
+    headers.add_header("Set-Cookie", "c=d")
+
+    assert headers["Content-Type"] == "text/plain"
+    assert "CONTENT-TYPE" in headers
+    assert headers.get("Content-Length") is None
+    assert headers["X-Foo"] == "1, 2"
+    assert headers.get_all("x-foo") == ["1", "2"]
+    assert headers["Set-Cookie"] == ["a=b", "c=d"]
+    assert list(headers) == ["Content-Type", "X-Foo", "Set-Cookie"]
+    assert list(headers.items()) == [
+        ("Content-Type", "text/plain"), ("X-Foo", "1, 2"),
+        ("Set-Cookie", "a=b"), ("Set-Cookie", "c=d"),
+    ]
+
+    # Names are title-cased, only lists are serialized as several fields
+    assert bytes(headers) == (
+        b"Content-Type: text/plain\r\n"
+        b"X-Foo: 1, 2\r\n"
+        b"Set-Cookie: a=b\r\nSet-Cookie: c=d\r\n"
+        b"\r\n"
+    )
+
+    headers["X-FOO"] = "3"
+    del headers["Set-Cookie"]
+    assert headers.setdefault("Content-Type", "text/html") == "text/plain"
+    assert headers.pop("content-type") == "text/plain"
+    assert bytes(headers) == b"X-Foo: 3\r\n\r\n"
+    assert len(headers) == 1
+
+    # pop() never raises (the default default is None)
+    assert headers.pop("X-Bar") is None
+    assert headers.pop("X-Bar", "") == ""
+
+
+def test_headers_values():
+    headers = Headers()
+
+    # A single appended cookie is a list, a cookie set as a str is a str
+    headers.append("Set-Cookie", "a=b")
+    assert headers["Set-Cookie"] == ["a=b"]
+    headers["Set-Cookie"] = "c=d"
+    assert headers["Set-Cookie"] == "c=d"
+    headers.append("Set-Cookie", "e=f")
+    assert headers["Set-Cookie"] == "c=d, e=f"
+
+    # Lists set explicitly are kept as lists
+    headers["X-Foo"] = ["1", "2"]
+    headers.append("x-foo", "3")
+    assert headers["X-Foo"] == ["1", "2", "3"]
+    assert headers.get_all("X-Foo") == ["1", "2", "3"]
+    assert bytes(headers) == (
+        b"Set-Cookie: c=d, e=f\r\n"
+        b"X-Foo: 1\r\nX-Foo: 2\r\nX-Foo: 3\r\n"
+        b"\r\n"
+    )
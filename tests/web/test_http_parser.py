@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+from circuits.web.parsers import BAD_FIRST_LINE, HttpParser
+from circuits.web.parsers.http import INVALID_CHUNK, INVALID_HEADER
+
+REQUEST = (
+    b"POST /foo/bar?a=1&b=2 HTTP/1.1\r\n"
+    b"Host: localhost\r\n"
+    b"X-Folded: foo\r\n"
+    b"  bar\r\n"
+    b"Content-Length: 5\r\n"
+    b"\r\n"
+    b"hello"
+)
+
+
+def feed(parser, data, size=1):
+    for i in range(0, len(data), size):
+        chunk = data[i:i + size]
+        parser.execute(chunk, len(chunk))
+
+
+def test_request():
+    parser = HttpParser(0, True)
+    parser.execute(REQUEST, len(REQUEST))
+
+    assert parser.is_headers_complete()
+    assert parser.is_message_complete()
+    assert parser.get_method() == "POST"
+    assert parser.get_path() == "/foo/bar"
+    assert parser.get_query_string() == "a=1&b=2"
+    assert parser.get_version() == (1, 1)
+    assert parser.get_headers()["Host"] == "localhost"
+    assert parser.get_headers()["X-Folded"] == "foo bar"
+    assert parser.recv_body() == b"hello"
+
+
+def test_fragmented_request():
+    parser = HttpParser(0, True)
+    feed(parser, REQUEST)
+
+    assert parser.is_message_complete()
+    assert parser.get_path() == "/foo/bar"
+    assert parser.get_headers()["Content-Length"] == "5"
+    assert parser.recv_body() == b"hello"
+
+
+def test_no_headers():
+    parser = HttpParser(0, True)
+    feed(parser, b"GET / HTTP/1.0\r\n\r\n", 3)
+
+    assert parser.is_headers_complete()
+    assert parser.get_version() == (1, 0)
+    assert not parser.should_keep_alive()
+
+
+def test_chunked_body():
+    data = (
+        b"POST / HTTP/1.1\r\n"
+        b"Transfer-Encoding: chunked\r\n"
+        b"\r\n"
+        b"5\r\nhello\r\n"
+        b"6;ext=1\r\n world\r\n"
+        b"0\r\n"
+        b"X-Trailer: done\r\n"
+        b"\r\n"
+    )
+
+    for size in (1, 7, len(data)):
+        parser = HttpParser(0, True)
+        feed(parser, data, size)
+
+        assert parser.is_chunked()
+        assert parser.is_message_complete()
+        assert parser.recv_body() == b"hello world"
+        assert parser._trailers["X-Trailer"] == "done"
+
+
+def test_wsgi_environ():
+    parser = HttpParser(0, True)
+    parser.execute(REQUEST, len(REQUEST))
+
+    environ = parser.get_wsgi_environ()
+    assert environ["REQUEST_METHOD"] == "POST"
+    assert environ["PATH_INFO"] == "/foo/bar"
+    assert environ["QUERY_STRING"] == "a=1&b=2"
+    assert environ["SERVER_PROTOCOL"] == "HTTP/1.1"
+    assert environ["HTTP_HOST"] == "localhost"
+    assert parser.get_wsgi_environ() is environ
+
+
+def test_response():
+    data = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n"
+
+    parser = HttpParser(1, True)
+    feed(parser, data, 2)
+
+    assert parser.is_message_complete()
+    assert parser.get_status_code() == 404
+    assert parser.get_version() == (1, 1)
+
+
+def test_errors():
+    parser = HttpParser(0, True)
+    parser.execute(b"FOO\r\n\r\n", 7)
+    assert parser.errno == BAD_FIRST_LINE
+
+    data = b"GET / HTTP/1.1\r\nBad Header\r\n\r\n"
+    parser = HttpParser(0, True)
+    parser.execute(data, len(data))
+    assert parser.errno == INVALID_HEADER
+    assert not parser.is_headers_complete()
+
+    data = (
+        b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"5\r\nhelloXX"
+    )
+    parser = HttpParser(0, True)
+    parser.execute(data, len(data))
+    assert parser.errno == INVALID_CHUNK
+
+
+def test_pipelined_requests():
+    data = REQUEST + b"GET /next HTTP/1.1\r\n\r\n"
+
+    parser = HttpParser(0, True)
+    parser.execute(data, len(data))
+
+    assert parser.is_message_complete()
+    assert parser.recv_body() == b"hello"
+
+    rest = parser.recv_rest()
+    assert rest == b"GET /next HTTP/1.1\r\n\r\n"
+
+    # A request without a body is complete after its headers
+    parser = HttpParser(0, True)
+    parser.execute(rest, len(rest))
+    assert parser.is_message_complete()
+    assert parser.get_path() == "/next"
+    assert parser.recv_rest() == b""
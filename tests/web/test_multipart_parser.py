@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+from io import BytesIO
+
+import pytest
+
+from circuits.web.parsers import MultipartParser
+from circuits.web.parsers.multipart import MultipartError
+
+BODY = (
+    b"preamble\r\n"
+    b"--foo\r\n"
+    b"Content-Disposition: form-data; name=\"description\"\r\n"
+    b"\r\n"
+    b"Hello World!\r\n"
+    b"--foo  \r\n"
+    b"Content-Disposition: form-data; name=\"file\"; "
+    b"filename=\"hello.txt\"\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"\r\n"
+    b"--fo\r\n--foobar\r\n"
+    b"--foo--\r\n"
+    b"epilogue"
+)
+
+
+def check_parts(parts):
+    assert [part.name for part in parts] == ["description", "file"]
+
+    description, file = parts
+    assert description.is_buffered()
+    assert description.value == "Hello World!"
+
+    assert not file.is_buffered()
+    assert file.filename == "hello.txt"
+    assert file.content_type == "text/plain"
+    assert file.file.read() == b"--fo\r\n--foobar"
+
+
+def test_stream():
+    parser = MultipartParser(BytesIO(BODY), "foo")
+    check_parts(parser.parts())
+    assert parser.get("file").size == 14
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64])
+def test_feed(size):
+    parser = MultipartParser(None, "foo")
+
+    parts = []
+    for i in range(0, len(BODY), size):
+        parts.extend(parser.feed(BODY[i:i + size]))
+    parser.close()
+
+    check_parts(parts)
+    assert parser.parts() == parts
+
+
+def test_sink():
+    files = {}
+
+    def sink(part):
+        if part.filename:
+            files[part.filename] = BytesIO()
+            return files[part.filename]
+
+    parser = MultipartParser(BytesIO(BODY), "foo", sink=sink)
+    parts = parser.parts()
+
+    assert parts[0].value == "Hello World!"
+    assert parts[1].file is files["hello.txt"]
+    assert files["hello.txt"].getvalue() == b"--fo\r\n--foobar"
+
+
+def test_sink_large():
+    data = b"x" * (2 ** 18 + 1)
+    body = (
+        b"--foo\r\nContent-Disposition: form-data; name=\"file\"; "
+        b"filename=\"large.txt\"\r\n\r\n" + data + b"\r\n--foo--\r\n"
+    )
+    sinkfile = BytesIO()
+
+    # The sink's file is kept beyond memfile_limit
+    part = MultipartParser(
+        BytesIO(body), "foo", sink=lambda part: sinkfile
+    ).get("file")
+    assert part.file is sinkfile
+    assert sinkfile.getvalue() == data
+
+
+def test_large_field():
+    data = b"x" * (2 ** 18 + 1)
+    body = (
+        b"--foo\r\nContent-Disposition: form-data; name=\"data\"\r\n\r\n" +
+        data + b"\r\n--foo--\r\n"
+    )
+
+    part = MultipartParser(BytesIO(body), "foo").get("data")
+    assert not part.is_buffered()
+    assert part.file.read() == data
+
+
+def test_errors():
+    with pytest.raises(MultipartError):
+        MultipartParser(BytesIO(b"no boundary"), "foo").parts()
+
+    with pytest.raises(MultipartError):
+        MultipartParser(BytesIO(BODY[:-20]), "foo").parts()
+
+    body = b"--foo\r\nContent-Type: text/plain\r\n\r\nbar\r\n--foo--\r\n"
+    with pytest.raises(MultipartError):
+        MultipartParser(BytesIO(body), "foo").parts()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+from socket import create_connection
+
+from circuits import sleep
+from circuits.web import Controller
+from circuits.web.client import parse_url
+
+
+class Root(Controller):
+
+    def slow(self):
+        yield sleep(0.2)
+        yield "slow"
+
+    def fast(self):
+        return "fast"
+
+    def echo(self):
+        return self.request.body.read()
+
+
+def recv_all(sock):
+    data = []
+    while True:
+        buf = sock.recv(4096)
+        if not buf:
+            return b"".join(data)
+        data.append(buf)
+
+
+def test_pipelining(webapp):
+    host, port, resource, secure = parse_url(webapp.server.http.base)
+
+    sock = create_connection((host, port))
+    try:
+        # All requests are sent at once (in one segment)
+        sock.sendall(
+            b"GET /slow HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            b"POST /echo HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Length: 5\r\n\r\nhello"
+            b"HEAD /fast HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            b"GET /fast HTTP/1.1\r\nHost: localhost\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        data = recv_all(sock)
+    finally:
+        sock.close()
+
+    # Responses are sent in the order of the requests
+    assert data.count(b"HTTP/1.1 200 OK") == 4
+    assert data.index(b"slow") < data.index(b"hello") < data.index(b"fast")
+    assert data.endswith(b"\r\n\r\nfast")
+
+
+def test_pipelining_fragmented(webapp):
+    host, port, resource, secure = parse_url(webapp.server.http.base)
+
+    requests = (
+        b"POST /echo HTTP/1.1\r\nHost: localhost\r\n"
+        b"Content-Length: 3\r\n\r\nfoo"
+        b"POST /echo HTTP/1.1\r\nHost: localhost\r\n"
+        b"Content-Length: 3\r\nConnection: close\r\n\r\nbar"
+    )
+
+    sock = create_connection((host, port))
+    try:
+        # Requests are split in the middle of the body and headers
+        sock.sendall(requests[:60])
+        sock.sendall(requests[60:])
+        data = recv_all(sock)
+    finally:
+        sock.close()
+
+    assert data.count(b"HTTP/1.1 200 OK") == 2
+    assert data.index(b"foo") < data.index(b"bar")
+
+
+def test_ssl_handshake(webapp, watcher):
+    host, port, resource, secure = parse_url(webapp.server.http.base)
+
+    # A client speaking SSL (here: an SSLv2 hello) to a plain HTTP server
+    # is disconnected without the handshake being parsed as a request.
+    sock = create_connection((host, port))
+    try:
+        sock.sendall(b"\x80\x2e\x01\x00\x02\x00\x15")
+        assert recv_all(sock) == b""
+    finally:
+        sock.close()
+
+    assert watcher.wait("disconnect")
+    assert watcher.count("exception") == 0
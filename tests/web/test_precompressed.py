@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+import gzip
+import os
+from io import BytesIO
+
+import pytest
+
+from circuits.web import Controller, Static
+from circuits.web.dispatchers.static import ENTRY_SIZE
+from circuits.web.tools import Gzip
+
+from .helpers import Request, build_opener
+
+
+def compress(data):
+    buf = BytesIO()
+    with gzip.GzipFile(mode="wb", fileobj=buf) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def decompress(data):
+    with gzip.GzipFile(mode="rb", fileobj=BytesIO(data)) as f:
+        return f.read()
+
+
+def fetch(url, encoding=None):
+    request = Request(url)
+    if encoding is not None:
+        request.add_header("Accept-Encoding", encoding)
+    return build_opener().open(request)
+
+
+class Root(Controller):
+
+    def index(self):
+        return "Hello World!"
+
+    def large(self):
+        return "Hello World!\n" * 1024
+
+
+@pytest.fixture
+def docroot(tmpdir):
+    tmpdir.join("hello.txt").write(b"Hello World!", "wb")
+    tmpdir.join("hello.txt.gz").write(compress(b"Hello World!"), "wb")
+    tmpdir.join("plain.txt").write(b"Plain", "wb")
+    return tmpdir
+
+
+@pytest.fixture(params=[None, 4 * ENTRY_SIZE])
+def static(request, webapp, watcher, docroot):
+    static = Static(
+        "/precompressed", str(docroot), cache_size=request.param,
+        cache_check=None, precompressed=True, channel="web"
+    ).register(webapp)
+    assert watcher.wait("registered")
+
+    yield static
+
+    static.unregister()
+    assert watcher.wait("unregistered")
+
+
+@pytest.fixture
+def gziptool(request, webapp, watcher):
+    gziptool = Gzip(**getattr(request, "param", {})).register(webapp)
+    assert watcher.wait("registered")
+
+    yield gziptool
+
+    gziptool.unregister()
+    assert watcher.wait("unregistered")
+
+
+def test_precompressed(webapp, static):
+    url = webapp.server.http.base + "/precompressed/"
+    for _ in range(2):
+        f = fetch(url + "hello.txt", "gzip")
+        assert f.headers["Content-Encoding"] == "gzip"
+        assert f.headers["Content-Type"] == "text/plain"
+        assert f.headers["Vary"] == "Accept-Encoding"
+        assert decompress(f.read()) == b"Hello World!"
+
+        f = fetch(url + "hello.txt", "br;q=1.0, gzip;q=0")
+        assert f.headers.get("Content-Encoding") is None
+        assert f.read() == b"Hello World!"
+
+        f = fetch(url + "hello.txt")
+        assert f.headers.get("Content-Encoding") is None
+        assert f.read() == b"Hello World!"
+
+        f = fetch(url + "plain.txt", "gzip")
+        assert f.headers.get("Content-Encoding") is None
+        assert f.read() == b"Plain"
+
+
+def test_not_compressed_twice(webapp, static, gziptool):
+    f = fetch(webapp.server.http.base + "/precompressed/hello.txt", "gzip")
+    assert f.headers["Content-Encoding"] == "gzip"
+    assert decompress(f.read()) == b"Hello World!"
+
+
+@pytest.mark.parametrize(
+    "gziptool", [{"cache_size": 1024 * 1024}], indirect=True
+)
+def test_cache(webapp, watcher, gziptool, docroot):
+    static = Static(
+        "/static", str(docroot), cache_size=4 * ENTRY_SIZE, channel="web"
+    ).register(webapp)
+    assert watcher.wait("registered")
+
+    try:
+        url = webapp.server.http.base + "/static/plain.txt"
+        for _ in range(2):
+            f = fetch(url, "gzip")
+            assert f.headers["Content-Encoding"] == "gzip"
+            assert decompress(f.read()) == b"Plain"
+            assert len(gziptool.cache) == 1
+
+        # Responses without an ETag aren't cached
+        f = fetch(webapp.server.http.base, "gzip")
+        assert decompress(f.read()) == b"Hello World!"
+        assert len(gziptool.cache) == 1
+    finally:
+        static.unregister()
+        assert watcher.wait("unregistered")
+
+
+@pytest.mark.parametrize(
+    "gziptool", [{"cache_size": 1024 * 1024}], indirect=True
+)
+def test_cache_same_etag(webapp, watcher, gziptool, docroot):
+    # Same size and mtime (second), but different content
+    for name in ("a.txt", "b.txt"):
+        docroot.join(name).write(name.encode("ascii") * 4, "wb")
+        os.utime(str(docroot.join(name)), (1577836800, 1577836800))
+
+    static = Static(
+        "/static", str(docroot), cache_size=4 * ENTRY_SIZE, channel="web"
+    ).register(webapp)
+    assert watcher.wait("registered")
+
+    try:
+        url = webapp.server.http.base + "/static/"
+        etags = set()
+        for name in ("a.txt", "b.txt", "a.txt", "b.txt"):
+            f = fetch(url + name, "gzip")
+            assert decompress(f.read()) == name.encode("ascii") * 4
+            etags.add(f.headers["ETag"])
+
+        assert len(etags) == 2
+        assert len(gziptool.cache) == 2
+    finally:
+        static.unregister()
+        assert watcher.wait("unregistered")
+
+
+@pytest.mark.parametrize("gziptool", [{"threshold": 1024}], indirect=True)
+def test_worker(webapp, watcher, gziptool):
+    channel = gziptool.worker.channel
+
+    f = fetch(webapp.server.http.base + "/large", "gzip")
+    assert f.headers["Content-Encoding"] == "gzip"
+    assert decompress(f.read()) == b"Hello World!\n" * 1024
+    assert watcher.count("task", channel) == 1
+
+    # Small bodies are compressed right away
+    f = fetch(webapp.server.http.base, "gzip")
+    assert f.headers["Content-Encoding"] == "gzip"
+    assert decompress(f.read()) == b"Hello World!"
+    assert watcher.count("task", channel) == 1
+
+    f = fetch(webapp.server.http.base + "/large")
+    assert f.headers.get("Content-Encoding") is None
+    assert f.read() == b"Hello World!\n" * 1024
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+from socket import create_connection
+from time import sleep
+
+import pytest
+
+from circuits import Component, handler
+from circuits.web import Controller, VirtualHosts, body
+from circuits.web.events import response
+
+from .helpers import HTTPError, Request, urlopen
+
+
+class Root(Controller):
+
+    def index(self, **kwargs):
+        return "{0:s} {1:d}".format(
+            type(self.request.body).__name__, len(self.request.body.read())
+        )
+
+    @body(max_size=16)
+    def small(self, **kwargs):
+        return "OK"
+
+    @body(stream=True)
+    def upload(self):
+        Uploads.started.append(self.request.path)
+        return True
+
+
+class Domain2(Controller):
+
+    channel = "/domain2"
+
+    @body(max_size=16)
+    def tiny(self, **kwargs):
+        return "OK"
+
+
+class Uploads(Component):
+
+    channel = "web"
+
+    started = []
+
+    def init(self):
+        self.chunks = []
+
+    @handler("request_body")
+    def _on_request_body(self, req, res, data):
+        if data is not None:
+            self.chunks.append(data)
+        else:
+            res.body = "{0:d} {1:d}".format(
+                len(self.chunks), len(b"".join(self.chunks))
+            )
+            self.fire(response(res))
+
+
+def test_spooled_body(webapp):
+    webapp.server.http._spool_size = 1024
+
+    f = urlopen(webapp.server.http.base, b"x" * 65536)
+    assert f.read() == b"SpooledTemporaryFile 65536"
+
+    f = urlopen(webapp.server.http.base, b"x" * 512)
+    assert f.read() == b"BytesIO 512"
+
+
+def test_max_body_size(webapp):
+    f = urlopen("%s/small" % webapp.server.http.base, b"x" * 16)
+    assert f.read() == b"OK"
+
+    with pytest.raises(HTTPError) as exc:
+        urlopen("%s/small" % webapp.server.http.base, b"x" * 17)
+    assert exc.value.code == 413
+
+
+def test_max_body_size_vhost(webapp, watcher):
+    vhosts = VirtualHosts({"domain2.example": "domain2"}).register(webapp)
+    domain2 = Domain2().register(webapp)
+    assert watcher.wait("registered")
+
+    def post(data):
+        request = Request("%s/tiny" % webapp.server.http.base, data)
+        request.add_header("Host", "domain2.example")
+        return urlopen(request)
+
+    try:
+        assert post(b"x" * 16).read() == b"OK"
+
+        # The body options of the rewritten path's route apply
+        with pytest.raises(HTTPError) as exc:
+            post(b"x" * 17)
+        assert exc.value.code == 413
+    finally:
+        domain2.unregister()
+        vhosts.unregister()
+
+
+def test_stream_body(webapp):
+    uploads = Uploads().register(webapp)
+
+    sock = create_connection((webapp.server.host, webapp.server.port))
+    try:
+        sock.sendall(
+            b"POST /upload HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Length: 8\r\nConnection: close\r\n\r\n"
+        )
+
+        # The request is dispatched before its body is received
+        assert pytest.wait_for(
+            Uploads, "started", lambda obj, attr: obj.started
+        )
+
+        sock.sendall(b"foo")
+        assert pytest.wait_for(uploads, "chunks", lambda obj, attr: obj.chunks)
+        sleep(0.1)
+        sock.sendall(b"bar12")
+
+        data = b""
+        while True:
+            buf = sock.recv(4096)
+            if not buf:
+                break
+            data += buf
+
+        assert data.startswith(b"HTTP/1.1 200 OK")
+        assert data.endswith(b"\r\n\r\n2 8")
+    finally:
+        sock.close()
+        uploads.unregister()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+from socket import create_connection
+
+import pytest
+
+from circuits import Component, handler
+from circuits.web import Controller
+from circuits.web.client import parse_url
+from circuits.web.wrappers import HTTPStatus, http_date
+
+from .helpers import urlopen
+
+
+class Root(Controller):
+
+    def index(self):
+        return "Hello World!"
+
+    def large(self):
+        return "x" * (128 * 1024)
+
+    def reason(self):
+        self.response.status = HTTPStatus(200, "Fine")
+        return "Hello World!"
+
+
+class Writes(Component):
+
+    channel = "web"
+
+    def init(self):
+        self.writes = []
+
+    @handler("write", priority=1.0)
+    def _on_write(self, sock, data):
+        self.writes.append(data)
+
+
+def request(webapp, path, method="GET"):
+    host, port, resource, secure = parse_url(webapp.server.http.base)
+
+    sock = create_connection((host, port))
+    try:
+        sock.sendall(
+            "{0:s} {1:s} HTTP/1.1\r\nHost: localhost\r\n"
+            "Connection: close\r\n\r\n".format(method, path).encode("ascii")
+        )
+        data = []
+        while True:
+            buf = sock.recv(4096)
+            if not buf:
+                return b"".join(data)
+            data.append(buf)
+    finally:
+        sock.close()
+
+
+@pytest.fixture
+def writes(webapp, watcher):
+    writes = Writes().register(webapp)
+    assert watcher.wait("registered")
+    yield writes
+    writes.unregister()
+
+
+def test_single_write(webapp, writes):
+    data = request(webapp, "/")
+    assert data.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert data.endswith(b"\r\n\r\nHello World!")
+    assert writes.writes == [data]
+
+
+def test_single_write_head(webapp, writes):
+    data = request(webapp, "/", "HEAD")
+    assert data.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert data.endswith(b"\r\n\r\n")
+    assert writes.writes == [data]
+
+
+def test_large_body(webapp, writes):
+    data = request(webapp, "/large")
+    assert data.endswith(b"\r\n\r\n" + b"x" * (128 * 1024))
+
+    # The body isn't copied into the buffer of the status line and headers
+    assert len(writes.writes) == 2
+    assert writes.writes[1] == b"x" * (128 * 1024)
+
+
+def test_custom_reason(webapp):
+    f = urlopen(webapp.server.http.base + "/reason")
+    assert f.getcode() == 200
+    assert f.msg == "Fine"
+
+    f = urlopen(webapp.server.http.base)
+    assert f.msg == "OK"
+
+
+def test_http_date():
+    assert http_date() is http_date()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+import pytest
+
+from circuits.web import Controller, expose
+from circuits.web.dispatchers import Dispatcher
+from circuits.web.dispatchers.dispatcher import compile_paths, resolve_path
+
+from .helpers import HTTPError, urlopen
+
+
+class Root(Controller):
+
+    def index(self):
+        return "index"
+
+    def args(self, *args):
+        return "/".join(args)
+
+
+class Leaf(Controller):
+
+    channel = "/world/country"
+
+    def index(self, *args):
+        return "leaf " + "/".join(args)
+
+
+def test_resolve_path():
+    routes = compile_paths(["/", "/a", "/a/b/c", "/x/", "web"])
+
+    def resolve(path):
+        parts = [x for x in path.strip("/").split("/") if x]
+        return list(resolve_path(routes, parts))
+
+    assert resolve("/") == [("/", [])]
+    assert resolve("/a/b/c/d") == [
+        ("/a/b/c", ["d"]), ("/a", ["b", "c", "d"]), ("/", ["a", "b", "c", "d"])
+    ]
+    assert resolve("/a/b") == [("/a", ["b"]), ("/", ["a", "b"])]
+    assert resolve("/x") == [("/", ["x"])]
+    assert resolve("/web") == [("/", ["web"])]
+
+    assert list(resolve_path(compile_paths(["/a"]), [])) == []
+
+
+def test_cache(webapp):
+    dispatcher = next(
+        c for c in webapp.server.http.components if isinstance(c, Dispatcher)
+    )
+    dispatcher._cache_size = 2
+
+    for path in ("/args/a", "/args/b", "/args/c", "/args/c"):
+        f = urlopen(webapp.server.http.base + path)
+        assert f.read() == path[-1:].encode("ascii")
+
+    assert list(dispatcher._cache) == [("GET", "/args/b"), ("GET", "/args/c")]
+
+    # Routes are recompiled when controllers are (un)registered
+    leaf = Leaf().register(webapp)
+    assert pytest.wait_for(
+        dispatcher, "paths", lambda obj, attr: Leaf.channel in obj.paths
+    )
+    assert not dispatcher._cache
+
+    f = urlopen(webapp.server.http.base + "/world/country/a/b")
+    assert f.read() == b"leaf a/b"
+
+    leaf.unregister()
+    assert pytest.wait_for(
+        dispatcher, "paths", lambda obj, attr: Leaf.channel not in obj.paths
+    )
+
+    with pytest.raises(HTTPError) as e:
+        urlopen(webapp.server.http.base + "/world/country/a/b")
+    assert e.value.code == 404
+
+
+def test_cache_handlers(webapp):
+    dispatcher = next(
+        c for c in webapp.server.http.components if isinstance(c, Dispatcher)
+    )
+    root = dispatcher.paths["/"]
+
+    def added(self):
+        return "added"
+
+    with pytest.raises(HTTPError) as e:
+        urlopen(webapp.server.http.base + "/added")
+    assert e.value.code == 404
+
+    # Cached routes are dropped when handlers are added or removed
+    method = root.addHandler(expose("added")(added))
+    f = urlopen(webapp.server.http.base + "/added")
+    assert f.read() == b"added"
+
+    root.removeHandler(method)
+    with pytest.raises(HTTPError) as e:
+        urlopen(webapp.server.http.base + "/added")
+    assert e.value.code == 404
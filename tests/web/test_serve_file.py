@@ -6,6 +6,13 @@ from circuits.web import Controller
 
 from .helpers import urlopen
 
+try:
+    from httplib import HTTPConnection
+except ImportError:
+    from http.client import HTTPConnection  # NOQA
+
+LARGE = os.urandom(1024) * 2048
+
 
 class Root(Controller):
 
@@ -16,14 +23,40 @@ class Root(Controller):
         os.write(fd, b"Hello World!")
         os.close(fd)
 
+        fd, self.large_filename = mkstemp()
+        os.write(fd, LARGE)
+        os.close(fd)
+
     def __del__(self):
         os.remove(self.filename)
+        os.remove(self.large_filename)
 
     def index(self):
         return self.serve_file(self.filename)
 
+    def large(self):
+        return self.serve_file(self.large_filename)
+
 
 def test(webapp):
     f = urlopen(webapp.server.http.base)
     s = f.read()
     assert s == b"Hello World!"
+
+
+def test_large_keepalive(webapp):
+    connection = HTTPConnection(webapp.server.host, webapp.server.port)
+    connection.connect()
+
+    for path in ("/large", "/", "/large"):
+        connection.request("GET", path)
+        response = connection.getresponse()
+        assert response.status == 200
+        body = response.read()
+        if path == "/large":
+            assert len(body) == len(LARGE)
+            assert body == LARGE
+        else:
+            assert body == b"Hello World!"
+
+    connection.close()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+import pytest
+
+from circuits.web import Static
+from circuits.web.dispatchers.static import ENTRY_SIZE
+
+from .helpers import HTTPError, Request, urlopen
+
+
+@pytest.fixture
+def static(webapp, watcher, tmpdir):
+    tmpdir.join("hello.txt").write(b"Hello World!", "wb")
+    tmpdir.join("large.txt").write(b"x" * 1024, "wb")
+    tmpdir.mkdir("dir").join("index.html").write(b"<p>Index</p>", "wb")
+
+    static = Static(
+        "/cached", str(tmpdir), cache_size=4 * ENTRY_SIZE,
+        cache_file_size=64, cache_check=None, channel="web"
+    ).register(webapp)
+    assert watcher.wait("registered")
+
+    yield static
+
+    static.unregister()
+    assert watcher.wait("unregistered")
+
+
+def test_cached(webapp, static, tmpdir):
+    url = webapp.server.http.base + "/cached/"
+    for _ in range(2):
+        f = urlopen(url + "hello.txt")
+        assert f.read() == b"Hello World!"
+        assert f.headers["Content-Type"] == "text/plain"
+        assert f.headers["ETag"]
+
+        f = urlopen(url + "dir/")
+        assert f.read() == b"<p>Index</p>"
+
+        f = urlopen(url + "large.txt")
+        assert f.read() == b"x" * 1024
+
+    assert len(static.cache) == 3
+    assert static.cache.used == 3 * ENTRY_SIZE + 12 + 12
+
+    # Cache hits don't touch the file system
+    tmpdir.join("hello.txt").remove()
+    f = urlopen(url + "hello.txt")
+    assert f.read() == b"Hello World!"
+
+    static.cache.clear()
+    with pytest.raises(HTTPError) as e:
+        urlopen(url + "hello.txt")
+    assert e.value.code == 404
+
+
+def test_validation(webapp, static):
+    url = webapp.server.http.base + "/cached/hello.txt"
+    f = urlopen(url)
+    etag = f.headers["ETag"]
+    lastmod = f.headers["Last-Modified"]
+
+    for name, value in (("If-None-Match", etag),
+                        ("If-Modified-Since", lastmod)):
+        with pytest.raises(HTTPError) as e:
+            urlopen(Request(url, headers={name: value}))
+        assert e.value.code == 304
+
+    f = urlopen(Request(url, headers={"Range": "bytes=6-"}))
+    assert f.getcode() == 206
+    assert f.read() == b"World!"
+
+
+def test_uncached_validators(webapp, static, monkeypatch):
+    url = webapp.server.http.base + "/cached/hello.txt"
+
+    # Files the cache declines get the same ETag as cached ones
+    monkeypatch.setattr(static.cache, "add", lambda *args: None)
+    etag = urlopen(url).headers["ETag"]
+    assert etag
+    assert not static.cache
+
+    with pytest.raises(HTTPError) as e:
+        urlopen(Request(url, headers={"If-None-Match": etag}))
+    assert e.value.code == 304
+
+    monkeypatch.undo()
+    assert urlopen(url).headers["ETag"] == etag
+    assert len(static.cache) == 1
+
+
+def test_changed(webapp, static, tmpdir):
+    static.cache.check = 0
+
+    url = webapp.server.http.base + "/cached/hello.txt"
+    assert urlopen(url).read() == b"Hello World!"
+
+    tmpdir.join("hello.txt").write(b"Hello Universe!", "wb")
+    assert urlopen(url).read() == b"Hello Universe!"
+
+
+def test_eviction(webapp, static, tmpdir):
+    for i in range(8):
+        tmpdir.join("{0:d}.txt".format(i)).write(b"x", "wb")
+        urlopen(webapp.server.http.base + "/cached/{0:d}.txt".format(i))
+
+    assert len(static.cache) == 3
+    assert static.cache.used <= static.cache.size
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+from socket import SO_RCVBUF, SOL_SOCKET, create_connection
+from time import sleep
+
+from circuits.web import Controller
+
+SIZE = 8 * 1024 * 1024
+
+
+class Body(object):
+
+    def __init__(self, size):
+        self.size = size
+        self.produced = 0
+
+    def read(self, n):
+        n = min(n, self.size - self.produced)
+        self.produced += n
+        return b"x" * n
+
+    def close(self):
+        pass
+
+
+class Root(Controller):
+
+    body = None
+
+    def index(self):
+        Root.body = Body(SIZE)
+        return Root.body
+
+
+def test(webapp):
+    server = webapp.server
+    sock = create_connection((server.host, server.port))
+    sock.setsockopt(SOL_SOCKET, SO_RCVBUF, 4096)
+
+    try:
+        sock.sendall(b"GET / HTTP/1.0\r\nHost: localhost\r\n\r\n")
+
+        # The body is only read as fast as the client receives it
+        sleep(1)
+        assert 0 < Root.body.produced < SIZE
+
+        sock.setsockopt(SOL_SOCKET, SO_RCVBUF, 1024 * 1024)
+
+        data = []
+        while True:
+            buf = sock.recv(65536)
+            if not buf:
+                break
+            data.append(buf)
+
+        head, body = b"".join(data).split(b"\r\n\r\n", 1)
+        assert head.startswith(b"HTTP/1.0 200 OK")
+        assert len(body) == SIZE
+        assert Root.body.produced == SIZE
+    finally:
+        sock.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+from socket import socket
+
+from circuits.web.headers import Headers
+from circuits.web.wrappers import Host, Request, Response
+
+
+class Server(object):
+
+    host = "127.0.0.1"
+    port = 8000
+
+
+def make_request(headers=(), sock=None):
+    return Request(
+        sock, "GET", "http", "/foo/../bar", (1, 1), "a=1",
+        headers=Headers(list(headers)), server=Server()
+    )
+
+
+def test_lazy_attributes():
+    req = make_request([("Host", "example.com:8080"), ("Cookie", "a=b")])
+
+    assert req._uri is None
+    assert req._cookie is None
+
+    assert req.host == "example.com"
+    assert req.port == 8080
+    assert req.local.port == 8000
+    assert req.base.utf8() == b"http://example.com:8080/"
+    assert req.uri.utf8() == b"http://example.com:8080/bar?a=1"
+    assert req.cookie["a"].value == "b"
+    assert req.body.read() == b""
+
+    # Derived attributes are computed once
+    assert req.uri is req.uri
+
+
+def test_no_host():
+    req = make_request()
+    assert req.host == "127.0.0.1"
+    assert req.port == 8000
+
+
+def test_remote():
+    req = make_request()
+    assert req.remote.ip == ""
+
+    req.remote = Host("10.0.0.1", 1234)
+    assert req.remote.ip == "10.0.0.1"
+
+    # The socket might already be closed
+    sock = socket()
+    sock.close()
+    req = make_request(sock=sock)
+    assert req.remote.ip == ""
+
+
+def test_extra_attributes():
+    req = make_request()
+    res = Response(req)
+
+    req.session = {}
+    res.gzip = True
+    assert req.session == {}
+    assert res.gzip
+
+
+def test_response_cookie():
+    req = make_request()
+    res = Response(req)
+
+    res.prepare()
+    assert req._cookie is None
+    assert "Set-Cookie" not in res.headers
+
+    res.cookie["a"] = "b"
+    assert req.cookie["a"].value == "b"
+
+    res.prepare()
+    assert res.headers.get_all("Set-Cookie") == ["a=b"]